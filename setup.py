@@ -65,7 +65,7 @@ setup(
     ],
     extras_require={
         'cli': ['pytest', 'numpy', 'pandas', 'click'],
-        'grid': ['xarray', 'netCDF4', 'pandas', 'numpy'],
+        'grid': ['xarray', 'netCDF4', 'pyarrow<18', 'pandas', 'numpy'],
         'test': ['pytest', 'numpy', 'pandas', 'click'],
     },
     packages=setuptools.find_packages(where="src"),
@@ -0,0 +1,442 @@
+module Batch
+
+    ! Identifiers for the input variables which can be set by Run_Batch (in State)
+    integer, public, parameter :: in_yr               = 1
+    integer, public, parameter :: in_mm               = 2
+    integer, public, parameter :: in_mdd              = 3
+    integer, public, parameter :: in_dd               = 4
+    integer, public, parameter :: in_td               = 5
+    integer, public, parameter :: in_hr               = 6
+    integer, public, parameter :: in_ts_c             = 7
+    integer, public, parameter :: in_tleaf            = 8
+    integer, public, parameter :: in_vpd              = 9
+    integer, public, parameter :: in_uh_zr            = 10
+    integer, public, parameter :: in_precip           = 11
+    integer, public, parameter :: in_p                = 12
+    integer, public, parameter :: in_o3_ppb_zr        = 13
+    integer, public, parameter :: in_co2              = 14
+    integer, public, parameter :: in_hd               = 15
+    integer, public, parameter :: in_r                = 16
+    integer, public, parameter :: in_par              = 17
+    integer, public, parameter :: in_rn               = 18
+    integer, public, parameter :: in_cloudfrac        = 19
+    integer, public, parameter :: in_leaf_fphen_input = 20
+    integer, public, parameter :: in_ustar            = 21
+    integer, public, parameter :: in_ustar_ref        = 22
+    integer, public, parameter :: in_fswp             = 23
+    integer, public, parameter :: in_asw              = 24
+
+    ! Identifiers for the output variables which can be read by Run_Batch (in State)
+    integer, public, parameter :: out_yr            = 1
+    integer, public, parameter :: out_mm            = 2
+    integer, public, parameter :: out_mdd           = 3
+    integer, public, parameter :: out_dd            = 4
+    integer, public, parameter :: out_td            = 5
+    integer, public, parameter :: out_cloudfrac     = 6
+    integer, public, parameter :: out_hr            = 7
+    integer, public, parameter :: out_ts_c          = 8
+    integer, public, parameter :: out_tleaf         = 9
+    integer, public, parameter :: out_vpd           = 10
+    integer, public, parameter :: out_uh_zr         = 11
+    integer, public, parameter :: out_precip        = 12
+    integer, public, parameter :: out_precip_acc    = 13
+    integer, public, parameter :: out_p             = 14
+    integer, public, parameter :: out_o3_ppb_zr     = 15
+    integer, public, parameter :: out_co2           = 16
+    integer, public, parameter :: out_hd            = 17
+    integer, public, parameter :: out_r             = 18
+    integer, public, parameter :: out_par           = 19
+    integer, public, parameter :: out_ustar         = 20
+    integer, public, parameter :: out_ustar_ref     = 21
+    integer, public, parameter :: out_uh_i          = 22
+    integer, public, parameter :: out_uh            = 23
+    integer, public, parameter :: out_rn            = 24
+    integer, public, parameter :: out_rn_w          = 25
+    integer, public, parameter :: out_sinb          = 26
+    integer, public, parameter :: out_invl          = 27
+    integer, public, parameter :: out_pardir        = 28
+    integer, public, parameter :: out_pardif        = 29
+    integer, public, parameter :: out_ra            = 30
+    integer, public, parameter :: out_ra_tar_i      = 31
+    integer, public, parameter :: out_ra_ref_i      = 32
+    integer, public, parameter :: out_rb            = 33
+    integer, public, parameter :: out_rsur          = 34
+    integer, public, parameter :: out_rinc          = 35
+    integer, public, parameter :: out_rsto          = 36
+    integer, public, parameter :: out_gsto          = 37
+    integer, public, parameter :: out_rsto_l        = 38
+    integer, public, parameter :: out_rsun_l        = 39
+    integer, public, parameter :: out_gsto_l        = 40
+    integer, public, parameter :: out_gsun_l        = 41
+    integer, public, parameter :: out_gsun_l_ms     = 42
+    integer, public, parameter :: out_rsto_c        = 43
+    integer, public, parameter :: out_gsto_c        = 44
+    integer, public, parameter :: out_rgs           = 45
+    integer, public, parameter :: out_vd            = 46
+    integer, public, parameter :: out_o3_ppb_i      = 47
+    integer, public, parameter :: out_o3_ppb        = 48
+    integer, public, parameter :: out_o3_nmol_m3    = 49
+    integer, public, parameter :: out_fst           = 50
+    integer, public, parameter :: out_fst_sun       = 51
+    integer, public, parameter :: out_afst0         = 52
+    integer, public, parameter :: out_afsty         = 53
+    integer, public, parameter :: out_afsty_total   = 54
+    integer, public, parameter :: out_ftot          = 55
+    integer, public, parameter :: out_ot40          = 56
+    integer, public, parameter :: out_aot40         = 57
+    integer, public, parameter :: out_lai           = 58
+    integer, public, parameter :: out_sai           = 59
+    integer, public, parameter :: out_pet           = 60
+    integer, public, parameter :: out_et            = 61
+    integer, public, parameter :: out_ei            = 62
+    integer, public, parameter :: out_es            = 63
+    integer, public, parameter :: out_sn            = 64
+    integer, public, parameter :: out_per_vol       = 65
+    integer, public, parameter :: out_smd           = 66
+    integer, public, parameter :: out_swp           = 67
+    integer, public, parameter :: out_lwp           = 68
+    integer, public, parameter :: out_asw           = 69
+    integer, public, parameter :: out_sn_meas       = 70
+    integer, public, parameter :: out_swp_meas      = 71
+    integer, public, parameter :: out_smd_meas      = 72
+    integer, public, parameter :: out_fphen         = 73
+    integer, public, parameter :: out_leaf_fphen    = 74
+    integer, public, parameter :: out_flight        = 75
+    integer, public, parameter :: out_flightsun     = 76
+    integer, public, parameter :: out_flightshade   = 77
+    integer, public, parameter :: out_leaf_flight   = 78
+    integer, public, parameter :: out_ftemp         = 79
+    integer, public, parameter :: out_fvpd          = 80
+    integer, public, parameter :: out_fxwp          = 81
+    integer, public, parameter :: out_fo3           = 82
+    integer, public, parameter :: out_gsto_final    = 83
+    integer, public, parameter :: out_pngsto_l      = 84
+    integer, public, parameter :: out_pngsto        = 85
+    integer, public, parameter :: out_pngsto_c      = 86
+    integer, public, parameter :: out_pngsto_pet    = 87
+    integer, public, parameter :: out_pngsto_an     = 88
+    integer, public, parameter :: out_st            = 89
+    integer, public, parameter :: out_ppardir       = 90
+    integer, public, parameter :: out_ppardif       = 91
+    integer, public, parameter :: out_fpardir       = 92
+    integer, public, parameter :: out_fpardif       = 93
+    integer, public, parameter :: out_laisun        = 94
+    integer, public, parameter :: out_laishade      = 95
+    integer, public, parameter :: out_parsun        = 96
+    integer, public, parameter :: out_parshade      = 97
+    integer, public, parameter :: out_et_hr         = 98
+    integer, public, parameter :: out_ei_hr         = 99
+    integer, public, parameter :: out_es_hr         = 100
+    integer, public, parameter :: out_es_blocked    = 101
+    integer, public, parameter :: out_asw_fc        = 102
+    integer, public, parameter :: out_asw_max       = 103
+    integer, public, parameter :: out_sgs           = 104
+    integer, public, parameter :: out_egs           = 105
+    integer, public, parameter :: out_ustar_ref_o3  = 106
+    integer, public, parameter :: out_ra_o3zr_i     = 107
+    integer, public, parameter :: out_vd_i          = 108
+    integer, public, parameter :: out_rb_ref        = 109
+    integer, public, parameter :: out_vpd_dd        = 110
+
+    public :: Input_Id
+    public :: Output_Id
+
+contains
+
+    !
+    ! Get the identifier of the input variable called name (in lower case), or 0
+    ! if there is no such variable
+    !
+    function Input_Id(name) result(id)
+        character(len=*), intent(in) :: name
+        integer :: id
+
+        select case (name)
+        case ('yr')
+            id = in_yr
+        case ('mm')
+            id = in_mm
+        case ('mdd')
+            id = in_mdd
+        case ('dd')
+            id = in_dd
+        case ('td')
+            id = in_td
+        case ('hr')
+            id = in_hr
+        case ('ts_c')
+            id = in_ts_c
+        case ('tleaf')
+            id = in_tleaf
+        case ('vpd')
+            id = in_vpd
+        case ('uh_zr')
+            id = in_uh_zr
+        case ('precip')
+            id = in_precip
+        case ('p')
+            id = in_p
+        case ('o3_ppb_zr')
+            id = in_o3_ppb_zr
+        case ('co2')
+            id = in_co2
+        case ('hd')
+            id = in_hd
+        case ('r')
+            id = in_r
+        case ('par')
+            id = in_par
+        case ('rn')
+            id = in_rn
+        case ('cloudfrac')
+            id = in_cloudfrac
+        case ('leaf_fphen_input')
+            id = in_leaf_fphen_input
+        case ('ustar')
+            id = in_ustar
+        case ('ustar_ref')
+            id = in_ustar_ref
+        case ('fswp')
+            id = in_fswp
+        case ('asw')
+            id = in_asw
+        case default
+            id = 0
+        end select
+    end function Input_Id
+
+    !
+    ! Get the identifier of the output variable called name (in lower case), or 0
+    ! if there is no such variable
+    !
+    function Output_Id(name) result(id)
+        character(len=*), intent(in) :: name
+        integer :: id
+
+        select case (name)
+        case ('yr')
+            id = out_yr
+        case ('mm')
+            id = out_mm
+        case ('mdd')
+            id = out_mdd
+        case ('dd')
+            id = out_dd
+        case ('td')
+            id = out_td
+        case ('cloudfrac')
+            id = out_cloudfrac
+        case ('hr')
+            id = out_hr
+        case ('ts_c')
+            id = out_ts_c
+        case ('tleaf')
+            id = out_tleaf
+        case ('vpd')
+            id = out_vpd
+        case ('uh_zr')
+            id = out_uh_zr
+        case ('precip')
+            id = out_precip
+        case ('precip_acc')
+            id = out_precip_acc
+        case ('p')
+            id = out_p
+        case ('o3_ppb_zr')
+            id = out_o3_ppb_zr
+        case ('co2')
+            id = out_co2
+        case ('hd')
+            id = out_hd
+        case ('r')
+            id = out_r
+        case ('par')
+            id = out_par
+        case ('ustar')
+            id = out_ustar
+        case ('ustar_ref')
+            id = out_ustar_ref
+        case ('uh_i')
+            id = out_uh_i
+        case ('uh')
+            id = out_uh
+        case ('rn')
+            id = out_rn
+        case ('rn_w')
+            id = out_rn_w
+        case ('sinb')
+            id = out_sinb
+        case ('invl')
+            id = out_invl
+        case ('pardir')
+            id = out_pardir
+        case ('pardif')
+            id = out_pardif
+        case ('ra')
+            id = out_ra
+        case ('ra_tar_i')
+            id = out_ra_tar_i
+        case ('ra_ref_i')
+            id = out_ra_ref_i
+        case ('rb')
+            id = out_rb
+        case ('rsur')
+            id = out_rsur
+        case ('rinc')
+            id = out_rinc
+        case ('rsto')
+            id = out_rsto
+        case ('gsto')
+            id = out_gsto
+        case ('rsto_l')
+            id = out_rsto_l
+        case ('rsun_l')
+            id = out_rsun_l
+        case ('gsto_l')
+            id = out_gsto_l
+        case ('gsun_l')
+            id = out_gsun_l
+        case ('gsun_l_ms')
+            id = out_gsun_l_ms
+        case ('rsto_c')
+            id = out_rsto_c
+        case ('gsto_c')
+            id = out_gsto_c
+        case ('rgs')
+            id = out_rgs
+        case ('vd')
+            id = out_vd
+        case ('o3_ppb_i')
+            id = out_o3_ppb_i
+        case ('o3_ppb')
+            id = out_o3_ppb
+        case ('o3_nmol_m3')
+            id = out_o3_nmol_m3
+        case ('fst')
+            id = out_fst
+        case ('fst_sun')
+            id = out_fst_sun
+        case ('afst0')
+            id = out_afst0
+        case ('afsty')
+            id = out_afsty
+        case ('afsty_total')
+            id = out_afsty_total
+        case ('ftot')
+            id = out_ftot
+        case ('ot40')
+            id = out_ot40
+        case ('aot40')
+            id = out_aot40
+        case ('lai')
+            id = out_lai
+        case ('sai')
+            id = out_sai
+        case ('pet')
+            id = out_pet
+        case ('et')
+            id = out_et
+        case ('ei')
+            id = out_ei
+        case ('es')
+            id = out_es
+        case ('sn')
+            id = out_sn
+        case ('per_vol')
+            id = out_per_vol
+        case ('smd')
+            id = out_smd
+        case ('swp')
+            id = out_swp
+        case ('lwp')
+            id = out_lwp
+        case ('asw')
+            id = out_asw
+        case ('sn_meas')
+            id = out_sn_meas
+        case ('swp_meas')
+            id = out_swp_meas
+        case ('smd_meas')
+            id = out_smd_meas
+        case ('fphen')
+            id = out_fphen
+        case ('leaf_fphen')
+            id = out_leaf_fphen
+        case ('flight')
+            id = out_flight
+        case ('flightsun')
+            id = out_flightsun
+        case ('flightshade')
+            id = out_flightshade
+        case ('leaf_flight')
+            id = out_leaf_flight
+        case ('ftemp')
+            id = out_ftemp
+        case ('fvpd')
+            id = out_fvpd
+        case ('fxwp')
+            id = out_fxwp
+        case ('fo3')
+            id = out_fo3
+        case ('gsto_final')
+            id = out_gsto_final
+        case ('pngsto_l')
+            id = out_pngsto_l
+        case ('pngsto')
+            id = out_pngsto
+        case ('pngsto_c')
+            id = out_pngsto_c
+        case ('pngsto_pet')
+            id = out_pngsto_pet
+        case ('pngsto_an')
+            id = out_pngsto_an
+        case ('st')
+            id = out_st
+        case ('ppardir')
+            id = out_ppardir
+        case ('ppardif')
+            id = out_ppardif
+        case ('fpardir')
+            id = out_fpardir
+        case ('fpardif')
+            id = out_fpardif
+        case ('laisun')
+            id = out_laisun
+        case ('laishade')
+            id = out_laishade
+        case ('parsun')
+            id = out_parsun
+        case ('parshade')
+            id = out_parshade
+        case ('et_hr')
+            id = out_et_hr
+        case ('ei_hr')
+            id = out_ei_hr
+        case ('es_hr')
+            id = out_es_hr
+        case ('es_blocked')
+            id = out_es_blocked
+        case ('asw_fc')
+            id = out_asw_fc
+        case ('asw_max')
+            id = out_asw_max
+        case ('sgs')
+            id = out_sgs
+        case ('egs')
+            id = out_egs
+        case ('ustar_ref_o3')
+            id = out_ustar_ref_o3
+        case ('ra_o3zr_i')
+            id = out_ra_o3zr_i
+        case ('vd_i')
+            id = out_vd_i
+        case ('rb_ref')
+            id = out_rb_ref
+        case ('vpd_dd')
+            id = out_vpd_dd
+        case default
+            id = 0
+        end select
+    end function Output_Id
+
+end module Batch
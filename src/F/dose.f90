@@ -1,26 +1,40 @@
+!
+! Run the model as set up by the namelist file dose.nml, in the working
+! directory, which has the groups:
+!
+!   &model_options and &model_parameters, as written for a project by
+!   do3se.model.save_settings (see Read_Settings)
+!
+!   &run_files, with the input_file and output_file names, the output_fields
+!   to write (separated by commas or spaces) and whether to write them as
+!   binary, e.g.
+!
+!   &run_files
+!       input_file = "input.csv"
+!       output_file = "output.dat"
+!       output_fields = "dd, hr, afsty, aot40"
+!       binary = .true.
+!   /
+!
 program Run_DOSE
-    use Switchboard
-    use Options
-    use Run
-    CHARACTER(len=255) :: homedir
-    CHARACTER(len=255) :: input_path
-    CHARACTER(len=255) :: output_path
+    use Files, only: Read_Settings, Run_With_Files
 
-    sai_method = sai_equals_lai
-    rn_method = rn_calculate
-    leaf_fphen_method = leaf_fphen_equals_fphen
-    ra_method = ra_simple
-    fo3_method = fo3_disabled
-    fswp_method = fswp_exponential
-    lwp_method = lwp_non_steady_state
-    fxwp_method = fxwp_disabled
-    r_par_method = r_par_use_inputs
-    sgs_egs_method = sgs_egs_use_inputs
+    character(len=255) :: input_file = "input.csv"
+    character(len=255) :: output_file = "output.csv"
+    character(len=4096) :: output_fields = "dd, hr, afsty, aot40"
+    logical :: binary = .false.
+    namelist /run_files/ input_file, output_file, output_fields, binary
+    integer :: status
 
-    homedir = "tests/spanish_wheat_DO3SE_3_1/"
-    input_path = trim(homedir) // "input.csv"
-    output_path = trim(homedir) // "output3.csv"
-    ! call Run_With_Files("inputb.csv", "output.csv")
-    call Run_With_Files(input_path, output_path)
-end program Run_DOSE
+    call Read_Settings("dose.nml")
+
+    open(unit=10, file="dose.nml", status="old", action="read")
+    read(unit=10, nml=run_files)
+    close(unit=10)
 
+    call Run_With_Files(trim(input_file), trim(output_file), &
+                        output_fields, binary, status)
+    if (status /= 0) then
+        stop 1
+    end if
+end program Run_DOSE
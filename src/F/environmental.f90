@@ -1,6 +1,7 @@
 module Environmental
 
     public :: Calc_ftemp, Calc_fVPD, Calc_Flight, Calc_PAR_from_cloudfrac
+    public :: ftemp_curve, fVPD_curve, Canopy_Light, PAR_From_cloudfrac, ST_From_PAR
 
 contains
 
@@ -15,6 +16,13 @@ contains
         use Inputs, only: Ts_c, PAR
         use Parameters, only: T_max, T_min, T_opt, fmin
 
+        ftemp = ftemp_curve(Ts_C, PAR, T_min, T_opt, T_max, fmin)
+    end subroutine Calc_ftemp
+
+    elemental function ftemp_curve(Ts_C, PAR, T_min, T_opt, T_max, fmin) result(ftemp)
+        real, intent(in) :: Ts_C, PAR, T_min, T_opt, T_max, fmin
+        real :: ftemp
+
         real :: bt
         if (PAR > 0) then
             bt = (T_max - T_opt) / (T_opt - T_min)
@@ -23,7 +31,7 @@ contains
             ftemp = 0
         endif
 
-    end subroutine Calc_ftemp
+    end function ftemp_curve
 
     !***************************************************************************
     ! Calculate fVPD (vapour pressure deficit related g)
@@ -34,26 +42,48 @@ contains
         use Inputs, only: VPD
         use Parameters, only: fmin, VPD_min, VPD_max
 
+        fVPD = fVPD_curve(VPD, fmin, VPD_min, VPD_max)
+    end subroutine Calc_fVPD
+
+    elemental function fVPD_curve(VPD, fmin, VPD_min, VPD_max) result(fVPD)
+        real, intent(in) :: VPD, fmin, VPD_min, VPD_max
+        real :: fVPD
+
         fVPD = ((1 - fmin)*(VPD_min - VPD)/(VPD_min - VPD_max)) + fmin
         fVPD = max(fVPD, fmin)
 
         if ( fVPD > 1 ) then
             fVPD = 1
         end if
-    end subroutine Calc_fVPD
+    end function fVPD_curve
 
 
     !==========================================================================
     ! Calculate Flight and flight with PAR
     !==========================================================================
     subroutine Calc_Flight()
-        use Constants, only: seaP, Wm2_uE
         use Parameters, only: f_lightfac, cosA
         use Inputs, only: sinB, PAR
         use Variables, only: LAI, Flight, leaf_flight, Flightsun, Flightshade
         use Variables, only: fPARdir, fPARdif, &
                 LAIsun, LAIshade, PARsun, PARshade, PARdir, PARdif
 
+        call Canopy_Light(sinB, PAR, LAI, cosA, f_lightfac, fPARdir, fPARdif, &
+                          PARdir, PARdif, LAIsun, LAIshade, PARshade, PARsun, &
+                          leaf_flight, Flightsun, Flightshade, Flight)
+    end subroutine Calc_Flight
+
+    pure subroutine Canopy_Light(sinB, PAR, LAI, cosA, f_lightfac, fPARdir, fPARdif, &
+                                 PARdir, PARdif, LAIsun, LAIshade, PARshade, PARsun, &
+                                 leaf_flight, Flightsun, Flightshade, Flight)
+        use Constants, only: Wm2_uE
+
+        real, intent(in) :: sinB, PAR, LAI, cosA, f_lightfac, fPARdir, fPARdif
+        real, intent(out) :: PARdir, PARdif, PARshade, PARsun
+        ! Left as they are when there is no light
+        real, intent(inout) :: LAIsun, LAIshade
+        real, intent(out) :: leaf_flight, Flightsun, Flightshade, Flight
+
         real :: cosT
 
         cosT = sinB
@@ -89,7 +119,7 @@ contains
             Flightsun = 0
             Flightshade = 0
         end if
-    end subroutine Calc_Flight
+    end subroutine Canopy_Light
 
 
     !==========================================================================
@@ -100,11 +130,21 @@ contains
     ! From discussion on EMEP email chain 03-2021
     !==========================================================================
     subroutine Calc_PAR_from_cloudfrac()
-        use Constants, only: seaP, Wm2_uE
         use Inputs, only: P, sinB, cloudfrac, PAR
         use Variables, only: pPARdir, pPARdif, fPARdir, fPARdif, &
               PARdir, PARdif, ST, LAI
 
+        call PAR_From_cloudfrac(P, sinB, cloudfrac, LAI, pPARdir, pPARdif, &
+                                fPARdir, fPARdif, PARdir, PARdif, ST, PAR)
+    end subroutine Calc_PAR_from_cloudfrac
+
+    pure subroutine PAR_From_cloudfrac(P, sinB, cloudfrac, LAI, pPARdir, pPARdif, &
+                                       fPARdir, fPARdif, PARdir, PARdif, ST, PAR)
+        use Constants, only: seaP
+
+        real, intent(in) :: P, sinB, cloudfrac, LAI
+        real, intent(out) :: pPARdir, pPARdif, fPARdir, fPARdif, PARdir, PARdif, ST, PAR
+
         real :: m, pPARtotal, cosT
 
         cosT = sinB
@@ -148,18 +188,28 @@ contains
             pPARdif = 0
             fPARdif = 0
         end if
-    end subroutine Calc_PAR_from_cloudfrac
+    end subroutine PAR_From_cloudfrac
 
 
     !==========================================================================
     ! Calculate Sky transmissivity from PAR
     !==========================================================================
     subroutine Calc_ST_from_PAR()
-        use Constants, only: seaP
         use Inputs, only: P, sinB, PAR
         use Variables, only: pPARdir, pPARdif, fPARdir, fPARdif, &
               ST, LAI
 
+        call ST_From_PAR(P, sinB, PAR, LAI, pPARdir, pPARdif, fPARdir, fPARdif, ST)
+    end subroutine Calc_ST_from_PAR
+
+    pure subroutine ST_From_PAR(P, sinB, PAR, LAI, pPARdir, pPARdif, fPARdir, fPARdif, ST)
+        use Constants, only: seaP
+
+        real, intent(in) :: P, sinB, PAR, LAI
+        ! Only the direct fraction is set when there is no light
+        real, intent(inout) :: pPARdir, pPARdif, fPARdif
+        real, intent(out) :: fPARdir, ST
+
         real :: m, pPARtotal
 
         if (sinB > 0 .and. LAI > 0) then
@@ -182,7 +232,7 @@ contains
             fPARdir=0
             fPARdir=0
         end if
-    end subroutine Calc_ST_from_PAR
+    end subroutine ST_From_PAR
 
     !==========================================================================
     ! Calculate Flight and flight with cloudFrac
@@ -0,0 +1,339 @@
+!
+! Run the model from files, without Python
+!
+! The model options and parameters are read from the &model_options and
+! &model_parameters groups of a namelist file, which can be written for a
+! project with do3se.model.save_settings.  The first line of the input file
+! names its columns, with the same names as the Python model's input fields
+! (see Input_Id in Batch), and the outputs to write are chosen by name in the
+! same way.
+!
+module Files
+
+    public :: Read_Settings
+    public :: Write_Settings
+    public :: Run_With_Files
+
+    integer, private, parameter :: max_fields = 200
+    integer, private, parameter :: name_len = 32
+    integer, private, parameter :: line_len = 8192
+
+    integer, private :: settingsunit = 10
+    integer, private :: inunit = 8
+    integer, private :: outunit = 9
+
+    ! Input values are set to this before each row is read, to find values
+    ! that are missing from the row
+    real, private, parameter :: missing = -huge(1.0)
+
+contains
+
+    !
+    ! Read the model options and parameters from a namelist file
+    !
+    subroutine Read_Settings(path)
+        character(len=*), intent(in) :: path
+
+        call Settings_File(path, .false.)
+    end subroutine Read_Settings
+
+    !
+    ! Write the current model options and parameters to a namelist file
+    !
+    subroutine Write_Settings(path)
+        character(len=*), intent(in) :: path
+
+        call Settings_File(path, .true.)
+    end subroutine Write_Settings
+
+    subroutine Settings_File(path, write_file)
+        use Options, only: sai_method, rn_method, leaf_fphen_method, &
+                           ra_method, tleaf_method, gsto_method, fo3_method, &
+                           fswp_method, asw_method, lwp_method, fxwp_method, &
+                           r_par_method, sgs_egs_method, ustar_method
+        use Parameters, only: Rsoil, soil_b, Fc_m, SWP_AE, Ksat, uzR, O3zR, &
+                              xzR, D_meas, u_h, u_d, u_zo, O3_h, O3_d, &
+                              O3_zo, lat, lon, elev, T_min, T_opt, T_max, &
+                              VPD_min, VPD_max, VPD_crit, SWP_min, SWP_max, &
+                              ASW_FC_override, ASW_min, ASW_max, gmax, &
+                              gmorph, fmin, albedo, root, h, zo, d, SGS, &
+                              EGS, mid_anthesis, LAI_a, LAI_b, LAI_c, LAI_d, &
+                              LAI_1, LAI_2, fphen_limA, fphen_limB, fphen_a, &
+                              fphen_b, fphen_c, fphen_d, fphen_e, fphen_1, &
+                              fphen_2, fphen_3, fphen_4, Astart, Aend, &
+                              leaf_fphen_a, leaf_fphen_b, leaf_fphen_c, &
+                              leaf_fphen_1, leaf_fphen_2, cosA, f_lightfac, &
+                              Rext, Rinc_b, Lm, Y, g_sto_0, m, V_cmax_25, &
+                              J_max_25
+
+        character(len=*), intent(in) :: path
+        logical, intent(in) :: write_file
+
+        namelist /model_options/ sai_method, rn_method, leaf_fphen_method, &
+                                 ra_method, tleaf_method, gsto_method, &
+                                 fo3_method, fswp_method, asw_method, &
+                                 lwp_method, fxwp_method, r_par_method, &
+                                 sgs_egs_method, ustar_method
+        namelist /model_parameters/ Rsoil, soil_b, Fc_m, SWP_AE, Ksat, uzR, &
+                                    O3zR, xzR, D_meas, u_h, u_d, u_zo, O3_h, &
+                                    O3_d, O3_zo, lat, lon, elev, T_min, &
+                                    T_opt, T_max, VPD_min, VPD_max, &
+                                    VPD_crit, SWP_min, SWP_max, &
+                                    ASW_FC_override, ASW_min, ASW_max, gmax, &
+                                    gmorph, fmin, albedo, root, h, zo, d, &
+                                    SGS, EGS, mid_anthesis, LAI_a, LAI_b, &
+                                    LAI_c, LAI_d, LAI_1, LAI_2, fphen_limA, &
+                                    fphen_limB, fphen_a, fphen_b, fphen_c, &
+                                    fphen_d, fphen_e, fphen_1, fphen_2, &
+                                    fphen_3, fphen_4, Astart, Aend, &
+                                    leaf_fphen_a, leaf_fphen_b, &
+                                    leaf_fphen_c, leaf_fphen_1, &
+                                    leaf_fphen_2, cosA, f_lightfac, Rext, &
+                                    Rinc_b, Lm, Y, g_sto_0, m, V_cmax_25, &
+                                    J_max_25
+
+        if (write_file) then
+            open(unit=settingsunit, file=path, status="replace", &
+                 action="write")
+            write(unit=settingsunit, nml=model_options)
+            write(unit=settingsunit, nml=model_parameters)
+        else
+            open(unit=settingsunit, file=path, status="old", action="read")
+            read(unit=settingsunit, nml=model_options)
+            ! Allow the groups to be in either order
+            rewind(settingsunit)
+            read(unit=settingsunit, nml=model_parameters)
+        end if
+        close(unit=settingsunit)
+    end subroutine Settings_File
+
+    !
+    ! Run the model over the rows of infile, writing the outputs named in
+    ! output_fields (separated by commas or spaces) to outfile
+    !
+    ! The input file is comma separated, with a header line naming the
+    ! columns.  Unknown columns are ignored, and rows that are missing values
+    ! or have the wrong number of values are reported and skipped.  The
+    ! outputs are written as comma separated values with a header line or, if
+    ! binary is true, as raw default kind reals, a record of one value for
+    ! each output for each row.
+    !
+    ! status is 0 if the run was done, or 1 if an output field is unknown.
+    !
+    subroutine Run_With_Files(infile, outfile, output_fields, binary, status)
+        use Run, only: Initialise
+        use Batch, only: Input_Id, Output_Id
+        use State, only: Run_Batch
+
+        character(len=*), intent(in) :: infile, outfile, output_fields
+        logical, intent(in) :: binary
+        integer, intent(out) :: status
+
+        character(len=line_len) :: line
+        character(len=name_len), dimension(max_fields) :: names
+        integer, dimension(max_fields) :: input_ids, output_ids
+        real, dimension(max_fields) :: values
+        real, dimension(1, max_fields) :: outputs
+        integer :: nin, nout, i, ios, row, line_no, n, rec_len
+
+        status = 0
+
+        open(unit=inunit, file=infile, status="old", action="read", &
+             position="rewind")
+
+        ! Map the input columns from the header line
+        read(unit=inunit, fmt="(a)") line
+        call Split_Names(line, names, nin)
+        do i = 1, nin
+            input_ids(i) = Input_Id(names(i))
+            if (input_ids(i) == 0) then
+                print *, "Ignoring unknown input column: ", trim(names(i))
+            end if
+        end do
+
+        call Split_Names(output_fields, names, nout)
+        do i = 1, nout
+            output_ids(i) = Output_Id(names(i))
+            if (output_ids(i) == 0) then
+                print *, "Unknown output field: ", trim(names(i))
+                close(unit=inunit)
+                status = 1
+                return
+            end if
+        end do
+
+        if (binary) then
+            inquire(iolength=rec_len) values(1:nout)
+            open(unit=outunit, file=outfile, status="replace", &
+                 action="write", access="direct", form="unformatted", &
+                 recl=rec_len)
+        else
+            open(unit=outunit, file=outfile, status="replace", &
+                 action="write", position="rewind")
+            line = names(1)
+            do i = 2, nout
+                line = trim(line) // "," // names(i)
+            end do
+            write(unit=outunit, fmt="(a)") trim(line)
+        end if
+
+        call Initialise()
+
+        row = 0
+        line_no = 1
+        do
+            ! Read a whole line first, so that a short row can't run on into
+            ! the next one
+            read(unit=inunit, fmt="(a)", iostat=ios) line
+            if (ios /= 0) then
+                exit
+            end if
+            line_no = line_no + 1
+            if (len_trim(line) == 0) then
+                cycle
+            end if
+
+            n = Count_Values(line)
+            if (n /= nin) then
+                print *, "Skipping input line ", line_no, " with ", n, &
+                         " values instead of ", nin
+                cycle
+            end if
+
+            values(1:nin) = missing
+            read(line, fmt=*, iostat=ios) values(1:nin)
+            if (ios /= 0) then
+                print *, "Stopped at invalid input on line ", line_no
+                exit
+            end if
+            if (any(values(1:nin) == missing)) then
+                print *, "Skipping input line ", line_no, ", which is missing values"
+                cycle
+            end if
+
+            ! Unknown columns have id 0, which doesn't set anything
+            call Run_Batch(input_ids(1:nin), reshape(values(1:nin), (/ nin, 1 /)), &
+                           output_ids(1:nout), outputs(:, 1:nout), nin, 1, nout)
+
+            row = row + 1
+            if (binary) then
+                write(unit=outunit, rec=row) outputs(1, 1:nout)
+            else
+                call Write_CSV_Row(outputs(1, 1:nout))
+            end if
+        end do
+
+        close(unit=inunit)
+        close(unit=outunit)
+
+    contains
+
+        !
+        ! Split a list of names, separated by commas or spaces, into lower case
+        ! names
+        !
+        subroutine Split_Names(list, names, n)
+            character(len=*), intent(in) :: list
+            character(len=name_len), dimension(max_fields), intent(out) :: names
+            integer, intent(out) :: n
+
+            integer :: i, start
+            character :: c
+
+            n = 0
+            start = 0
+            do i = 1, len_trim(list) + 1
+                c = " "
+                if (i <= len_trim(list)) then
+                    c = list(i:i)
+                end if
+                if (c == "," .or. c == " " .or. c == achar(9) .or. c == achar(13)) then
+                    if (start > 0 .and. n < max_fields) then
+                        n = n + 1
+                        names(n) = Lower_Case(list(start:i-1))
+                    end if
+                    start = 0
+                else if (start == 0) then
+                    start = i
+                end if
+            end do
+        end subroutine Split_Names
+
+        !
+        ! Count the values in a line of list-directed input, where values are
+        ! separated by a comma or by spaces, and a comma with no value before
+        ! it (or a trailing comma) marks an empty value
+        !
+        function Count_Values(line) result(n)
+            character(len=*), intent(in) :: line
+            integer :: n
+
+            integer, parameter :: line_start = 0, in_value = 1, &
+                                  after_value = 2, after_comma = 3
+            integer :: i, state
+            character :: c
+
+            n = 0
+            state = line_start
+            do i = 1, len_trim(line)
+                c = line(i:i)
+                if (c == ",") then
+                    if (state == line_start .or. state == after_comma) then
+                        n = n + 1
+                    end if
+                    state = after_comma
+                else if (c == " " .or. c == achar(9) .or. c == achar(13)) then
+                    if (state == in_value) then
+                        state = after_value
+                    end if
+                else if (state /= in_value) then
+                    n = n + 1
+                    state = in_value
+                end if
+            end do
+            if (state == after_comma) then
+                n = n + 1
+            end if
+        end function Count_Values
+
+        function Lower_Case(s) result(lower)
+            character(len=*), intent(in) :: s
+            character(len=name_len) :: lower
+
+            integer :: i, c
+
+            lower = s
+            do i = 1, len_trim(lower)
+                c = iachar(lower(i:i))
+                if (c >= iachar("A") .and. c <= iachar("Z")) then
+                    lower(i:i) = achar(c + 32)
+                end if
+            end do
+        end function Lower_Case
+
+        !
+        ! Write a row of output values, with enough digits to read them back
+        ! exactly
+        !
+        subroutine Write_CSV_Row(values)
+            real, dimension(:), intent(in) :: values
+
+            character(len=line_len) :: line
+            character(len=20) :: value
+            integer :: i
+
+            line = ""
+            do i = 1, size(values)
+                write(value, "(g17.9)") values(i)
+                if (i == 1) then
+                    line = adjustl(value)
+                else
+                    line = trim(line) // "," // adjustl(value)
+                end if
+            end do
+            write(unit=outunit, fmt="(a)") trim(line)
+        end subroutine Write_CSV_Row
+
+    end subroutine Run_With_Files
+
+end module Files
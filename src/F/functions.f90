@@ -76,7 +76,7 @@ contains
     !==========================================================================
     ! Conversions between degrees and radians
     !==========================================================================
-    function deg2rad(x) result(retval)
+    elemental function deg2rad(x) result(retval)
         use Constants, only: D2R => DEG2RAD
         real, intent(in) :: x
         real :: retval
@@ -84,7 +84,7 @@ contains
         retval = x * D2R
     end function deg2rad
 
-    function rad2deg(x) result(retval)
+    elemental function rad2deg(x) result(retval)
         use Constants, only: D2R => DEG2RAD
         real, intent(in) :: x
         real :: retval
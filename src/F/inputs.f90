@@ -51,14 +51,22 @@ module Inputs
     public :: Calc_Rn
     public :: Calc_humidity
 
+    public :: Wind_From_uh_zR
+    public :: Wind_From_uh_zR_ustar
+    public :: Wind_From_uh_zR_ustar_ref
+    public :: Solar_Position
+    public :: net_radiation
+    public :: Humidity
+
     public :: estimate_velocity
     public :: estimate_ustar
     public :: calc_monin_obukhov_length
 
-    ! These are intermediate variables not used outside of this module
-    real, private :: precip_dd  ! Accumulated precip for today so far
-    real, private :: h          ! "Hour angle" of the sun
-    real, private :: dec        ! Declination (radians)
+    ! These are intermediate variables not used outside of this module, only
+    ! public so that they can be saved with the model state (see State)
+    real, public :: precip_dd   ! Accumulated precip for today so far
+    real, public :: h           ! "Hour angle" of the sun
+    real, public :: dec         ! Declination (radians)
 
 contains
 
@@ -77,7 +85,7 @@ contains
 
 
 
-    function calc_monin_obukhov_length(Tk, ustar, Hd, P) result(L)
+    elemental function calc_monin_obukhov_length(Tk, ustar, Hd, P) result(L)
         use Constants, only: Rmass, k, g, cp
 
         real, intent(in) :: Tk       ! Temperature in K
@@ -94,17 +102,13 @@ contains
         rho = (P * 1000) / (Rmass * Tk)
         ! Monin-Obukhov Length
         L = -(Tk * ustar**3 * rho * cp) / (k * g * (-Hd_f))
-
-        invL = 1/L ! should be -ve in middle of summer day
-
-
     end function
 
 
     !==========================================================================
     ! Estimate integral flux-gradient stability function for momentum
     !==========================================================================
-    function calc_PsiM(zL) result (stab_m)
+    elemental function calc_PsiM(zL) result (stab_m)
         use Constants, only: pi
         !   Out:
         !   PsiM = integral flux-gradient stability function for momentum
@@ -144,7 +148,7 @@ contains
     ! end function estimate_velocity
 
     ! Updated to match EMEP
-    function estimate_velocity(u_ref, z_ref, z, z0, d, invL) result (u)
+    elemental function estimate_velocity(u_ref, z_ref, z, z0, d, invL) result (u)
         real, intent(in) :: u_ref   ! velocity at izR (m/s)
         real, intent(in) :: z_ref   ! reference height (m)
         real, intent(in) :: z       ! Target height (m)
@@ -167,7 +171,7 @@ contains
     end function estimate_velocity
 
 
-        function estimate_velocity_simple(ustar, z, z0) result (u)
+        elemental function estimate_velocity_simple(ustar, z, z0) result (u)
         use Constants, only: K
         real, intent(in) :: ustar   ! Friction velocity (m/s)
         real, intent(in) :: z       ! Height above boundary, e.g. z - d (m)
@@ -182,7 +186,7 @@ contains
     !==========================================================================
     ! Estimate Wind U*
     !==========================================================================
-    function estimate_ustar(u, z, z0, L) result (ustar)
+    elemental function estimate_ustar(u, z, z0, L) result (ustar)
         use Constants, only: K
         real, intent(in) :: u       ! Velocity at height above boundary (m/s)
         real, intent(in) :: z       ! Height above boundary, e.g. z - d (m)
@@ -198,7 +202,7 @@ contains
     end function estimate_ustar
 
 
-    function estimate_ustar_simple(u, z, z0) result (ustar)
+    elemental function estimate_ustar_simple(u, z, z0) result (ustar)
         real, intent(in) :: u       ! Velocity at height above boundary (m/s)
         real, intent(in) :: z       ! Height above boundary, e.g. z - d (m)
         real, intent(in) :: z0      ! Roughness length, height at which u=0 (m)
@@ -223,7 +227,7 @@ contains
         real ::  Tk
         Tk = Ts_C + Ts_K
         L = calc_monin_obukhov_length(Tk, ustar_ref, Hd, P)
-        invL = 1/L
+        invL = 1/L ! should be -ve in middle of summer day
     end subroutine Calc_monin_obukhov_length_row
 
     !==========================================================================
@@ -234,9 +238,19 @@ contains
     ! Derive ustar for the flux canopy and the windspeed at the canopy
     !
     subroutine Calc_ustar_uh()
-        use Constants, only: izR
         use Parameters, only: h, d, zo, u_d, u_zo, uzR
 
+        call Wind_From_uh_zR(uh_zR, h, d, zo, u_d, u_zo, uzR, &
+                             ustar_ref, uh_i, ustar, uh)
+    end subroutine Calc_ustar_uh
+
+    pure subroutine Wind_From_uh_zR(uh_zR, h, d, zo, u_d, u_zo, uzR, &
+                                    ustar_ref, uh_i, ustar, uh)
+        use Constants, only: izR
+
+        real, intent(in) :: uh_zR, h, d, zo, u_d, u_zo, uzR
+        real, intent(out) :: ustar_ref, uh_i, ustar, uh
+
         real, parameter :: MIN_WINDSPEED = 0.1
 
         ! Find ustar over reference canopy
@@ -251,7 +265,7 @@ contains
 
         ! Stop ustar being 0
         ustar = max(0.0001, ustar)
-    end subroutine Calc_ustar_uh
+    end subroutine Wind_From_uh_zR
 
     !==========================================================================
     ! Derive ustar for the flux canopy and the ozone at the canopy
@@ -274,17 +288,24 @@ contains
     ! Input grid ustar
     !==========================================================================
     subroutine Calc_ustar_uh_ustar_i_in()
-        use Constants, only: Rmass, Ts_K, k, g, cp, pi, izR
         use Parameters, only: h, d, zo, uzR
 
-        real :: Tk
+        call Wind_From_uh_zR_ustar_ref(uh_zR, L, invL, h, d, zo, uzR, &
+                                       uh_i, ustar, uh)
+    end subroutine Calc_ustar_uh_ustar_i_in
+
+    pure subroutine Wind_From_uh_zR_ustar_ref(uh_zR, L, invL, h, d, zo, uzR, &
+                                              uh_i, ustar, uh)
+        use Constants, only: izR
+
+        real, intent(in) :: uh_zR, L, invL, h, d, zo, uzR
+        real, intent(out) :: uh_i, ustar, uh
+
         real :: uh_zr_lim
 
         real, parameter :: MIN_WINDSPEED = 0.1
         real, parameter :: MIN_USTAR = 0.1
 
-        Tk = Ts_C + Ts_K
-
         uh_zr_lim = max(MIN_WINDSPEED, uh_zR)
 
         ! Find ustar over reference canopy
@@ -311,7 +332,7 @@ contains
 
         ! Stop ustar being 0
         ustar = max(MIN_USTAR, ustar)
-    end subroutine Calc_ustar_uh_ustar_i_in
+    end subroutine Wind_From_uh_zR_ustar_ref
 
 
 
@@ -319,18 +340,26 @@ contains
     ! Derive ustar for the flux canopy and the windspeed at the canopy
     !==========================================================================
     subroutine Calc_ustar_uh_ustar_in()
-        use Constants, only: Rmass, Ts_K, k, g, cp, pi, izR
         use Parameters, only: h, d, zo, u_d, u_zo, uzR
 
+        call Wind_From_uh_zR_ustar(uh_zR, L, invL, h, d, zo, u_d, u_zo, uzR, &
+                                   ustar_ref, uh_i, uh, ustar)
+    end subroutine Calc_ustar_uh_ustar_in
+
+    pure subroutine Wind_From_uh_zR_ustar(uh_zR, L, invL, h, d, zo, u_d, u_zo, uzR, &
+                                          ustar_ref, uh_i, uh, ustar)
+        use Constants, only: izR
+
+        real, intent(in) :: uh_zR, L, invL, h, d, zo, u_d, u_zo, uzR
+        real, intent(out) :: ustar_ref, uh_i, uh
+        real, intent(inout) :: ustar
+
         ! real :: ustar_ref   ! ustar for where windspeed is measured
-        real :: Tk
         real :: uh_zr_lim
 
         real, parameter :: MIN_WINDSPEED = 0.1
         real, parameter :: MIN_USTAR = 0.1
 
-        Tk = Ts_C + Ts_K
-
         ! Find ustar over reference canopy
         uh_zr_lim = max(MIN_WINDSPEED, uh_zR)
 
@@ -351,7 +380,7 @@ contains
 
         ! Stop ustar being 0
         ustar = max(MIN_USTAR, ustar)
-    end subroutine Calc_ustar_uh_ustar_in
+    end subroutine Wind_From_uh_zR_ustar
     !==========================================================================
     ! Accumulate precipitation for the day, converted to metres
     !==========================================================================
@@ -373,9 +402,17 @@ contains
     ! which are required for Rn calculation.
     !==========================================================================
     subroutine Calc_sinB()
-        ! TODO: document variables
         use Parameters, only: lat, lon
-        use Functions, only: deg2rad, rad2deg
+
+        call Solar_Position(lat, lon, dd, hr, h, dec, sinB)
+    end subroutine Calc_sinB
+
+    pure subroutine Solar_Position(lat, lon, dd, hr, h, dec, sinB)
+        ! TODO: document variables
+        use Functions, only: deg2rad
+
+        real, intent(in) :: lat, lon, dd, hr
+        real, intent(out) :: h, dec, sinB
 
         real :: f, e, t0, LC, lonm
 
@@ -399,17 +436,28 @@ contains
 
         sinB = sin(deg2rad(lat))*sin(dec) + cos(deg2rad(lat))*cos(dec)*cos(h)
         sinB = max(0.0, sinB)
-    end subroutine Calc_sinB
+    end subroutine Solar_Position
 
     !==========================================================================
     ! Calculate net radiation
     !==========================================================================
     subroutine Calc_Rn()
-        ! TODO: document variables
         use Parameters, only: elev, lat
         use Parameters, only: albedo
+
+        Rn = net_radiation(Ts_C, VPD, R, sinB, h, dec, dd, elev, lat, albedo)
+
+        ! Calculate Rn in W/m2
+        Rn_W = Rn * 277.8
+    end subroutine Calc_Rn
+
+    elemental function net_radiation(Ts_C, VPD, R, sinB, h, dec, dd, elev, lat, albedo) result(Rn)
+        ! TODO: document variables
         use Constants, only: pi
-        use Functions, only: deg2rad, rad2deg
+        use Functions, only: deg2rad
+
+        real, intent(in) :: Ts_C, VPD, R, sinB, h, dec, dd, elev, lat, albedo
+        real :: Rn
 
         real :: R_MJ, Ts_K, dr, Re, pR, esat, eact, Rnl, Rns, lat_rad, h1, h2
 
@@ -450,10 +498,7 @@ contains
         else
             Rn = 0
         end if
-
-        ! Calculate Rn in W/m2
-        Rn_W = Rn * 277.8
-    end subroutine Calc_Rn
+    end function net_radiation
 
     !==========================================================================
     ! Calculate leaf temperature
@@ -514,9 +559,16 @@ contains
     ! Calculated saturation/actual vapour pressure and relative humidity
     !==========================================================================
     subroutine Calc_humidity()
+        call Humidity(Ts_C, VPD, esat, eact, RH)
+    end subroutine Calc_humidity
+
+    pure subroutine Humidity(Ts_C, VPD, esat, eact, RH)
+        real, intent(in) :: Ts_C, VPD
+        real, intent(out) :: esat, eact, RH
+
         esat = 0.611 * exp(17.27 * Ts_C / (Ts_C + 237.3))
         eact = esat - VPD
         RH = eact / esat
-    end subroutine Calc_humidity
+    end subroutine Humidity
 
 end module Inputs
@@ -6,6 +6,8 @@ module O3
     public :: Calc_O3_Concentration, Calc_Ftot
     public :: Calc_Fst, Calc_AFstY, Calc_AOT40
     public :: Calc_fO3_Ignore, Calc_fO3_Wheat, Calc_fO3_Potato
+    public :: O3_Concentration, Stomatal_Flux, Accumulate_AFstY, Accumulate_AOT40
+    public :: fO3_wheat_curve, fO3_potato_curve
 
 contains
 
@@ -22,28 +24,55 @@ contains
     ! reference canopy.
     !==========================================================================
     subroutine Calc_O3_Concentration()
-        use Constants, only: k, izR, v, DO3, Pr, Ts_K
-        use Inputs, only: O3_ppb_zR, uh_i, Ts_C, P, ustar, L, invL, ustar_ref_O3
-        use Inputs, only: estimate_ustar,estimate_ustar_simple
+        use Constants, only: izR
+        use Inputs, only: O3_ppb_zR, Ts_C, P, ustar, invL, ustar_ref_O3
         use Variables, only: Ra, Rb, Rsur, Rb_ref
         use Variables, only: Vd, O3_ppb, O3_nmol_m3, Vd_i, O3_ppb_i, Ra_ref_i, &
                              Ra_O3zR_i, Ra_tar_i
         use Parameters, only: O3zR, O3_d, O3_zo, d, zo
-        use R, only: calc_ra_simple => ra_simple, calc_ra_with_heat_flux=>ra_heat_flux, rb_func => rb
+        use R, only: calc_ra_simple => ra_simple, calc_ra_with_heat_flux=>ra_heat_flux
         use Options, only: ra_method, ra_simple, ra_with_heat_flux
 
-
-        real, parameter :: M_O3 = 48.0      ! Molecular weight of O3 (g)
-
-        real ::  Vn
-
-        ! Ra between reference canopy and izR
         select case (ra_method)
             case (ra_simple)
+                ! Ra between reference canopy and izR
                 Ra_ref_i = calc_ra_simple(ustar_ref_O3, O3_zo + O3_d, izR, O3_d)
+                ! Ra between measurement height and izR
+                Ra_O3zR_i = calc_ra_simple(ustar_ref_o3, O3zR, izR, O3_d)
+                ! Ra between target canopy and izR
+                ! Same as Ra from r.f90 but lower height includes +h*0.78 and upper height removes h*0.78
+                ! (ustar already calculated for target canopy)
+                ! NOTE: ustar is calculated for windspeed heights not O3 heights
+                Ra_tar_i = calc_ra_simple(ustar, zo + d, izR, d)
             case (ra_with_heat_flux)
                 Ra_ref_i = calc_ra_with_heat_flux(ustar_ref_O3, O3_zo + O3_d, izR, invL)
+                Ra_O3zR_i = calc_ra_with_heat_flux(ustar_ref_o3, O3zR, izR, invL)
+                Ra_tar_i = calc_ra_with_heat_flux(ustar, zo + d, izR, invL)
         end select
+
+        call O3_Concentration(O3_ppb_zR, Ts_C, P, ustar_ref_O3, Ra, Rb, Rsur, &
+                              Ra_ref_i, Ra_O3zR_i, Ra_tar_i, &
+                              Rb_ref, Vd_i, O3_ppb_i, Vd, O3_ppb, O3_nmol_m3)
+    end subroutine Calc_O3_Concentration
+
+    !
+    ! Calc_O3_Concentration, given the aerodynamic resistances between izR and
+    ! the reference canopy, the O3 measurement height and the target canopy
+    !
+    pure subroutine O3_Concentration(O3_ppb_zR, Ts_C, P, ustar_ref_O3, Ra, Rb, Rsur, &
+                                     Ra_ref_i, Ra_O3zR_i, Ra_tar_i, &
+                                     Rb_ref, Vd_i, O3_ppb_i, Vd, O3_ppb, O3_nmol_m3)
+        use Constants, only: DO3, Ts_K
+        use R, only: rb_func => rb
+
+        real, intent(in) :: O3_ppb_zR, Ts_C, P, ustar_ref_O3, Ra, Rb, Rsur
+        real, intent(in) :: Ra_ref_i, Ra_O3zR_i, Ra_tar_i
+        real, intent(out) :: Rb_ref, Vd_i, O3_ppb_i, Vd, O3_ppb, O3_nmol_m3
+
+        real, parameter :: M_O3 = 48.0      ! Molecular weight of O3 (g)
+
+        real ::  Vn
+
         ! Rb for reference canopy
         Rb_ref = rb_func(ustar_ref_o3, DO3)
         ! Deposition velocity at izR over reference canopy
@@ -51,28 +80,10 @@ contains
         ! The deposition velocity between the measured height and decoupled height is
         ! effected by the canopy below the measured height not our modelled canopy!s
         Vd_i = 1.0 / (Ra_ref_i + Rb_ref + Rsur)
-        ! Ra between measurement height and izR
-        select case (ra_method)
-            case (ra_simple)
-                Ra_O3zR_i = calc_ra_simple(ustar_ref_o3, O3zR, izR, O3_d)
-            case (ra_with_heat_flux)
-                Ra_O3zR_i = calc_ra_with_heat_flux(ustar_ref_o3, O3zR, izR, invL)
-        end select
 
         ! O3 concentration at izR
         O3_ppb_i = O3_ppb_zR / (1.0 - (Ra_O3zR_i * Vd_i))
 
-        ! Ra between target canopy and izR
-        ! Same as Ra from r.f90 but lower height includes +h*0.78 and upper height removes h*0.78
-        ! (ustar already calculated for target canopy)
-        ! NOTE: ustar is calculated for windspeed heights not O3 heights
-        select case (ra_method)
-            case (ra_simple)
-                Ra_tar_i = calc_ra_simple(ustar, zo + d, izR, d)
-            case (ra_with_heat_flux)
-                Ra_tar_i = calc_ra_with_heat_flux(ustar, zo + d, izR, invL)
-        end select
-
         ! Deposition velocity at izR over target canopy
         Vd = 1.0 / (Ra_tar_i + Rb + Rsur)
         ! O3 concentration at target canopy
@@ -83,7 +94,7 @@ contains
         Vn = 8.314510 * ((Ts_C + Ts_K) / P)
         ! Convert to nmol/m^3
         O3_nmol_m3 = (1.0/Vn) * O3_ppb * M_O3 * 20.833  ! 1 microgram O3 = 20.833 nmol/m^3
-    end subroutine Calc_O3_Concentration
+    end subroutine O3_Concentration
 
     !==========================================================================
     ! Calculate the total ozone flux to the vegetated surface
@@ -102,6 +113,13 @@ contains
         use Inputs, only: uh
         use Variables, only: Gsto_l, Rsto_l, O3_nmol_m3, Fst, Fst_sun, Rsun_l
 
+        call Stomatal_Flux(Gsto_l, Rsto_l, Rsun_l, O3_nmol_m3, uh, Lm, Rext, Fst, Fst_sun)
+    end subroutine Calc_Fst
+
+    pure subroutine Stomatal_Flux(Gsto_l, Rsto_l, Rsun_l, O3_nmol_m3, uh, Lm, Rext, Fst, Fst_sun)
+        real, intent(in) :: Gsto_l, Rsto_l, Rsun_l, O3_nmol_m3, uh, Lm, Rext
+        real, intent(out) :: Fst, Fst_sun
+
         real :: leaf_rb, leaf_r_l, leaf_rs
 
 
@@ -116,7 +134,7 @@ contains
             Fst = 0
             Fst_sun = 0
         end if
-    end subroutine Calc_Fst
+    end subroutine Stomatal_Flux
 
     !==========================================================================
     ! Calculate the accumulated stomatal flux above threshold Y
@@ -125,12 +143,19 @@ contains
         use Variables, only: Fst, Fst_sun, AFstY, AFst0, AFstY_total
         use Parameters, only: Y
 
+        call Accumulate_AFstY(Fst, Fst_sun, Y, AFst0, AFstY, AFstY_total)
+    end subroutine Calc_AFstY
+
+    pure subroutine Accumulate_AFstY(Fst, Fst_sun, Y, AFst0, AFstY, AFstY_total)
+        real, intent(in) :: Fst, Fst_sun, Y
+        real, intent(inout) :: AFst0, AFstY, AFstY_total
+
         ! Fst == 0 if Gsto_l == 0 (and Gsto_l == 0 if leaf_fphen == 0), so no
         ! need to check leaf_fphen
         AFst0 = AFst0 + ((Fst_sun*60*60)/1000000)
         AFstY = AFstY + ((max(0.0, Fst_sun - Y)*60*60)/1000000)
         AFstY_total = AFstY_total + ((max(0.0, Fst - Y)*60*60)/1000000)
-    end subroutine Calc_AFstY
+    end subroutine Accumulate_AFstY
 
 
     !==========================================================================
@@ -140,6 +165,14 @@ contains
         use Inputs, only: R
         use Variables, only: OT0, OT40, AOT0, AOT40, O3_ppb, fphen, leaf_fphen
 
+        call Accumulate_AOT40(R, O3_ppb, fphen, leaf_fphen, OT0, OT40, AOT0, AOT40)
+    end subroutine Calc_AOT40
+
+    pure subroutine Accumulate_AOT40(R, O3_ppb, fphen, leaf_fphen, OT0, OT40, AOT0, AOT40)
+        real, intent(in) :: R, O3_ppb, fphen, leaf_fphen
+        real, intent(out) :: OT0, OT40
+        real, intent(inout) :: AOT0, AOT40
+
         ! Default OT0 and OT40 to 0
         OT0 = 0
         OT40 = 0
@@ -159,7 +192,7 @@ contains
         ! Accumulate
         AOT0 = AOT0 + OT0
         AOT40 = AOT40 + OT40
-    end subroutine Calc_AOT40
+    end subroutine Accumulate_AOT40
 
     !==========================================================================
     ! Set fO3 to 1.0, so it is ignored by Gsto calculation
@@ -176,16 +209,30 @@ contains
     subroutine Calc_fO3_Wheat()
         use Variables, only: AFst0, fO3
 
-        fO3 = ((1+(AFst0/11.5)**10)**(-1))
+        fO3 = fO3_wheat_curve(AFst0)
     end subroutine Calc_fO3_Wheat
 
+    elemental function fO3_wheat_curve(AFst0) result(fO3)
+        real, intent(in) :: AFst0
+        real :: fO3
+
+        fO3 = ((1+(AFst0/11.5)**10)**(-1))
+    end function fO3_wheat_curve
+
     !==========================================================================
     ! Calculate fO3 for potato
     !==========================================================================
     subroutine Calc_fO3_Potato()
         use Variables, only: AOT0, fO3
 
-        fO3 = ((1+(AOT0/40)**5)**(-1))
+        fO3 = fO3_potato_curve(AOT0)
     end subroutine Calc_fO3_Potato
 
+    elemental function fO3_potato_curve(AOT0) result(fO3)
+        real, intent(in) :: AOT0
+        real :: fO3
+
+        fO3 = ((1+(AOT0/40)**5)**(-1))
+    end function fO3_potato_curve
+
 end module O3
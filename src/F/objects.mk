@@ -11,4 +11,7 @@ objects = constants.o \
 		  o3.o \
 		  pn_gsto.o \
 		  switchboard.o \
-		  run.o
+		  batch.o \
+		  state.o \
+		  run.o \
+		  files.o
@@ -5,6 +5,8 @@ module Phenology
     public :: Calc_SAI_Wheat
     public :: Calc_fphen
     public :: Calc_leaf_fphen_fixed_day
+    public :: LAI_Polygon, sai_wheat_curve, Fphen_Polygon
+    public :: Leaf_Fphen_Fixed_Day, Leaf_Fphen_Thermal_Time
 
 contains
 
@@ -40,6 +42,15 @@ contains
         use Inputs, only: dd
         use Variables, only: LAI
 
+        call LAI_Polygon(dd, SGS, EGS, LAI_a, LAI_b, LAI_c, LAI_d, LAI_1, LAI_2, LAI)
+    end subroutine Calc_LAI
+
+    pure subroutine LAI_Polygon(dd, SGS, EGS, LAI_a, LAI_b, LAI_c, LAI_d, LAI_1, LAI_2, LAI)
+        real, intent(in) :: dd
+        integer, intent(in) :: SGS, EGS
+        real, intent(in) :: LAI_a, LAI_b, LAI_c, LAI_d, LAI_1, LAI_2
+        real, intent(inout) :: LAI
+
         if (dd < SGS) then
             LAI = LAI_a - (LAI_a - LAI_d) * (SGS - dd) / (365 - EGS + SGS)
         else if (dd < (SGS + LAI_1)) then
@@ -51,7 +62,7 @@ contains
         else if (dd > EGS) then
             LAI = LAI_d + (LAI_a - LAI_d) * (dd - EGS) / (365 - EGS + SGS)
         end if
-    end subroutine Calc_LAI
+    end subroutine LAI_Polygon
 
     !==========================================================================
     ! SAI calculation for wheat taking growing season into account
@@ -61,6 +72,15 @@ contains
         use Inputs, only: dd
         use Variables, only: LAI, SAI
 
+        SAI = sai_wheat_curve(dd, SGS, EGS, LAI_1, LAI)
+    end subroutine Calc_SAI_Wheat
+
+    elemental function sai_wheat_curve(dd, SGS, EGS, LAI_1, LAI) result(SAI)
+        real, intent(in) :: dd
+        integer, intent(in) :: SGS, EGS
+        real, intent(in) :: LAI_1, LAI
+        real :: SAI
+
         if ( dd < SGS .or. dd > EGS ) then
             SAI = LAI
         else if ( dd < SGS + LAI_1 ) then      ! implicitly > SGS
@@ -68,7 +88,7 @@ contains
         else                ! implicitly >= SGS + Ls .and. <= EGS
             SAI = LAI + 1.5
         end if
-    end subroutine Calc_SAI_Wheat
+    end function sai_wheat_curve
 
     !==========================================================================
     ! Calculate fphen, incorporating differing plant and leaf growth seasons
@@ -97,7 +117,21 @@ contains
         use Parameters, only: fphen_limA, fphen_limB, fphen_1, fphen_2, fphen_3, fphen_4
         use Parameters, only: fphen_a, fphen_b, fphen_c, fphen_d, fphen_e
         use Inputs,     only: dd
-        use Variables,  only: fphen, leaf_fphen
+        use Variables,  only: fphen
+
+        call Fphen_Polygon(dd, SGS, EGS, fphen_limA, fphen_limB, &
+                           fphen_1, fphen_2, fphen_3, fphen_4, &
+                           fphen_a, fphen_b, fphen_c, fphen_d, fphen_e, fphen)
+    end subroutine Calc_fphen
+
+    pure subroutine Fphen_Polygon(dd, SGS, EGS, fphen_limA, fphen_limB, &
+                                  fphen_1, fphen_2, fphen_3, fphen_4, &
+                                  fphen_a, fphen_b, fphen_c, fphen_d, fphen_e, fphen)
+        real, intent(in) :: dd
+        integer, intent(in) :: SGS, EGS
+        real, intent(in) :: fphen_limA, fphen_limB, fphen_1, fphen_2, fphen_3, fphen_4
+        real, intent(in) :: fphen_a, fphen_b, fphen_c, fphen_d, fphen_e
+        real, intent(inout) :: fphen
 
         if (dd < SGS .or. dd > EGS) then
             fphen = 0.0
@@ -116,7 +150,7 @@ contains
         else if (dd <= EGS) then
             fphen = fphen_e + (fphen_d - fphen_e) * (EGS - dd) / fphen_4
         end if
-    end subroutine Calc_fphen
+    end subroutine Fphen_Polygon
 
     !==========================================================================
     ! Calculate leaf_fphen using fixed-day method
@@ -127,6 +161,16 @@ contains
         use Inputs,     only: dd
         use Variables,  only: leaf_fphen
 
+        call Leaf_Fphen_Fixed_Day(dd, leaf_fphen_a, leaf_fphen_b, leaf_fphen_c, &
+                                  leaf_fphen_1, leaf_fphen_2, Astart, Aend, leaf_fphen)
+    end subroutine Calc_leaf_fphen_fixed_day
+
+    pure subroutine Leaf_Fphen_Fixed_Day(dd, leaf_fphen_a, leaf_fphen_b, leaf_fphen_c, &
+                                         leaf_fphen_1, leaf_fphen_2, Astart, Aend, leaf_fphen)
+        real, intent(in) :: dd, leaf_fphen_a, leaf_fphen_b, leaf_fphen_c, &
+                            leaf_fphen_1, leaf_fphen_2, Astart, Aend
+        real, intent(inout) :: leaf_fphen
+
         if (dd < Astart .or. dd > Aend) then
             leaf_fphen = 0
         else if (dd < (Astart + leaf_fphen_1)) then
@@ -136,7 +180,7 @@ contains
         else if (dd <= Aend) then
             leaf_fphen = leaf_fphen_c + (leaf_fphen_b - leaf_fphen_c) * (Aend - dd) / leaf_fphen_2
         end if
-    end subroutine Calc_leaf_fphen_fixed_day
+    end subroutine Leaf_Fphen_Fixed_Day
 
     !==========================================================================
     ! Calculate leaf_fphen using thermal time
@@ -148,6 +192,16 @@ contains
         use Inputs,     only: dd
         use Variables,  only: leaf_fphen
 
+        call Leaf_Fphen_Thermal_Time(dd, leaf_fphen_a, leaf_fphen_b, leaf_fphen_c, &
+                                     leaf_fphen_1, leaf_fphen_2, Astart, Aend, leaf_fphen)
+    end subroutine Calc_tt_leaf_fphen
+
+    pure subroutine Leaf_Fphen_Thermal_Time(dd, leaf_fphen_a, leaf_fphen_b, leaf_fphen_c, &
+                                            leaf_fphen_1, leaf_fphen_2, Astart, Aend, leaf_fphen)
+        real, intent(in) :: dd, leaf_fphen_a, leaf_fphen_b, leaf_fphen_c, &
+                            leaf_fphen_1, leaf_fphen_2, Astart, Aend
+        real, intent(inout) :: leaf_fphen
+
         if (dd < Astart .or. dd > Aend) then
             leaf_fphen = 0
         else if (dd < (Astart + leaf_fphen_1)) then
@@ -159,6 +213,6 @@ contains
         else if (dd <= Aend) then
             leaf_fphen = leaf_fphen_c + (leaf_fphen_b - leaf_fphen_c) * (Aend - dd) / leaf_fphen_2
         end if
-    end subroutine Calc_tt_leaf_fphen
+    end subroutine Leaf_Fphen_Thermal_Time
 
 end module Phenology
@@ -3,6 +3,7 @@ module Pn_Gsto
     implicit none
 
     public :: Calc_Gsto_Pn
+    public :: Gsto_Pn
     public :: leaf_temp_de_Boeck
     public :: saturated_vapour_pressure
 
@@ -154,12 +155,36 @@ pure function leaf_temp_de_Boeck(R, e_a, T_air, initial_T_leaf, P, u, g_vs, hypo
   end function leaf_temp_de_Boeck
 
     subroutine Calc_Gsto_Pn()
-        use Constants, only: Ts_K
-        use Inputs, only: c_a => CO2, Q => PAR, uh, h_a => RH, Ts_C, Tleaf_C => Tleaf
-        use Parameters, only: fmin, gmorph, d => Lm, g_sto_0, m, V_cmax_25, J_max_25
+        use Inputs, only: CO2, PAR, uh, RH, Ts_C, Tleaf
+        use Parameters, only: fmin, gmorph, Lm, g_sto_0, m, V_cmax_25, J_max_25
         use Variables, only: LAI, fphen, fO3, fXWP, leaf_fphen
 
-        real :: T_air, T_leaf, u
+        call Gsto_Pn(CO2, PAR, uh, RH, Ts_C, Tleaf, fmin, gmorph, Lm, g_sto_0, m, &
+                     V_cmax_25, J_max_25, alpha, Teta, H_a_jmax, H_d_jmax, &
+                     H_a_vcmax, H_d_vcmax, S_V_vcmax, S_V_jmax, &
+                     LAI, fphen, fO3, fXWP, leaf_fphen, &
+                     gsto_final, pngsto_l, pngsto, pngsto_c, pngsto_PEt, pngsto_An)
+    end subroutine Calc_Gsto_Pn
+
+    !
+    ! Calc_Gsto_Pn for the given inputs and parameters, including the species
+    ! parameters kept in this module (see State)
+    !
+    pure subroutine Gsto_Pn(c_a, Q, uh, h_a, Ts_C, Tleaf_C, fmin, gmorph, d, g_sto_0, m, &
+                            V_cmax_25, J_max_25, alpha, Teta, H_a_jmax, H_d_jmax, &
+                            H_a_vcmax, H_d_vcmax, S_V_vcmax, S_V_jmax, &
+                            LAI, fphen, fO3, fXWP, leaf_fphen, &
+                            gsto_final, pngsto_l, pngsto, pngsto_c, pngsto_PEt, pngsto_An)
+        use Constants, only: Ts_K
+
+        real, intent(in) :: c_a, Q, uh, h_a, Ts_C, Tleaf_C
+        real, intent(in) :: fmin, gmorph, d, g_sto_0, m, V_cmax_25, J_max_25
+        real, intent(in) :: alpha, Teta, H_a_jmax, H_d_jmax, H_a_vcmax, H_d_vcmax, &
+                            S_V_vcmax, S_V_jmax
+        real, intent(in) :: LAI, fphen, fO3, fXWP, leaf_fphen
+        real, intent(out) :: gsto_final, pngsto_l, pngsto, pngsto_c, pngsto_PEt, pngsto_An
+
+        real :: T_air, T_leaf, u, f_XWP
 
         ! state variables
         real :: A_n                             !netto assimilation rate            [micro mol/(m^2*s)]
@@ -245,6 +270,7 @@ pure function leaf_temp_de_Boeck(R, e_a, T_air, initial_T_leaf, P, u, g_vs, hypo
         !c_i is tested:
 
         c_i         = 0.0
+        g_sto       = 0.0
 
         do k=1,50
 
@@ -282,9 +308,17 @@ pure function leaf_temp_de_Boeck(R, e_a, T_air, initial_T_leaf, P, u, g_vs, hypo
         ! Calculate final stomatal conductances
         gsto_final = max(0.0, g_sto / 1000.0)
 
+        ! A missing (NaN) fXWP stays missing: max() may return either argument
+        ! when one is NaN, depending on the compiler and optimisation
+        if (fXWP /= fXWP) then
+            f_XWP = fXWP
+        else
+            f_XWP = max(fmin, fXWP)
+        end if
+
         ! Still in H2O umol
-        pngsto_l = gsto_final * min(leaf_fphen, fO3) * max(fmin, fXWP)
-        pngsto = gsto_final * gmorph * fphen * max(fmin, fXWP)
+        pngsto_l = gsto_final * min(leaf_fphen, fO3) * f_XWP
+        pngsto = gsto_final * gmorph * fphen * f_XWP
         pngsto_c = pngsto * LAI
         pngsto_PEt = gsto_final * fphen * LAI
 
@@ -293,6 +327,6 @@ pure function leaf_temp_de_Boeck(R, e_a, T_air, initial_T_leaf, P, u, g_vs, hypo
 
         !write (unit = 7, fmt=*) iterations,",",c_i,",",A_n,",",g_sto
         !print *,i,"iterations=",iterations,"c_i=",c_i,"A_n =",A_n,"g_sto =",g_sto
-    end subroutine Calc_Gsto_Pn
+    end subroutine Gsto_Pn
 
 end module Pn_Gsto
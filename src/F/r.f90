@@ -7,13 +7,17 @@ module R
 
     public :: Calc_Gsto_Multiplicative, Calc_Rsto, VPDcrit_prepare, VPDcrit_apply
 
+    public :: rgs_of, rext_of, rinc_of, Accumulate_VPD, Limit_Gsto, Gsto_Multiplicative, rsur_of
+
     ! VPD sum for the day (kPa)
     real, public, save :: VPD_dd = 0
-    real, private, save :: Gsto_l_prev, Gsto_prev, Gsto_c_prev, Gsto_PEt_prev, Gsun_l_prev
+    ! Previous hour's conductances, public so that they can be saved with the
+    ! model state (see State)
+    real, public, save :: Gsto_l_prev, Gsto_prev, Gsto_c_prev, Gsto_PEt_prev, Gsun_l_prev
 
 contains
 
-        function ra_simple(ustar, z1, z2, d) result (ra)
+        elemental function ra_simple(ustar, z1, z2, d) result (ra)
             real, intent(in) :: ustar   ! Friction velocity (m/s)
             real, intent(in) :: z1      ! Lower height (m)
             real, intent(in) :: z2      ! Upper height (m)
@@ -29,7 +33,7 @@ contains
         !==============================================
         ! Estimate integral flux-gradient stability function for heat
         !==============================================
-        function calc_PsiH(zL) result (stab_h)
+        elemental function calc_PsiH(zL) result (stab_h)
             !  PsiH = integral flux-gradient stability function for heat
             !  Ref: Garratt, 1994, pp52-54
             !  VDHH modified - use van der Hurk + Holtslag?
@@ -56,7 +60,7 @@ contains
 
         end function calc_PsiH
 
-        function ra_heat_flux(ustar, z1, z2, invL) result (ra)
+        elemental function ra_heat_flux(ustar, z1, z2, invL) result (ra)
             real, intent(in) :: ustar   ! Friction velocity (m/s)
             real, intent(in) :: z1      ! Lower height (m)
             real, intent(in) :: z2      ! Upper height (m)
@@ -102,7 +106,7 @@ contains
             end if
         end function ra_heat_flux
 
-    function rsto_from_gsto(gsto, Ts_C) result (rsto)
+    elemental function rsto_from_gsto(gsto, Ts_C) result (rsto)
         real, intent(in) :: gsto    ! Stomatal conductance (mmol m-2 s-1)
         real, intent(in) :: Ts_C    ! Tile temperature (degrees C)
         real :: rsto                ! Output: stomatal resistance (
@@ -150,7 +154,7 @@ contains
     end subroutine Calc_Ra_With_Heat_Flux
 
 
-    function rb(ustar, d) result (rb_out)
+    elemental function rb(ustar, d) result (rb_out)
         real, intent(in) :: ustar   ! Friction velocity (m/s)
         real, intent(in) :: d       ! Molecular diffusivity of substance in air (m2/s)
 
@@ -190,6 +194,13 @@ contains
         use Variables, only: Rgs
         use Inputs, only: Ts_C
 
+        Rgs = rgs_of(Ts_C, Rsoil)
+    end subroutine Calc_Rgs
+
+    elemental function rgs_of(Ts_C, Rsoil) result(Rgs)
+        real, intent(in) :: Ts_C, Rsoil
+        real :: Rgs
+
         Real :: F_t  ! Low temperature factor (1 <= F_t <= 2)
         Real :: f_snow, r_snow ! Should come from input
         Real :: rgs_inv
@@ -202,7 +213,7 @@ contains
 
         rgs_inv = (1 - 2*f_snow)/(F_t * Rsoil) + (2*f_snow)/r_snow
         Rgs = 1/rgs_inv
-    end subroutine Calc_Rgs
+    end function rgs_of
 
     !==========================================================================
     ! Calculate Rext external plant cuticle resistance in s/m
@@ -219,12 +230,19 @@ contains
         use Inputs, only: Ts_C
         use Variables, only: Rext
 
+        Rext = rext_of(Ts_C, Rext_const)
+    end subroutine Calc_Rext
+
+    elemental function rext_of(Ts_C, Rext_const) result(Rext)
+        real, intent(in) :: Ts_C, Rext_const
+        real :: Rext
+
         Real :: F_t  ! Low temperature factor (1 <= F_t <= 2)
 
         F_t = MIN(2.0, MAX(1.0, EXP(-0.2*(1+Ts_C))))
         Rext = Rext_const * F_t
 
-    end subroutine Calc_Rext
+    end function rext_of
 
     !==========================================================================
     ! Calculate Rinc, in-canopy aerodynamic resistance
@@ -236,9 +254,16 @@ contains
         use Inputs, only: ustar
         use Variables, only: SAI, Rinc
 
-        Rinc = Rinc_b * SAI * h/ustar
+        Rinc = rinc_of(Rinc_b, SAI, h, ustar)
     end subroutine Calc_Rinc
 
+    elemental function rinc_of(Rinc_b, SAI, h, ustar) result(Rinc)
+        real, intent(in) :: Rinc_b, SAI, h, ustar
+        real :: Rinc
+
+        Rinc = Rinc_b * SAI * h/ustar
+    end function rinc_of
+
 
     ! Store previous hour's Gsto values, calculate accumulated VPD
     subroutine VPDcrit_prepare()
@@ -252,6 +277,13 @@ contains
         Gsto_c_prev = Gsto_c
         Gsto_PEt_prev = Gsto_PEt
 
+        call Accumulate_VPD(dd, dd_prev, R, VPD, VPD_dd)
+    end subroutine VPDcrit_prepare
+
+    pure subroutine Accumulate_VPD(dd, dd_prev, R, VPD, VPD_dd)
+        real, intent(in) :: dd, dd_prev, R, VPD
+        real, intent(inout) :: VPD_dd
+
         ! Reset accumulated VPD at start of new day
         if (dd /= dd_prev) then
             VPD_dd = 0
@@ -260,13 +292,23 @@ contains
         if (R > 50.0) then
             VPD_dd = VPD_dd + VPD
         end if
-    end subroutine VPDcrit_prepare
+    end subroutine Accumulate_VPD
 
     ! Limit Gsto values if accumulated VPD exceeds VPD_crit
     subroutine VPDcrit_apply()
         use Parameters, only: VPD_crit
         use Variables, only: Gsto_l, Gsto, Gsto_c, Gsto_PEt, Gsun_l
 
+        call Limit_Gsto(VPD_dd, VPD_crit, Gsto_l_prev, Gsun_l_prev, Gsto_prev, &
+                        Gsto_c_prev, Gsto_PEt_prev, Gsto_l, Gsun_l, Gsto, Gsto_c, Gsto_PEt)
+    end subroutine VPDcrit_apply
+
+    pure subroutine Limit_Gsto(VPD_dd, VPD_crit, Gsto_l_prev, Gsun_l_prev, Gsto_prev, &
+                               Gsto_c_prev, Gsto_PEt_prev, Gsto_l, Gsun_l, Gsto, Gsto_c, Gsto_PEt)
+        real, intent(in) :: VPD_dd, VPD_crit
+        real, intent(in) :: Gsto_l_prev, Gsun_l_prev, Gsto_prev, Gsto_c_prev, Gsto_PEt_prev
+        real, intent(inout) :: Gsto_l, Gsun_l, Gsto, Gsto_c, Gsto_PEt
+
         if (VPD_dd >= VPD_crit) then
             ! Limit values to previous hour's Gsto
             Gsto_l = min(Gsto_l, Gsto_l_prev)
@@ -275,7 +317,7 @@ contains
             Gsto_c = min(Gsto_c, Gsto_c_prev)
             Gsto_PEt = min(Gsto_PEt, Gsto_PEt_prev)
         end if
-    end subroutine VPDcrit_apply
+    end subroutine Limit_Gsto
 
     !==========================================================================
     ! Calculate Rsto, stomatal resistance
@@ -287,8 +329,21 @@ contains
         use Variables, only: Gsto_l, Gsun_l, Gsto, Gsto_c, Gsto_PEt, Gsun_l_ms
 
         use Inputs, only: Ts_C
+
+        call Gsto_Multiplicative(Ts_C, gmax, gmorph, fmin, fphen, leaf_fphen, Flight, &
+                                 Flightsun, leaf_flight, ftemp, fVPD, fXWP, fO3, LAI, &
+                                 Gsto_l, Gsun_l, Gsun_l_ms, Gsto, Gsto_c, Gsto_PEt)
+    end subroutine Calc_Gsto_Multiplicative
+
+    pure subroutine Gsto_Multiplicative(Ts_C, gmax, gmorph, fmin, fphen, leaf_fphen, Flight, &
+                                        Flightsun, leaf_flight, ftemp, fVPD, fXWP, fO3, LAI, &
+                                        Gsto_l, Gsun_l, Gsun_l_ms, Gsto, Gsto_c, Gsto_PEt)
         use constants, only: Ts_K
 
+        real, intent(in) :: Ts_C, gmax, gmorph, fmin, fphen, leaf_fphen, Flight, &
+                            Flightsun, leaf_flight, ftemp, fVPD, fXWP, fO3, LAI
+        real, intent(out) :: Gsto_l, Gsun_l, Gsun_l_ms, Gsto, Gsto_c, Gsto_PEt
+
         REAL :: mmol2sm
 
         mmol2sm = 8.3144e-8 * (Ts_C + Ts_K)
@@ -306,7 +361,7 @@ contains
 
         ! Potential canopy Gsto for PEt calculation (non-limiting SWP)
         Gsto_PEt = gmax * fphen * flight * ftemp * fVPD * LAI
-    end subroutine Calc_Gsto_Multiplicative
+    end subroutine Gsto_Multiplicative
 
     subroutine Calc_Rsto()
         use Variables, only: Gsto_l, Rsto_l, Gsto, Rsto, Gsto_c, Rsto_c, Gsto_PEt, Rsto_PEt, Gsun_l, Rsun_l
@@ -334,6 +389,16 @@ contains
         use Parameters, only: Rsoil
         use Variables, only: LAI, SAI, Rsto_c, Rinc, Rsur, Rext
 
+        Rsur = rsur_of(LAI, SAI, Rsto_c, Rext, Rinc, Rsoil, Rsur)
+    end subroutine Calc_Rsur
+
+    elemental function rsur_of(LAI, SAI, Rsto_c, Rext, Rinc, Rsoil, Rsur_prev) result(Rsur)
+        real, intent(in) :: LAI, SAI, Rsto_c, Rext, Rinc, Rsoil
+        ! Kept when SAI is negative
+        real, intent(in) :: Rsur_prev
+        real :: Rsur
+
+        Rsur = Rsur_prev
         if ( LAI > 0 ) then
             Rsur = 1 / ((1 / Rsto_c) + (SAI / Rext) + (1 / (Rinc + Rsoil)))
         else if ( SAI > 0 ) then
@@ -342,6 +407,6 @@ contains
             ! surely this is Rsur = Rsoil ?
             Rsur = 1 / (1 / Rsoil)
         end if
-    end subroutine Calc_Rsur
+    end function rsur_of
 
 end module R
@@ -2,19 +2,10 @@
 module Run
 
     public :: Run_With_Callbacks
-    public :: Run_With_Files
 
     public :: Initialise
-    public :: Hourly
-    public :: Daily
+    public :: Reset_Accumulators
     public :: Calculate_Row
-    public :: Open_Files
-    public :: Close_Files
-    public :: Read_Row_From_File
-    public :: Write_Row_To_File
-
-    integer, private :: inunit = 8
-    integer, private :: outunit = 9
 
 contains
 
@@ -27,11 +18,7 @@ contains
 
         dd_prev = -1
 
-        AFst0 = 0
-        AFstY = 0
-        AFstY_total = 0
-        AOT0 = 0
-        AOT40 = 0
+        call Reset_Accumulators()
         Rsto_c = 100000
         ! print *, "Running Init"
         ! Put calls to initialisation functions here
@@ -43,164 +30,34 @@ contains
         call Init_SoilWater()
     end subroutine Initialise
 
-    subroutine Hourly()
-        use Environmental, only: Calc_ftemp, Calc_fVPD, Calc_Flight
-        use R, only: Calc_Rb, Calc_Rgs, Calc_Rinc, Calc_Rsur,Calc_Rext
-        use R, only: VPDcrit_prepare, VPDcrit_apply, Calc_Rsto
-        use SoilWater
-        use O3, only: Calc_O3_Concentration, Calc_Ftot, Calc_Fst, Calc_AFstY, Calc_AOT40
-        use Inputs, only: Accumulate_precip, Calc_sinB, Calc_humidity, Calc_monin_obukhov_length_row
-
-        use Switchboard
-
+    !
+    ! Reset the accumulated fluxes and exposures, e.g. at the end of a spin-up
+    ! period, leaving the rest of the model state as it is
+    !
+    subroutine Reset_Accumulators()
+        use Variables, only: AFst0, AFstY, AFstY_total, AOT0, AOT40
 
-        ! Derivation of inputs not supplied
-        call Accumulate_precip()
-        call Calc_sinB()
-        call Calc_monin_obukhov_length_row()
-        call SB_Calc_ustar()
-        call SB_Calc_R_PAR()
-        call SB_Calc_Rn()
-        call Calc_humidity()
-
-        call Calc_Flight()
-
-        call Calc_ftemp()
-        call Calc_fVPD()
-
-        call SB_Calc_fO3()
-        call SB_Calc_fXWP()
-
-        call SB_Calc_Ra()
-        call Calc_Rb()
-        call Calc_Rgs()
-        call Calc_Rinc()
-        call Calc_Rext()
-        call SB_Calc_Tleaf()
-        call VPDcrit_prepare()
-        call SB_Calc_gsto()
-        call VPDcrit_apply()
-        call Calc_Rsto()
-        call Calc_Rsur()
-
-        call SB_Calc_Es_blocked()
-        call Calc_Penman_Monteith()
-
-        call SB_Calc_LWP()  ! This *must* happen after calculating SWP - SWP is
-                            ! calculated as the day rolls over, and LWP should
-                            ! use the previous day's SWP
-        call Calc_fLWP()
-
-        call Calc_O3_Concentration()
-        call Calc_Ftot()
-        call Calc_Fst()
-        call Calc_AFstY()
-        call Calc_AOT40()
-    end subroutine Hourly
-
-    subroutine Daily()
-        use SoilWater
-        use Switchboard
-        use Phenology, only: Calc_LAI, Calc_fphen
-        use Inputs, only: Calc_precip_acc
-
-        call Calc_LAI()
-        call SB_Calc_SAI()
-        call Calc_fphen()
-        call SB_Calc_leaf_fphen()
-
-        call Calc_precip_acc()
-        call Calc_Penman_Monteith_daily()
-        call Calc_SWP()
-        call SB_Calc_fSWP()
-        call Calc_SWP_meas()
-        call SB_Calc_ASW()
-        call Calc_fPAW()
-    end subroutine Daily
+        AFst0 = 0
+        AFstY = 0
+        AFstY_total = 0
+        AOT0 = 0
+        AOT40 = 0
+    end subroutine Reset_Accumulators
 
+    !
+    ! Run the model for the row of inputs in the input variables (see
+    ! Run_Batch in State)
+    !
     subroutine Calculate_Row()
-        use Inputs, only: dd
-        use Variables, only: dd_prev
-
-        ! At the start of a new day, do daily actions on previous day's data
-        if (dd_prev /= dd) then
-            call Daily()
-        end if
+        use State, only: Run_Batch
 
-        ! Run hourly calculations
-        call Hourly()
+        integer, dimension(0) :: no_ids
+        real, dimension(0, 1) :: no_inputs
+        real, dimension(1, 0) :: no_outputs
 
-        dd_prev = dd
+        call Run_Batch(no_ids, no_inputs, no_ids, no_outputs, 0, 1, 0)
     end subroutine Calculate_Row
 
-    subroutine Open_Files(infile, outfile)
-        character(len=*), intent(in) :: infile, outfile
-
-        print *, "Opening files"
-
-        open(unit=inunit, file=infile, status="old", &
-             action="read", position="rewind")
-
-        open(unit=outunit, file=outfile, status="replace", &
-             action="write", position="rewind")
-
-        call Initialise()
-    end subroutine Open_Files
-
-    subroutine Close_Files()
-        close(unit=inunit)
-        close(unit=outunit)
-    end subroutine Close_Files
-
-    subroutine Read_Row_From_File(done)
-        use Inputs
-
-        logical, intent(out) :: done
-        integer :: ios
-
-        ! Modify this to match the input headings
-        read(unit=inunit, fmt=*, iostat=ios) &
-            mm, mdd, dd, hr, Ts_C, VPD, uh_zR, precip, P, O3_ppb_zR, PAR
-        ! mm, mdd, dd
-            ! mm, mdd, dd, hr, Ts_C, VPD, uh_zR, precip, P, O3_ppb_zR, Hd, R, PAR
-
-
-
-        if (ios /= 0) then
-            done = .TRUE.
-        else
-            done = .FALSE.
-        end if
-    end subroutine Read_Row_From_File
-
-    subroutine Write_Row_To_File()
-        use Inputs
-        use Variables
-
-        write(unit=outunit, fmt=*) &
-        !rn, &
-        !ra, &
-        !rb, &
-        !rsur, &
-        !rinc, &
-        !rsto, &
-        !gsto, &
-        !rgs, &
-        !vd, &
-        !o3_ppb, &
-        !o3_nmol_m3, &
-        !fst, &
-        !afsty, &
-        !ftot, &
-        !ot40, &
-        !aot40, &
-        !aet, &
-        !swp, &
-        !per_vol, &
-        !smd, &
-        " "
-    end subroutine Write_Row_To_File
-
     subroutine Run_With_Callbacks(Read_Row, Write_Row)
         logical :: done = .FALSE.
 
@@ -226,12 +83,4 @@ contains
         end do
     end subroutine Run_With_Callbacks
 
-    subroutine Run_With_Files(infile, outfile)
-        character(len=*), intent(in) :: infile, outfile
-
-        call Open_Files(infile, outfile)
-        call Run_With_Callbacks(Read_Row_From_File, Write_Row_To_File)
-        call Close_Files()
-    end subroutine Run_With_Files
-
 end module Run
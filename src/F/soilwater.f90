@@ -28,6 +28,8 @@ module SoilWater
     public :: Calc_SWP_meas
     public :: Calc_fPAW
     public :: fSWP_exp_curve
+    public :: Penman_Monteith, Soil_Water, fSWP_linear_curve
+    public :: Leaf_Water_Potential, steady_state_LWP, Soil_Water_Meas, fPAW_curve
 
     ! Calculated constants
     real, public :: ASW_FC
@@ -43,11 +45,13 @@ module SoilWater
     real, public :: AEt_hr
 
     ! Daily accumulation variables
-    real, private :: Ei_dd, PEt_dd, Et_dd, Es_dd, AEt_dd
+    real, public :: Ei_dd, PEt_dd, Et_dd, Es_dd, AEt_dd
 
-    real, private :: PWP, PWP_vol
+    ! Only used in this module, but public so that they can be saved with the
+    ! model state (see State)
+    real, public :: PWP, PWP_vol
 
-    real, private :: r_meas
+    real, public :: r_meas
 
 contains
 
@@ -107,11 +111,27 @@ contains
     ! Penman-Monteith method.
     !
     subroutine Calc_Penman_Monteith()
-        use Constants, only: seaP, Ts_K, Dratio
-        use Inputs, only: VPD, Ts_C, P, dd, Rn_MJ => Rn, esat_kPa => esat, eact_kPa => eact
-        use Variables, only: Ei, Et, PEt, AEt, Es, Rb_H2O, LAI, Rsto_c, &
-                             Rsto_PEt, Sn, Ra, Rinc, Es_blocked
-        use Parameters, only: Fc_m, Rsoil
+        use Inputs, only: VPD, Ts_C, P, Rn, esat, eact
+        use Variables, only: Rb_H2O, LAI, Rsto_c, Rsto_PEt, Rinc, Es_blocked
+        use Parameters, only: Rsoil
+
+        call Penman_Monteith(VPD, Ts_C, P, Rn, esat, eact, Rb_H2O, LAI, Rsto_c, &
+                             Rsto_PEt, Rinc, Es_blocked, Rsoil, &
+                             Ei_hr, PEt_hr, Et_hr_prev, Et_hr, Es_hr, AEt_hr, &
+                             PEt_3, Et_3, Ei_dd, PEt_dd, Et_dd, Es_dd, AEt_dd)
+    end subroutine Calc_Penman_Monteith
+
+    pure subroutine Penman_Monteith(VPD, Ts_C, P, Rn_MJ, esat_kPa, eact_kPa, Rb_H2O, LAI, Rsto_c, &
+                                    Rsto_PEt, Rinc, Es_blocked, Rsoil, &
+                                    Ei_hr, PEt_hr, Et_hr_prev, Et_hr, Es_hr, AEt_hr, &
+                                    PEt_3, Et_3, Ei_dd, PEt_dd, Et_dd, Es_dd, AEt_dd)
+        use Constants, only: Ts_K, Dratio
+
+        real, intent(in) :: VPD, Ts_C, P, Rn_MJ, esat_kPa, eact_kPa
+        real, intent(in) :: Rb_H2O, LAI, Rsto_c, Rsto_PEt, Rinc, Rsoil
+        logical, intent(in) :: Es_blocked
+        real, intent(out) :: Ei_hr, PEt_hr, Et_hr_prev, Es_hr, AEt_hr, PEt_3, Et_3
+        real, intent(inout) :: Et_hr, Ei_dd, PEt_dd, Et_dd, Es_dd, AEt_dd
 
         real        :: VPD_Pa       ! VPD in Pa, not kPa
         real        :: P_Pa         ! Pressure in Pa, not kPa
@@ -184,7 +204,7 @@ contains
         Et_dd = Et_dd + Et_hr
         Es_dd = Es_dd + Es_hr
         AEt_dd = AEt_dd + AEt_hr
-    end subroutine Calc_Penman_Monteith
+    end subroutine Penman_Monteith
 
     !
     ! The values for each component are the sum of the previous day's values
@@ -209,14 +229,25 @@ contains
     ! (Calc_Penman_Monteith_daily must be run first).
     !
     subroutine Calc_SWP()
-        use Constants, only: SWC_sat
-        use Parameters, only: Fc_m, soil_b, SWP_AE
-        use Parameters, only: SWP_min, SWP_max, fmin, root
-        use Inputs, only: dd, precip_acc
-        use Variables, only: AEt, Es, Ei, LAI
+        use Parameters, only: Fc_m, soil_b, SWP_AE, root
+        use Inputs, only: precip_acc
+        use Variables, only: AEt, Ei, LAI
         use Variables, only: Sn, per_vol, ASW, SWP, SMD
         use Variables, only: Sn_diff, P_input
 
+        call Soil_Water(precip_acc, LAI, Ei, AEt, root, Fc_m, PWP_vol, SWP_AE, soil_b, &
+                        Sn, P_input, Sn_diff, per_vol, ASW, SWP, SMD)
+    end subroutine Calc_SWP
+
+    pure subroutine Soil_Water(precip_acc, LAI, Ei, AEt, root, Fc_m, PWP_vol, SWP_AE, soil_b, &
+                               Sn, P_input, Sn_diff, per_vol, ASW, SWP, SMD)
+        use Constants, only: SWC_sat
+
+        real, intent(in) :: precip_acc, LAI, Ei, AEt
+        real, intent(in) :: root, Fc_m, PWP_vol, SWP_AE, soil_b
+        real, intent(inout) :: Sn
+        real, intent(out) :: P_input, Sn_diff, per_vol, ASW, SWP, SMD
+
         if (precip_acc > 0) then
             P_input = (precip_acc - (0.0001*LAI)) + ((0.0001*LAI) - min(Ei, 0.0001*LAI))
         else
@@ -237,7 +268,7 @@ contains
 
         ! Calculate SMD for new water content
         SMD = (Fc_m - Sn) * root
-    end subroutine Calc_SWP
+    end subroutine Soil_Water
 
     subroutine Calc_fSWP_exponential()
         use Parameters, only: fmin
@@ -250,22 +281,39 @@ contains
         use Parameters, only: fmin, SWP_min, SWP_max
         use Variables, only: fSWP, SWP
 
-        fSWP = min(1.0, max(fmin, ((1-fmin) * ((SWP_min - SWP)/(SWP_min - SWP_max))) + fmin))
+        fSWP = fSWP_linear_curve(SWP, fmin, SWP_min, SWP_max)
     end subroutine Calc_fSWP_linear
 
+    elemental function fSWP_linear_curve(SWP, fmin, SWP_min, SWP_max) result(fSWP)
+        real, intent(in) :: SWP, fmin, SWP_min, SWP_max
+        real :: fSWP
+
+        fSWP = min(1.0, max(fmin, ((1-fmin) * ((SWP_min - SWP)/(SWP_min - SWP_max))) + fmin))
+    end function fSWP_linear_curve
+
     subroutine Calc_LWP()
-        use Parameters, only: root, fmin
+        use Parameters, only: root
         use Parameters, only: SWP_AE, soil_b, Ksat
-        use Variables, only: SWP, delta_LWP, LWP, fLWP
+        use Variables, only: SWP, delta_LWP, LWP
         use Inputs, only: hr
 
+        call Leaf_Water_Potential(SWP, hr, Et_hr_prev, Et_hr, Ksat, SWP_AE, soil_b, root, &
+                                  delta_LWP, LWP)
+    end subroutine Calc_LWP
+
+    pure subroutine Leaf_Water_Potential(SWP, hr, Et_hr_prev, Et_hr, Ksat, SWP_AE, soil_b, root, &
+                                         delta_LWP, LWP)
+        real, intent(in) :: SWP, hr, Et_hr_prev, Et_hr, Ksat, SWP_AE, soil_b, root
+        real, intent(out) :: delta_LWP
+        real, intent(inout) :: LWP
+
         ! Variables related to plant physiology
         ! TODO: These should probably be vegetation parameters
-        real :: K1 = 0.0000000000035    ! constant related to root density
-        real :: C = 1                   ! plant capacitance (MPa mm-1)
-        real :: Rc = 0.43               ! storage/destorage hydraulic resistance
-                                        ! (MPa h mm-1)
-        real :: Rp = 5.3                ! plant hydraulic resistance (MPa h mm-1)
+        real, parameter :: K1 = 0.0000000000035    ! constant related to root density
+        real, parameter :: C = 1                   ! plant capacitance (MPa mm-1)
+        real, parameter :: Rc = 0.43               ! storage/destorage hydraulic resistance
+                                                   ! (MPa h mm-1)
+        real, parameter :: Rp = 5.3                ! plant hydraulic resistance (MPa h mm-1)
 
         ! Calculated LWP parameters
         real :: Rsr         ! Soil-rot resistance
@@ -288,20 +336,24 @@ contains
                          -(((Rsr+Rp)*Rc)/(Rsr+Rp+Rc))*(delta_Et*1000))
             LWP = LWP + delta_LWP
         end if
-    end subroutine Calc_LWP
+    end subroutine Leaf_Water_Potential
 
     subroutine Calc_LWP_steady_state()
         use Parameters, only: SWP_AE, soil_b, Ksat
         use Parameters, only: root
         use Variables, only: LWP, SWP
 
+        LWP = steady_state_LWP(SWP, Et_hr, Ksat, SWP_AE, soil_b, root)
+    end subroutine Calc_LWP_steady_state
+
+    elemental function steady_state_LWP(SWP, Et_hr, Ksat, SWP_AE, soil_b, root) result(LWP)
+        real, intent(in) :: SWP, Et_hr, Ksat, SWP_AE, soil_b, root
+        real :: LWP
+
         ! Variables related to plant physiology
         ! TODO: These should probably be vegetation parameters
-        real :: K1 = 0.0000000000035    ! constant related to root density
-        real :: C = 1                   ! plant capacitance (MPa mm-1)
-        real :: Rc = 0.43               ! storage/destorage hydraulic resistance
-                                        ! (MPa h mm-1)
-        real :: Rp = 5.3                ! plant hydraulic resistance (MPa h mm-1)
+        real, parameter :: K1 = 0.0000000000035    ! constant related to root density
+        real, parameter :: Rp = 5.3                ! plant hydraulic resistance (MPa h mm-1)
 
         ! Calculated LWP parameters
         real :: Rsr         ! Soil-rot resistance
@@ -311,7 +363,7 @@ contains
         Rsr = K1 / (root * Ks)
 
         LWP = SWP - (Et_hr*1000 * (Rsr + Rp))
-    end subroutine Calc_LWP_steady_state
+    end function steady_state_LWP
 
     subroutine Calc_fLWP()
         use Parameters, only: fmin
@@ -321,11 +373,22 @@ contains
     end subroutine Calc_fLWP
 
     subroutine Calc_SWP_meas()
-        use Constants, only: SWC_sat
         use Variables, only: AEt, P_input, Sn_meas, Sn_diff_meas, SWP_meas, &
                              SMD_meas
         use Parameters, only: Fc_m, soil_b, SWP_AE, D_meas
 
+        call Soil_Water_Meas(P_input, AEt, r_meas, PWP_vol, D_meas, Fc_m, SWP_AE, soil_b, &
+                             Sn_meas, Sn_diff_meas, SWP_meas, SMD_meas)
+    end subroutine Calc_SWP_meas
+
+    pure subroutine Soil_Water_Meas(P_input, AEt, r_meas, PWP_vol, D_meas, Fc_m, SWP_AE, soil_b, &
+                                    Sn_meas, Sn_diff_meas, SWP_meas, SMD_meas)
+        use Constants, only: SWC_sat
+
+        real, intent(in) :: P_input, AEt, r_meas, PWP_vol, D_meas, Fc_m, SWP_AE, soil_b
+        real, intent(inout) :: Sn_meas
+        real, intent(out) :: Sn_diff_meas, SWP_meas, SMD_meas
+
         real :: P_input_meas, Et_meas, trans_diff_meas
 
         P_input_meas = P_input
@@ -345,17 +408,24 @@ contains
         SWP_meas = SWP_AE * ((SWC_sat / Sn_meas)**soil_b)
 
         SMD_meas = (Fc_m - Sn_meas) * D_meas
-    end subroutine Calc_SWP_meas
+    end subroutine Soil_Water_Meas
 
     subroutine Calc_fPAW()
         use Variables, only: ASW, fPAW
         use Parameters, only: fmin, ASW_min, ASW_max
 
+        fPAW = fPAW_curve(ASW, ASW_FC, fmin, ASW_min, ASW_max)
+    end subroutine Calc_fPAW
+
+    elemental function fPAW_curve(ASW, ASW_FC, fmin, ASW_min, ASW_max) result(fPAW)
+        real, intent(in) :: ASW, ASW_FC, fmin, ASW_min, ASW_max
+        real :: fPAW
+
         fPAW = fmin + (1.0-fmin) * ((100 * (ASW/ASW_FC)) - ASW_min) / (ASW_max - ASW_min)
         fPAW = min(1.0, max(fmin, fPAW))
-    end subroutine Calc_fPAW
+    end function fPAW_curve
 
-    function fSWP_exp_curve(SWP, fmin) result(fSWP)
+    elemental function fSWP_exp_curve(SWP, fmin) result(fSWP)
         real, intent(in) :: SWP, fmin
         real :: fSWP
 
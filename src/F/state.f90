@@ -0,0 +1,2065 @@
+!
+! Model state for several sites
+!
+! The model's state is held in module variables, so only one site can be
+! simulated at a time.  This module collects every module variable into a
+! Model_State derived type, with a component for each module, so that the
+! states of several sites can be stored and switched between.
+!
+! The model is run on stored states: Run_Batch_Sites runs a set of sites one
+! hour at a time, without loading them into the module variables, and
+! Run_Batch (and Calculate_Row in Run) run the model variables by storing
+! them, running them the same way and loading them back.  The sequence of
+! model steps for an hour or a day only exists here.
+!
+! Sites are numbered from 1 to the number given to Init_Sites.  Slot 0 is
+! used by Run_Batch, and by Save_State and Load_State to snapshot the model
+! state as a blob of bytes, which is only valid for the same build of the
+! model.
+!
+module State
+
+    public :: Init_Sites
+    public :: Site_Count
+    public :: Store_Site
+    public :: Load_Site
+    public :: Site_Options_Match
+    public :: Run_Batch
+    public :: Run_Batch_Sites
+    public :: State_Size
+    public :: Save_State
+    public :: Load_State
+
+    type, private :: Options_State
+        integer :: sai_method
+        integer :: rn_method
+        integer :: leaf_fphen_method
+        integer :: ra_method
+        integer :: tleaf_method
+        integer :: gsto_method
+        integer :: fo3_method
+        integer :: fswp_method
+        integer :: asw_method
+        integer :: lwp_method
+        integer :: fxwp_method
+        integer :: r_par_method
+        integer :: sgs_egs_method
+        integer :: ustar_method
+    end type Options_State
+
+    type, private :: Parameters_State
+        real :: Rsoil
+        real :: soil_b
+        real :: Fc_m
+        real :: SWP_AE
+        real :: Ksat
+        real :: uzR
+        real :: O3zR
+        real :: xzR
+        real :: D_meas
+        real :: u_h
+        real :: u_d
+        real :: u_zo
+        real :: O3_h
+        real :: O3_d
+        real :: O3_zo
+        real :: lat
+        real :: lon
+        real :: elev
+        real :: T_min
+        real :: T_opt
+        real :: T_max
+        real :: VPD_min
+        real :: VPD_max
+        real :: VPD_crit
+        real :: SWP_min
+        real :: SWP_max
+        real :: ASW_FC_override
+        real :: ASW_min
+        real :: ASW_max
+        real :: gmax
+        real :: gmorph
+        real :: fmin
+        real :: albedo
+        real :: root
+        real :: h
+        real :: zo
+        real :: d
+        integer :: SGS
+        integer :: EGS
+        integer :: mid_anthesis
+        real :: LAI_a
+        real :: LAI_b
+        real :: LAI_c
+        real :: LAI_d
+        real :: LAI_1
+        real :: LAI_2
+        real :: fphen_limA
+        real :: fphen_limB
+        real :: fphen_a
+        real :: fphen_b
+        real :: fphen_c
+        real :: fphen_d
+        real :: fphen_e
+        real :: fphen_1
+        real :: fphen_2
+        real :: fphen_3
+        real :: fphen_4
+        real :: Astart
+        real :: Aend
+        real :: leaf_fphen_a
+        real :: leaf_fphen_b
+        real :: leaf_fphen_c
+        real :: leaf_fphen_1
+        real :: leaf_fphen_2
+        real :: cosA
+        real :: f_lightfac
+        real :: Rext
+        real :: Rinc_b
+        real :: Lm
+        real :: Y
+        real :: g_sto_0
+        real :: m
+        real :: V_cmax_25
+        real :: J_max_25
+    end type Parameters_State
+
+    type, private :: Variables_State
+        real :: dd_prev
+        real :: ftemp
+        real :: fVPD
+        real :: Flight
+        real :: Flightsun
+        real :: Flightshade
+        real :: leaf_flight
+        real :: LAI
+        real :: SAI
+        real :: fphen
+        real :: leaf_fphen
+        real :: Ei
+        real :: PEt
+        real :: Et
+        real :: Es
+        real :: AEt
+        real :: Sn_star
+        real :: ASW
+        real :: Sn
+        real :: per_vol
+        real :: SMD
+        real :: SWP
+        real :: fSWP
+        real :: P_input
+        real :: Sn_diff
+        real :: fXWP
+        real :: LWP
+        real :: delta_LWP
+        real :: fLWP
+        real :: Sn_meas
+        real :: Sn_diff_meas
+        real :: SWP_meas
+        real :: SMD_meas
+        real :: fPAW
+        logical :: Es_blocked
+        real :: Ra
+        real :: Rb
+        real :: Rb_ref
+        real :: Rb_H2O
+        real :: Rsur
+        real :: Rinc
+        real :: Rgs
+        real :: Rext
+        real :: Ra_ref_i
+        real :: Ra_O3zR_i
+        real :: Ra_tar_i
+        real :: Gsto
+        real :: Rsto
+        real :: Gsto_l
+        real :: Gsun_l
+        real :: Gsun_l_ms
+        real :: Rsto_l
+        real :: Rsun_l
+        real :: Gsto_c
+        real :: Rsto_c
+        real :: Gsto_PEt
+        real :: Rsto_PEt
+        real :: O3_ppb_i
+        real :: O3_ppb
+        real :: O3_nmol_m3
+        real :: Vd
+        real :: Vd_i
+        real :: Ftot
+        real :: Fst
+        real :: Fst_sun
+        real :: AFst0
+        real :: AFstY
+        real :: AFstY_total
+        real :: OT40
+        real :: AOT40
+        real :: OT0
+        real :: AOT0
+        real :: fO3
+        real :: PARdir
+        real :: PARdif
+        real :: pPARdir
+        real :: pPARdif
+        real :: fPARdir
+        real :: fPARdif
+        real :: LAIsun
+        real :: LAIshade
+        real :: PARsun
+        real :: PARshade
+        real :: ST
+    end type Variables_State
+
+    type, private :: Inputs_State
+        real :: yr
+        real :: mm
+        real :: mdd
+        real :: dd
+        real :: td
+        real :: hr
+        real :: Ts_C
+        real :: Tleaf
+        real :: VPD
+        real :: uh_zR
+        real :: precip
+        real :: P
+        real :: O3_ppb_zR
+        real :: CO2
+        real :: Hd
+        real :: R
+        real :: PAR
+        real :: cloudfrac
+        real :: fSWP
+        real :: ASW
+        real :: Rn
+        real :: leaf_fphen_input
+        real :: sinB
+        real :: Rn_W
+        real :: ustar
+        real :: ustar_ref
+        real :: ustar_ref_O3
+        real :: uh_i
+        real :: uh
+        real :: L
+        real :: invL
+        real :: precip_acc
+        real :: esat
+        real :: eact
+        real :: RH
+        real :: precip_dd
+        real :: h
+        real :: dec
+    end type Inputs_State
+
+    type, private :: SoilWater_State
+        real :: ASW_FC
+        real :: Ei_hr
+        real :: Es_hr
+        real :: PEt_hr
+        real :: Et_hr
+        real :: Et_hr_prev
+        real :: PEt_3
+        real :: Et_3
+        real :: AEt_hr
+        real :: Ei_dd
+        real :: PEt_dd
+        real :: Et_dd
+        real :: Es_dd
+        real :: AEt_dd
+        real :: PWP
+        real :: PWP_vol
+        real :: r_meas
+    end type SoilWater_State
+
+    type, private :: R_State
+        real :: VPD_dd
+        real :: Gsto_l_prev
+        real :: Gsto_prev
+        real :: Gsto_c_prev
+        real :: Gsto_PEt_prev
+        real :: Gsun_l_prev
+    end type R_State
+
+    type, private :: O3_State
+        real :: ustar_ref_o3
+    end type O3_State
+
+    type, private :: Pn_Gsto_State
+        real :: alpha
+        real :: Teta
+        real :: H_a_jmax
+        real :: H_d_jmax
+        real :: H_a_vcmax
+        real :: H_d_vcmax
+        real :: S_V_vcmax
+        real :: S_V_jmax
+        real :: gsto_final
+        real :: pngsto_l
+        real :: pngsto
+        real :: pngsto_c
+        real :: pngsto_PEt
+        real :: pngsto_An
+    end type Pn_Gsto_State
+
+    type, private :: Model_State
+        type(Options_State) :: options
+        type(Parameters_State) :: parameters
+        type(Variables_State) :: variables
+        type(Inputs_State) :: inputs
+        type(SoilWater_State) :: soilwater
+        type(R_State) :: r
+        type(O3_State) :: o3
+        type(Pn_Gsto_State) :: pn_gsto
+    end type Model_State
+
+    ! The stored state of each site
+    type(Model_State), allocatable, private, save :: sites(:)
+
+contains
+
+    !
+    ! Make space to store the states of n sites, discarding any stored states
+    !
+    subroutine Init_Sites(n)
+        integer, intent(in) :: n
+
+        if (allocated(sites)) then
+            deallocate(sites)
+        end if
+        allocate(sites(0:n))
+    end subroutine Init_Sites
+
+    !
+    ! Get the number of sites there is space for
+    !
+    function Site_Count() result(n)
+        integer :: n
+
+        if (allocated(sites)) then
+            n = size(sites) - 1
+        else
+            n = 0
+        end if
+    end function Site_Count
+
+    !
+    ! Store the current model state as the state of site i
+    !
+    subroutine Store_Site(i)
+        integer, intent(in) :: i
+
+        call Store_Options(sites(i)%options)
+        call Store_Parameters(sites(i)%parameters)
+        call Store_Variables(sites(i)%variables)
+        call Store_Inputs(sites(i)%inputs)
+        call Store_SoilWater(sites(i)%soilwater)
+        call Store_R(sites(i)%r)
+        call Store_O3(sites(i)%o3)
+        call Store_Pn_Gsto(sites(i)%pn_gsto)
+
+    contains
+
+        subroutine Store_Options(s)
+            use Options, only: sai_method, rn_method, leaf_fphen_method, &
+                               ra_method, tleaf_method, gsto_method, &
+                               fo3_method, fswp_method, asw_method, &
+                               lwp_method, fxwp_method, r_par_method, &
+                               sgs_egs_method, ustar_method
+
+            type(Options_State), intent(out) :: s
+
+            s%sai_method = sai_method
+            s%rn_method = rn_method
+            s%leaf_fphen_method = leaf_fphen_method
+            s%ra_method = ra_method
+            s%tleaf_method = tleaf_method
+            s%gsto_method = gsto_method
+            s%fo3_method = fo3_method
+            s%fswp_method = fswp_method
+            s%asw_method = asw_method
+            s%lwp_method = lwp_method
+            s%fxwp_method = fxwp_method
+            s%r_par_method = r_par_method
+            s%sgs_egs_method = sgs_egs_method
+            s%ustar_method = ustar_method
+        end subroutine Store_Options
+
+        subroutine Store_Parameters(s)
+            use Parameters, only: Rsoil, soil_b, Fc_m, SWP_AE, Ksat, uzR, &
+                                  O3zR, xzR, D_meas, u_h, u_d, u_zo, O3_h, &
+                                  O3_d, O3_zo, lat, lon, elev, T_min, T_opt, &
+                                  T_max, VPD_min, VPD_max, VPD_crit, SWP_min, &
+                                  SWP_max, ASW_FC_override, ASW_min, ASW_max, &
+                                  gmax, gmorph, fmin, albedo, root, h, zo, d, &
+                                  SGS, EGS, mid_anthesis, LAI_a, LAI_b, &
+                                  LAI_c, LAI_d, LAI_1, LAI_2, fphen_limA, &
+                                  fphen_limB, fphen_a, fphen_b, fphen_c, &
+                                  fphen_d, fphen_e, fphen_1, fphen_2, &
+                                  fphen_3, fphen_4, Astart, Aend, &
+                                  leaf_fphen_a, leaf_fphen_b, leaf_fphen_c, &
+                                  leaf_fphen_1, leaf_fphen_2, cosA, &
+                                  f_lightfac, Rext, Rinc_b, Lm, Y, g_sto_0, &
+                                  m, V_cmax_25, J_max_25
+
+            type(Parameters_State), intent(out) :: s
+
+            s%Rsoil = Rsoil
+            s%soil_b = soil_b
+            s%Fc_m = Fc_m
+            s%SWP_AE = SWP_AE
+            s%Ksat = Ksat
+            s%uzR = uzR
+            s%O3zR = O3zR
+            s%xzR = xzR
+            s%D_meas = D_meas
+            s%u_h = u_h
+            s%u_d = u_d
+            s%u_zo = u_zo
+            s%O3_h = O3_h
+            s%O3_d = O3_d
+            s%O3_zo = O3_zo
+            s%lat = lat
+            s%lon = lon
+            s%elev = elev
+            s%T_min = T_min
+            s%T_opt = T_opt
+            s%T_max = T_max
+            s%VPD_min = VPD_min
+            s%VPD_max = VPD_max
+            s%VPD_crit = VPD_crit
+            s%SWP_min = SWP_min
+            s%SWP_max = SWP_max
+            s%ASW_FC_override = ASW_FC_override
+            s%ASW_min = ASW_min
+            s%ASW_max = ASW_max
+            s%gmax = gmax
+            s%gmorph = gmorph
+            s%fmin = fmin
+            s%albedo = albedo
+            s%root = root
+            s%h = h
+            s%zo = zo
+            s%d = d
+            s%SGS = SGS
+            s%EGS = EGS
+            s%mid_anthesis = mid_anthesis
+            s%LAI_a = LAI_a
+            s%LAI_b = LAI_b
+            s%LAI_c = LAI_c
+            s%LAI_d = LAI_d
+            s%LAI_1 = LAI_1
+            s%LAI_2 = LAI_2
+            s%fphen_limA = fphen_limA
+            s%fphen_limB = fphen_limB
+            s%fphen_a = fphen_a
+            s%fphen_b = fphen_b
+            s%fphen_c = fphen_c
+            s%fphen_d = fphen_d
+            s%fphen_e = fphen_e
+            s%fphen_1 = fphen_1
+            s%fphen_2 = fphen_2
+            s%fphen_3 = fphen_3
+            s%fphen_4 = fphen_4
+            s%Astart = Astart
+            s%Aend = Aend
+            s%leaf_fphen_a = leaf_fphen_a
+            s%leaf_fphen_b = leaf_fphen_b
+            s%leaf_fphen_c = leaf_fphen_c
+            s%leaf_fphen_1 = leaf_fphen_1
+            s%leaf_fphen_2 = leaf_fphen_2
+            s%cosA = cosA
+            s%f_lightfac = f_lightfac
+            s%Rext = Rext
+            s%Rinc_b = Rinc_b
+            s%Lm = Lm
+            s%Y = Y
+            s%g_sto_0 = g_sto_0
+            s%m = m
+            s%V_cmax_25 = V_cmax_25
+            s%J_max_25 = J_max_25
+        end subroutine Store_Parameters
+
+        subroutine Store_Variables(s)
+            use Variables, only: dd_prev, ftemp, fVPD, Flight, Flightsun, &
+                                 Flightshade, leaf_flight, LAI, SAI, fphen, &
+                                 leaf_fphen, Ei, PEt, Et, Es, AEt, Sn_star, &
+                                 ASW, Sn, per_vol, SMD, SWP, fSWP, P_input, &
+                                 Sn_diff, fXWP, LWP, delta_LWP, fLWP, &
+                                 Sn_meas, Sn_diff_meas, SWP_meas, SMD_meas, &
+                                 fPAW, Es_blocked, Ra, Rb, Rb_ref, Rb_H2O, &
+                                 Rsur, Rinc, Rgs, Rext, Ra_ref_i, Ra_O3zR_i, &
+                                 Ra_tar_i, Gsto, Rsto, Gsto_l, Gsun_l, &
+                                 Gsun_l_ms, Rsto_l, Rsun_l, Gsto_c, Rsto_c, &
+                                 Gsto_PEt, Rsto_PEt, O3_ppb_i, O3_ppb, &
+                                 O3_nmol_m3, Vd, Vd_i, Ftot, Fst, Fst_sun, &
+                                 AFst0, AFstY, AFstY_total, OT40, AOT40, OT0, &
+                                 AOT0, fO3, PARdir, PARdif, pPARdir, pPARdif, &
+                                 fPARdir, fPARdif, LAIsun, LAIshade, PARsun, &
+                                 PARshade, ST
+
+            type(Variables_State), intent(out) :: s
+
+            s%dd_prev = dd_prev
+            s%ftemp = ftemp
+            s%fVPD = fVPD
+            s%Flight = Flight
+            s%Flightsun = Flightsun
+            s%Flightshade = Flightshade
+            s%leaf_flight = leaf_flight
+            s%LAI = LAI
+            s%SAI = SAI
+            s%fphen = fphen
+            s%leaf_fphen = leaf_fphen
+            s%Ei = Ei
+            s%PEt = PEt
+            s%Et = Et
+            s%Es = Es
+            s%AEt = AEt
+            s%Sn_star = Sn_star
+            s%ASW = ASW
+            s%Sn = Sn
+            s%per_vol = per_vol
+            s%SMD = SMD
+            s%SWP = SWP
+            s%fSWP = fSWP
+            s%P_input = P_input
+            s%Sn_diff = Sn_diff
+            s%fXWP = fXWP
+            s%LWP = LWP
+            s%delta_LWP = delta_LWP
+            s%fLWP = fLWP
+            s%Sn_meas = Sn_meas
+            s%Sn_diff_meas = Sn_diff_meas
+            s%SWP_meas = SWP_meas
+            s%SMD_meas = SMD_meas
+            s%fPAW = fPAW
+            s%Es_blocked = Es_blocked
+            s%Ra = Ra
+            s%Rb = Rb
+            s%Rb_ref = Rb_ref
+            s%Rb_H2O = Rb_H2O
+            s%Rsur = Rsur
+            s%Rinc = Rinc
+            s%Rgs = Rgs
+            s%Rext = Rext
+            s%Ra_ref_i = Ra_ref_i
+            s%Ra_O3zR_i = Ra_O3zR_i
+            s%Ra_tar_i = Ra_tar_i
+            s%Gsto = Gsto
+            s%Rsto = Rsto
+            s%Gsto_l = Gsto_l
+            s%Gsun_l = Gsun_l
+            s%Gsun_l_ms = Gsun_l_ms
+            s%Rsto_l = Rsto_l
+            s%Rsun_l = Rsun_l
+            s%Gsto_c = Gsto_c
+            s%Rsto_c = Rsto_c
+            s%Gsto_PEt = Gsto_PEt
+            s%Rsto_PEt = Rsto_PEt
+            s%O3_ppb_i = O3_ppb_i
+            s%O3_ppb = O3_ppb
+            s%O3_nmol_m3 = O3_nmol_m3
+            s%Vd = Vd
+            s%Vd_i = Vd_i
+            s%Ftot = Ftot
+            s%Fst = Fst
+            s%Fst_sun = Fst_sun
+            s%AFst0 = AFst0
+            s%AFstY = AFstY
+            s%AFstY_total = AFstY_total
+            s%OT40 = OT40
+            s%AOT40 = AOT40
+            s%OT0 = OT0
+            s%AOT0 = AOT0
+            s%fO3 = fO3
+            s%PARdir = PARdir
+            s%PARdif = PARdif
+            s%pPARdir = pPARdir
+            s%pPARdif = pPARdif
+            s%fPARdir = fPARdir
+            s%fPARdif = fPARdif
+            s%LAIsun = LAIsun
+            s%LAIshade = LAIshade
+            s%PARsun = PARsun
+            s%PARshade = PARshade
+            s%ST = ST
+        end subroutine Store_Variables
+
+        subroutine Store_Inputs(s)
+            use Inputs, only: yr, mm, mdd, dd, td, hr, Ts_C, Tleaf, VPD, &
+                              uh_zR, precip, P, O3_ppb_zR, CO2, Hd, R, PAR, &
+                              cloudfrac, fSWP, ASW, Rn, leaf_fphen_input, &
+                              sinB, Rn_W, ustar, ustar_ref, ustar_ref_O3, &
+                              uh_i, uh, L, invL, precip_acc, esat, eact, RH, &
+                              precip_dd, h, dec
+
+            type(Inputs_State), intent(out) :: s
+
+            s%yr = yr
+            s%mm = mm
+            s%mdd = mdd
+            s%dd = dd
+            s%td = td
+            s%hr = hr
+            s%Ts_C = Ts_C
+            s%Tleaf = Tleaf
+            s%VPD = VPD
+            s%uh_zR = uh_zR
+            s%precip = precip
+            s%P = P
+            s%O3_ppb_zR = O3_ppb_zR
+            s%CO2 = CO2
+            s%Hd = Hd
+            s%R = R
+            s%PAR = PAR
+            s%cloudfrac = cloudfrac
+            s%fSWP = fSWP
+            s%ASW = ASW
+            s%Rn = Rn
+            s%leaf_fphen_input = leaf_fphen_input
+            s%sinB = sinB
+            s%Rn_W = Rn_W
+            s%ustar = ustar
+            s%ustar_ref = ustar_ref
+            s%ustar_ref_O3 = ustar_ref_O3
+            s%uh_i = uh_i
+            s%uh = uh
+            s%L = L
+            s%invL = invL
+            s%precip_acc = precip_acc
+            s%esat = esat
+            s%eact = eact
+            s%RH = RH
+            s%precip_dd = precip_dd
+            s%h = h
+            s%dec = dec
+        end subroutine Store_Inputs
+
+        subroutine Store_SoilWater(s)
+            use SoilWater, only: ASW_FC, Ei_hr, Es_hr, PEt_hr, Et_hr, &
+                                 Et_hr_prev, PEt_3, Et_3, AEt_hr, Ei_dd, &
+                                 PEt_dd, Et_dd, Es_dd, AEt_dd, PWP, PWP_vol, &
+                                 r_meas
+
+            type(SoilWater_State), intent(out) :: s
+
+            s%ASW_FC = ASW_FC
+            s%Ei_hr = Ei_hr
+            s%Es_hr = Es_hr
+            s%PEt_hr = PEt_hr
+            s%Et_hr = Et_hr
+            s%Et_hr_prev = Et_hr_prev
+            s%PEt_3 = PEt_3
+            s%Et_3 = Et_3
+            s%AEt_hr = AEt_hr
+            s%Ei_dd = Ei_dd
+            s%PEt_dd = PEt_dd
+            s%Et_dd = Et_dd
+            s%Es_dd = Es_dd
+            s%AEt_dd = AEt_dd
+            s%PWP = PWP
+            s%PWP_vol = PWP_vol
+            s%r_meas = r_meas
+        end subroutine Store_SoilWater
+
+        subroutine Store_R(s)
+            use R, only: VPD_dd, Gsto_l_prev, Gsto_prev, Gsto_c_prev, &
+                         Gsto_PEt_prev, Gsun_l_prev
+
+            type(R_State), intent(out) :: s
+
+            s%VPD_dd = VPD_dd
+            s%Gsto_l_prev = Gsto_l_prev
+            s%Gsto_prev = Gsto_prev
+            s%Gsto_c_prev = Gsto_c_prev
+            s%Gsto_PEt_prev = Gsto_PEt_prev
+            s%Gsun_l_prev = Gsun_l_prev
+        end subroutine Store_R
+
+        subroutine Store_O3(s)
+            use O3, only: ustar_ref_o3
+
+            type(O3_State), intent(out) :: s
+
+            s%ustar_ref_o3 = ustar_ref_o3
+        end subroutine Store_O3
+
+        subroutine Store_Pn_Gsto(s)
+            use Pn_Gsto, only: alpha, Teta, H_a_jmax, H_d_jmax, H_a_vcmax, &
+                               H_d_vcmax, S_V_vcmax, S_V_jmax, gsto_final, &
+                               pngsto_l, pngsto, pngsto_c, pngsto_PEt, &
+                               pngsto_An
+
+            type(Pn_Gsto_State), intent(out) :: s
+
+            s%alpha = alpha
+            s%Teta = Teta
+            s%H_a_jmax = H_a_jmax
+            s%H_d_jmax = H_d_jmax
+            s%H_a_vcmax = H_a_vcmax
+            s%H_d_vcmax = H_d_vcmax
+            s%S_V_vcmax = S_V_vcmax
+            s%S_V_jmax = S_V_jmax
+            s%gsto_final = gsto_final
+            s%pngsto_l = pngsto_l
+            s%pngsto = pngsto
+            s%pngsto_c = pngsto_c
+            s%pngsto_PEt = pngsto_PEt
+            s%pngsto_An = pngsto_An
+        end subroutine Store_Pn_Gsto
+
+    end subroutine Store_Site
+
+    !
+    ! Load the stored state of site i into the model
+    !
+    subroutine Load_Site(i)
+        integer, intent(in) :: i
+
+        call Load_Options(sites(i)%options)
+        call Load_Parameters(sites(i)%parameters)
+        call Load_Variables(sites(i)%variables)
+        call Load_Inputs(sites(i)%inputs)
+        call Load_SoilWater(sites(i)%soilwater)
+        call Load_R(sites(i)%r)
+        call Load_O3(sites(i)%o3)
+        call Load_Pn_Gsto(sites(i)%pn_gsto)
+
+    contains
+
+        subroutine Load_Options(s)
+            use Options, only: sai_method, rn_method, leaf_fphen_method, &
+                               ra_method, tleaf_method, gsto_method, &
+                               fo3_method, fswp_method, asw_method, &
+                               lwp_method, fxwp_method, r_par_method, &
+                               sgs_egs_method, ustar_method
+
+            type(Options_State), intent(in) :: s
+
+            sai_method = s%sai_method
+            rn_method = s%rn_method
+            leaf_fphen_method = s%leaf_fphen_method
+            ra_method = s%ra_method
+            tleaf_method = s%tleaf_method
+            gsto_method = s%gsto_method
+            fo3_method = s%fo3_method
+            fswp_method = s%fswp_method
+            asw_method = s%asw_method
+            lwp_method = s%lwp_method
+            fxwp_method = s%fxwp_method
+            r_par_method = s%r_par_method
+            sgs_egs_method = s%sgs_egs_method
+            ustar_method = s%ustar_method
+        end subroutine Load_Options
+
+        subroutine Load_Parameters(s)
+            use Parameters, only: Rsoil, soil_b, Fc_m, SWP_AE, Ksat, uzR, &
+                                  O3zR, xzR, D_meas, u_h, u_d, u_zo, O3_h, &
+                                  O3_d, O3_zo, lat, lon, elev, T_min, T_opt, &
+                                  T_max, VPD_min, VPD_max, VPD_crit, SWP_min, &
+                                  SWP_max, ASW_FC_override, ASW_min, ASW_max, &
+                                  gmax, gmorph, fmin, albedo, root, h, zo, d, &
+                                  SGS, EGS, mid_anthesis, LAI_a, LAI_b, &
+                                  LAI_c, LAI_d, LAI_1, LAI_2, fphen_limA, &
+                                  fphen_limB, fphen_a, fphen_b, fphen_c, &
+                                  fphen_d, fphen_e, fphen_1, fphen_2, &
+                                  fphen_3, fphen_4, Astart, Aend, &
+                                  leaf_fphen_a, leaf_fphen_b, leaf_fphen_c, &
+                                  leaf_fphen_1, leaf_fphen_2, cosA, &
+                                  f_lightfac, Rext, Rinc_b, Lm, Y, g_sto_0, &
+                                  m, V_cmax_25, J_max_25
+
+            type(Parameters_State), intent(in) :: s
+
+            Rsoil = s%Rsoil
+            soil_b = s%soil_b
+            Fc_m = s%Fc_m
+            SWP_AE = s%SWP_AE
+            Ksat = s%Ksat
+            uzR = s%uzR
+            O3zR = s%O3zR
+            xzR = s%xzR
+            D_meas = s%D_meas
+            u_h = s%u_h
+            u_d = s%u_d
+            u_zo = s%u_zo
+            O3_h = s%O3_h
+            O3_d = s%O3_d
+            O3_zo = s%O3_zo
+            lat = s%lat
+            lon = s%lon
+            elev = s%elev
+            T_min = s%T_min
+            T_opt = s%T_opt
+            T_max = s%T_max
+            VPD_min = s%VPD_min
+            VPD_max = s%VPD_max
+            VPD_crit = s%VPD_crit
+            SWP_min = s%SWP_min
+            SWP_max = s%SWP_max
+            ASW_FC_override = s%ASW_FC_override
+            ASW_min = s%ASW_min
+            ASW_max = s%ASW_max
+            gmax = s%gmax
+            gmorph = s%gmorph
+            fmin = s%fmin
+            albedo = s%albedo
+            root = s%root
+            h = s%h
+            zo = s%zo
+            d = s%d
+            SGS = s%SGS
+            EGS = s%EGS
+            mid_anthesis = s%mid_anthesis
+            LAI_a = s%LAI_a
+            LAI_b = s%LAI_b
+            LAI_c = s%LAI_c
+            LAI_d = s%LAI_d
+            LAI_1 = s%LAI_1
+            LAI_2 = s%LAI_2
+            fphen_limA = s%fphen_limA
+            fphen_limB = s%fphen_limB
+            fphen_a = s%fphen_a
+            fphen_b = s%fphen_b
+            fphen_c = s%fphen_c
+            fphen_d = s%fphen_d
+            fphen_e = s%fphen_e
+            fphen_1 = s%fphen_1
+            fphen_2 = s%fphen_2
+            fphen_3 = s%fphen_3
+            fphen_4 = s%fphen_4
+            Astart = s%Astart
+            Aend = s%Aend
+            leaf_fphen_a = s%leaf_fphen_a
+            leaf_fphen_b = s%leaf_fphen_b
+            leaf_fphen_c = s%leaf_fphen_c
+            leaf_fphen_1 = s%leaf_fphen_1
+            leaf_fphen_2 = s%leaf_fphen_2
+            cosA = s%cosA
+            f_lightfac = s%f_lightfac
+            Rext = s%Rext
+            Rinc_b = s%Rinc_b
+            Lm = s%Lm
+            Y = s%Y
+            g_sto_0 = s%g_sto_0
+            m = s%m
+            V_cmax_25 = s%V_cmax_25
+            J_max_25 = s%J_max_25
+        end subroutine Load_Parameters
+
+        subroutine Load_Variables(s)
+            use Variables, only: dd_prev, ftemp, fVPD, Flight, Flightsun, &
+                                 Flightshade, leaf_flight, LAI, SAI, fphen, &
+                                 leaf_fphen, Ei, PEt, Et, Es, AEt, Sn_star, &
+                                 ASW, Sn, per_vol, SMD, SWP, fSWP, P_input, &
+                                 Sn_diff, fXWP, LWP, delta_LWP, fLWP, &
+                                 Sn_meas, Sn_diff_meas, SWP_meas, SMD_meas, &
+                                 fPAW, Es_blocked, Ra, Rb, Rb_ref, Rb_H2O, &
+                                 Rsur, Rinc, Rgs, Rext, Ra_ref_i, Ra_O3zR_i, &
+                                 Ra_tar_i, Gsto, Rsto, Gsto_l, Gsun_l, &
+                                 Gsun_l_ms, Rsto_l, Rsun_l, Gsto_c, Rsto_c, &
+                                 Gsto_PEt, Rsto_PEt, O3_ppb_i, O3_ppb, &
+                                 O3_nmol_m3, Vd, Vd_i, Ftot, Fst, Fst_sun, &
+                                 AFst0, AFstY, AFstY_total, OT40, AOT40, OT0, &
+                                 AOT0, fO3, PARdir, PARdif, pPARdir, pPARdif, &
+                                 fPARdir, fPARdif, LAIsun, LAIshade, PARsun, &
+                                 PARshade, ST
+
+            type(Variables_State), intent(in) :: s
+
+            dd_prev = s%dd_prev
+            ftemp = s%ftemp
+            fVPD = s%fVPD
+            Flight = s%Flight
+            Flightsun = s%Flightsun
+            Flightshade = s%Flightshade
+            leaf_flight = s%leaf_flight
+            LAI = s%LAI
+            SAI = s%SAI
+            fphen = s%fphen
+            leaf_fphen = s%leaf_fphen
+            Ei = s%Ei
+            PEt = s%PEt
+            Et = s%Et
+            Es = s%Es
+            AEt = s%AEt
+            Sn_star = s%Sn_star
+            ASW = s%ASW
+            Sn = s%Sn
+            per_vol = s%per_vol
+            SMD = s%SMD
+            SWP = s%SWP
+            fSWP = s%fSWP
+            P_input = s%P_input
+            Sn_diff = s%Sn_diff
+            fXWP = s%fXWP
+            LWP = s%LWP
+            delta_LWP = s%delta_LWP
+            fLWP = s%fLWP
+            Sn_meas = s%Sn_meas
+            Sn_diff_meas = s%Sn_diff_meas
+            SWP_meas = s%SWP_meas
+            SMD_meas = s%SMD_meas
+            fPAW = s%fPAW
+            Es_blocked = s%Es_blocked
+            Ra = s%Ra
+            Rb = s%Rb
+            Rb_ref = s%Rb_ref
+            Rb_H2O = s%Rb_H2O
+            Rsur = s%Rsur
+            Rinc = s%Rinc
+            Rgs = s%Rgs
+            Rext = s%Rext
+            Ra_ref_i = s%Ra_ref_i
+            Ra_O3zR_i = s%Ra_O3zR_i
+            Ra_tar_i = s%Ra_tar_i
+            Gsto = s%Gsto
+            Rsto = s%Rsto
+            Gsto_l = s%Gsto_l
+            Gsun_l = s%Gsun_l
+            Gsun_l_ms = s%Gsun_l_ms
+            Rsto_l = s%Rsto_l
+            Rsun_l = s%Rsun_l
+            Gsto_c = s%Gsto_c
+            Rsto_c = s%Rsto_c
+            Gsto_PEt = s%Gsto_PEt
+            Rsto_PEt = s%Rsto_PEt
+            O3_ppb_i = s%O3_ppb_i
+            O3_ppb = s%O3_ppb
+            O3_nmol_m3 = s%O3_nmol_m3
+            Vd = s%Vd
+            Vd_i = s%Vd_i
+            Ftot = s%Ftot
+            Fst = s%Fst
+            Fst_sun = s%Fst_sun
+            AFst0 = s%AFst0
+            AFstY = s%AFstY
+            AFstY_total = s%AFstY_total
+            OT40 = s%OT40
+            AOT40 = s%AOT40
+            OT0 = s%OT0
+            AOT0 = s%AOT0
+            fO3 = s%fO3
+            PARdir = s%PARdir
+            PARdif = s%PARdif
+            pPARdir = s%pPARdir
+            pPARdif = s%pPARdif
+            fPARdir = s%fPARdir
+            fPARdif = s%fPARdif
+            LAIsun = s%LAIsun
+            LAIshade = s%LAIshade
+            PARsun = s%PARsun
+            PARshade = s%PARshade
+            ST = s%ST
+        end subroutine Load_Variables
+
+        subroutine Load_Inputs(s)
+            use Inputs, only: yr, mm, mdd, dd, td, hr, Ts_C, Tleaf, VPD, &
+                              uh_zR, precip, P, O3_ppb_zR, CO2, Hd, R, PAR, &
+                              cloudfrac, fSWP, ASW, Rn, leaf_fphen_input, &
+                              sinB, Rn_W, ustar, ustar_ref, ustar_ref_O3, &
+                              uh_i, uh, L, invL, precip_acc, esat, eact, RH, &
+                              precip_dd, h, dec
+
+            type(Inputs_State), intent(in) :: s
+
+            yr = s%yr
+            mm = s%mm
+            mdd = s%mdd
+            dd = s%dd
+            td = s%td
+            hr = s%hr
+            Ts_C = s%Ts_C
+            Tleaf = s%Tleaf
+            VPD = s%VPD
+            uh_zR = s%uh_zR
+            precip = s%precip
+            P = s%P
+            O3_ppb_zR = s%O3_ppb_zR
+            CO2 = s%CO2
+            Hd = s%Hd
+            R = s%R
+            PAR = s%PAR
+            cloudfrac = s%cloudfrac
+            fSWP = s%fSWP
+            ASW = s%ASW
+            Rn = s%Rn
+            leaf_fphen_input = s%leaf_fphen_input
+            sinB = s%sinB
+            Rn_W = s%Rn_W
+            ustar = s%ustar
+            ustar_ref = s%ustar_ref
+            ustar_ref_O3 = s%ustar_ref_O3
+            uh_i = s%uh_i
+            uh = s%uh
+            L = s%L
+            invL = s%invL
+            precip_acc = s%precip_acc
+            esat = s%esat
+            eact = s%eact
+            RH = s%RH
+            precip_dd = s%precip_dd
+            h = s%h
+            dec = s%dec
+        end subroutine Load_Inputs
+
+        subroutine Load_SoilWater(s)
+            use SoilWater, only: ASW_FC, Ei_hr, Es_hr, PEt_hr, Et_hr, &
+                                 Et_hr_prev, PEt_3, Et_3, AEt_hr, Ei_dd, &
+                                 PEt_dd, Et_dd, Es_dd, AEt_dd, PWP, PWP_vol, &
+                                 r_meas
+
+            type(SoilWater_State), intent(in) :: s
+
+            ASW_FC = s%ASW_FC
+            Ei_hr = s%Ei_hr
+            Es_hr = s%Es_hr
+            PEt_hr = s%PEt_hr
+            Et_hr = s%Et_hr
+            Et_hr_prev = s%Et_hr_prev
+            PEt_3 = s%PEt_3
+            Et_3 = s%Et_3
+            AEt_hr = s%AEt_hr
+            Ei_dd = s%Ei_dd
+            PEt_dd = s%PEt_dd
+            Et_dd = s%Et_dd
+            Es_dd = s%Es_dd
+            AEt_dd = s%AEt_dd
+            PWP = s%PWP
+            PWP_vol = s%PWP_vol
+            r_meas = s%r_meas
+        end subroutine Load_SoilWater
+
+        subroutine Load_R(s)
+            use R, only: VPD_dd, Gsto_l_prev, Gsto_prev, Gsto_c_prev, &
+                         Gsto_PEt_prev, Gsun_l_prev
+
+            type(R_State), intent(in) :: s
+
+            VPD_dd = s%VPD_dd
+            Gsto_l_prev = s%Gsto_l_prev
+            Gsto_prev = s%Gsto_prev
+            Gsto_c_prev = s%Gsto_c_prev
+            Gsto_PEt_prev = s%Gsto_PEt_prev
+            Gsun_l_prev = s%Gsun_l_prev
+        end subroutine Load_R
+
+        subroutine Load_O3(s)
+            use O3, only: ustar_ref_o3
+
+            type(O3_State), intent(in) :: s
+
+            ustar_ref_o3 = s%ustar_ref_o3
+        end subroutine Load_O3
+
+        subroutine Load_Pn_Gsto(s)
+            use Pn_Gsto, only: alpha, Teta, H_a_jmax, H_d_jmax, H_a_vcmax, &
+                               H_d_vcmax, S_V_vcmax, S_V_jmax, gsto_final, &
+                               pngsto_l, pngsto, pngsto_c, pngsto_PEt, &
+                               pngsto_An
+
+            type(Pn_Gsto_State), intent(in) :: s
+
+            alpha = s%alpha
+            Teta = s%Teta
+            H_a_jmax = s%H_a_jmax
+            H_d_jmax = s%H_d_jmax
+            H_a_vcmax = s%H_a_vcmax
+            H_d_vcmax = s%H_d_vcmax
+            S_V_vcmax = s%S_V_vcmax
+            S_V_jmax = s%S_V_jmax
+            gsto_final = s%gsto_final
+            pngsto_l = s%pngsto_l
+            pngsto = s%pngsto
+            pngsto_c = s%pngsto_c
+            pngsto_PEt = s%pngsto_PEt
+            pngsto_An = s%pngsto_An
+        end subroutine Load_Pn_Gsto
+
+    end subroutine Load_Site
+
+    !
+    ! Check that sites 1 to n all have the same options, as Run_Batch_Sites
+    ! needs
+    !
+    function Site_Options_Match(n) result(match)
+        integer, intent(in) :: n
+        logical :: match
+
+        integer :: k
+
+        match = .true.
+        do k = 2, n
+            match = match .and. &
+                all(transfer(sites(k)%options, (/0/)) == transfer(sites(1)%options, (/0/)))
+        end do
+    end function Site_Options_Match
+
+    !
+    ! Run the model over nrows rows of input data without returning to the
+    ! caller between rows.  Column j of input_data is stored in the input
+    ! variable identified by input_ids(j) (see Batch), and after each row the
+    ! output variables identified by output_ids are copied into output_data.
+    !
+    ! The model variables are stored in slot 0, run there as a single site
+    ! (see Run_Batch_Sites) and loaded back afterwards.
+    !
+    subroutine Run_Batch(input_ids, input_data, output_ids, output_data, &
+                         nin, nrows, nout)
+        integer, intent(in) :: nin, nrows, nout
+        integer, dimension(nin), intent(in) :: input_ids
+        real, dimension(nin, nrows), intent(in) :: input_data
+        integer, dimension(nout), intent(in) :: output_ids
+        real, dimension(nrows, nout), intent(out) :: output_data
+
+        real, dimension(:, :, :), allocatable :: site_output
+
+        allocate(site_output(nrows, nout, 0:0))
+
+        call Init_Snapshot()
+        call Store_Site(0)
+        call Run_Slots(0, 0, input_ids, reshape(input_data, (/ nin, nrows, 1 /)), &
+                       output_ids, site_output, nin, nrows, nout)
+        call Load_Site(0)
+
+        output_data = site_output(:, :, 0)
+        deallocate(site_output)
+    end subroutine Run_Batch
+
+    !
+    ! Run the model for nsites sites at once, over nrows rows of input data
+    ! for each site.  Each site's state must have been stored with Store_Site
+    ! after initialising the model for it, and all of the sites must have the
+    ! same options (see Site_Options_Match).  input_data(:, :, k) and
+    ! output_data(:, :, k) are used as for Run_Batch for site k.
+    !
+    ! The model's module variables are not used or changed, and the sites can
+    ! be run on with further rows.
+    !
+    subroutine Run_Batch_Sites(input_ids, input_data, output_ids, output_data, &
+                               nin, nrows, nsites, nout)
+        integer, intent(in) :: nin, nrows, nsites, nout
+        integer, dimension(nin), intent(in) :: input_ids
+        real, dimension(nin, nrows, nsites), intent(in) :: input_data
+        integer, dimension(nout), intent(in) :: output_ids
+        real, dimension(nrows, nout, nsites), intent(out) :: output_data
+
+        if (nsites < 1) then
+            return
+        end if
+
+        call Run_Slots(1, nsites, input_ids, input_data, output_ids, output_data, &
+                       nin, nrows, nout)
+    end subroutine Run_Batch_Sites
+
+    !
+    ! Run the model on the stored states in slots first to last, as
+    ! Run_Batch_Sites.  The stored states are advanced in place, one row at a
+    ! time: each step of the model is done for every site before the next
+    ! step, and the options are only looked at once per step rather than once
+    ! per site.
+    !
+    ! The states are an array of Model_State structures, so the loops over
+    ! the sites are not vectorised: each site takes about as long to run as it
+    ! does on its own.
+    !
+    subroutine Run_Slots(first, last, input_ids, input_data, output_ids, output_data, &
+                         nin, nrows, nout)
+        integer, intent(in) :: first, last, nin, nrows, nout
+        integer, dimension(nin), intent(in) :: input_ids
+        real, dimension(nin, nrows, first:last), intent(in) :: input_data
+        integer, dimension(nout), intent(in) :: output_ids
+        real, dimension(nrows, nout, first:last), intent(out) :: output_data
+
+        integer :: i, j
+
+        do i = 1, nrows
+            do j = 1, nin
+                call Set_Inputs(sites(first:last), input_ids(j), input_data(j, i, :))
+            end do
+
+            call Calculate_Rows(sites(first:last))
+
+            do j = 1, nout
+                call Get_Outputs(sites(first:last), output_ids(j), output_data(i, j, :))
+            end do
+        end do
+
+    contains
+
+        !
+        ! Set the input variable identified by id (see Batch) for each site
+        !
+        subroutine Set_Inputs(s, id, values)
+            use Batch
+
+            type(Model_State), dimension(:), intent(inout) :: s
+            integer, intent(in) :: id
+            real, dimension(:), intent(in) :: values
+
+            select case (id)
+            case (in_yr)
+                s%inputs%yr = values
+            case (in_mm)
+                s%inputs%mm = values
+            case (in_mdd)
+                s%inputs%mdd = values
+            case (in_dd)
+                s%inputs%dd = values
+            case (in_td)
+                s%inputs%td = values
+            case (in_hr)
+                s%inputs%hr = values
+            case (in_ts_c)
+                s%inputs%Ts_C = values
+            case (in_tleaf)
+                s%inputs%Tleaf = values
+            case (in_vpd)
+                s%inputs%VPD = values
+            case (in_uh_zr)
+                s%inputs%uh_zR = values
+            case (in_precip)
+                s%inputs%precip = values
+            case (in_p)
+                s%inputs%P = values
+            case (in_o3_ppb_zr)
+                s%inputs%O3_ppb_zR = values
+            case (in_co2)
+                s%inputs%CO2 = values
+            case (in_hd)
+                s%inputs%Hd = values
+            case (in_r)
+                s%inputs%R = values
+            case (in_par)
+                s%inputs%PAR = values
+            case (in_rn)
+                s%inputs%Rn = values
+            case (in_cloudfrac)
+                s%inputs%cloudfrac = values
+            case (in_leaf_fphen_input)
+                s%inputs%leaf_fphen_input = values
+            case (in_ustar)
+                s%inputs%ustar = values
+            case (in_ustar_ref)
+                s%inputs%ustar_ref = values
+            case (in_fswp)
+                s%inputs%fSWP = values
+            case (in_asw)
+                s%inputs%ASW = values
+            end select
+        end subroutine Set_Inputs
+
+        !
+        ! Get the value of the output variable identified by id (see Batch)
+        ! for each site
+        !
+        subroutine Get_Outputs(s, id, values)
+            use Batch
+
+            type(Model_State), dimension(:), intent(in) :: s
+            integer, intent(in) :: id
+            real, dimension(:), intent(out) :: values
+
+            select case (id)
+            case (out_yr)
+                values = s%inputs%yr
+            case (out_mm)
+                values = s%inputs%mm
+            case (out_mdd)
+                values = s%inputs%mdd
+            case (out_dd)
+                values = s%inputs%dd
+            case (out_td)
+                values = s%inputs%td
+            case (out_cloudfrac)
+                values = s%inputs%cloudfrac
+            case (out_hr)
+                values = s%inputs%hr
+            case (out_ts_c)
+                values = s%inputs%Ts_C
+            case (out_tleaf)
+                values = s%inputs%Tleaf
+            case (out_vpd)
+                values = s%inputs%VPD
+            case (out_uh_zr)
+                values = s%inputs%uh_zR
+            case (out_precip)
+                values = s%inputs%precip
+            case (out_precip_acc)
+                values = s%inputs%precip_acc
+            case (out_p)
+                values = s%inputs%P
+            case (out_o3_ppb_zr)
+                values = s%inputs%O3_ppb_zR
+            case (out_co2)
+                values = s%inputs%CO2
+            case (out_hd)
+                values = s%inputs%Hd
+            case (out_r)
+                values = s%inputs%R
+            case (out_par)
+                values = s%inputs%PAR
+            case (out_ustar)
+                values = s%inputs%ustar
+            case (out_ustar_ref)
+                values = s%inputs%ustar_ref
+            case (out_uh_i)
+                values = s%inputs%uh_i
+            case (out_uh)
+                values = s%inputs%uh
+            case (out_rn)
+                values = s%inputs%Rn
+            case (out_rn_w)
+                values = s%inputs%Rn_W
+            case (out_sinb)
+                values = s%inputs%sinB
+            case (out_invl)
+                values = s%inputs%invL
+            case (out_pardir)
+                values = s%variables%PARdir
+            case (out_pardif)
+                values = s%variables%PARdif
+            case (out_ra)
+                values = s%variables%Ra
+            case (out_ra_tar_i)
+                values = s%variables%Ra_tar_i
+            case (out_ra_ref_i)
+                values = s%variables%Ra_ref_i
+            case (out_rb)
+                values = s%variables%Rb
+            case (out_rsur)
+                values = s%variables%Rsur
+            case (out_rinc)
+                values = s%variables%Rinc
+            case (out_rsto)
+                values = s%variables%Rsto
+            case (out_gsto)
+                values = s%variables%Gsto
+            case (out_rsto_l)
+                values = s%variables%Rsto_l
+            case (out_rsun_l)
+                values = s%variables%Rsun_l
+            case (out_gsto_l)
+                values = s%variables%Gsto_l
+            case (out_gsun_l)
+                values = s%variables%Gsun_l
+            case (out_gsun_l_ms)
+                values = s%variables%Gsun_l_ms
+            case (out_rsto_c)
+                values = s%variables%Rsto_c
+            case (out_gsto_c)
+                values = s%variables%Gsto_c
+            case (out_rgs)
+                values = s%variables%Rgs
+            case (out_vd)
+                values = s%variables%Vd
+            case (out_o3_ppb_i)
+                values = s%variables%O3_ppb_i
+            case (out_o3_ppb)
+                values = s%variables%O3_ppb
+            case (out_o3_nmol_m3)
+                values = s%variables%O3_nmol_m3
+            case (out_fst)
+                values = s%variables%Fst
+            case (out_fst_sun)
+                values = s%variables%Fst_sun
+            case (out_afst0)
+                values = s%variables%AFst0
+            case (out_afsty)
+                values = s%variables%AFstY
+            case (out_afsty_total)
+                values = s%variables%AFstY_total
+            case (out_ftot)
+                values = s%variables%Ftot
+            case (out_ot40)
+                values = s%variables%OT40
+            case (out_aot40)
+                values = s%variables%AOT40
+            case (out_lai)
+                values = s%variables%LAI
+            case (out_sai)
+                values = s%variables%SAI
+            case (out_pet)
+                values = s%variables%PEt
+            case (out_et)
+                values = s%variables%Et
+            case (out_ei)
+                values = s%variables%Ei
+            case (out_es)
+                values = s%variables%Es
+            case (out_sn)
+                values = s%variables%Sn
+            case (out_per_vol)
+                values = s%variables%per_vol
+            case (out_smd)
+                values = s%variables%SMD
+            case (out_swp)
+                values = s%variables%SWP
+            case (out_lwp)
+                values = s%variables%LWP
+            case (out_asw)
+                values = s%variables%ASW
+            case (out_sn_meas)
+                values = s%variables%Sn_meas
+            case (out_swp_meas)
+                values = s%variables%SWP_meas
+            case (out_smd_meas)
+                values = s%variables%SMD_meas
+            case (out_fphen)
+                values = s%variables%fphen
+            case (out_leaf_fphen)
+                values = s%variables%leaf_fphen
+            case (out_flight)
+                values = s%variables%Flight
+            case (out_flightsun)
+                values = s%variables%Flightsun
+            case (out_flightshade)
+                values = s%variables%Flightshade
+            case (out_leaf_flight)
+                values = s%variables%leaf_flight
+            case (out_ftemp)
+                values = s%variables%ftemp
+            case (out_fvpd)
+                values = s%variables%fVPD
+            case (out_fxwp)
+                values = s%variables%fXWP
+            case (out_fo3)
+                values = s%variables%fO3
+            case (out_gsto_final)
+                values = s%pn_gsto%gsto_final
+            case (out_pngsto_l)
+                values = s%pn_gsto%pngsto_l
+            case (out_pngsto)
+                values = s%pn_gsto%pngsto
+            case (out_pngsto_c)
+                values = s%pn_gsto%pngsto_c
+            case (out_pngsto_pet)
+                values = s%pn_gsto%pngsto_PEt
+            case (out_pngsto_an)
+                values = s%pn_gsto%pngsto_An
+            case (out_st)
+                values = s%variables%ST
+            case (out_ppardir)
+                values = s%variables%pPARdir
+            case (out_ppardif)
+                values = s%variables%pPARdif
+            case (out_fpardir)
+                values = s%variables%fPARdir
+            case (out_fpardif)
+                values = s%variables%fPARdif
+            case (out_laisun)
+                values = s%variables%LAIsun
+            case (out_laishade)
+                values = s%variables%LAIshade
+            case (out_parsun)
+                values = s%variables%PARsun
+            case (out_parshade)
+                values = s%variables%PARshade
+            case (out_et_hr)
+                values = s%soilwater%Et_hr
+            case (out_ei_hr)
+                values = s%soilwater%Ei_hr
+            case (out_es_hr)
+                values = s%soilwater%Es_hr
+            case (out_es_blocked)
+                values = merge(1.0, 0.0, s%variables%Es_blocked)
+            case (out_asw_fc)
+                values = s%soilwater%ASW_FC
+            case (out_asw_max)
+                values = s%parameters%ASW_max
+            case (out_sgs)
+                values = real(s%parameters%SGS)
+            case (out_egs)
+                values = real(s%parameters%EGS)
+            case (out_ustar_ref_o3)
+                values = s%o3%ustar_ref_o3
+            case (out_ra_o3zr_i)
+                values = s%variables%Ra_O3zR_i
+            case (out_vd_i)
+                values = s%variables%Vd_i
+            case (out_rb_ref)
+                values = s%variables%Rb_ref
+            case (out_vpd_dd)
+                values = s%r%VPD_dd
+            case default
+                values = 0
+            end select
+        end subroutine Get_Outputs
+
+        !
+        ! Run the model for the current row of inputs of each site
+        !
+        subroutine Calculate_Rows(s)
+            type(Model_State), dimension(:), intent(inout) :: s
+
+            integer :: k
+
+            ! At the start of a new day, do daily actions on previous day's
+            ! data, for all of the sites together if they all start a new day
+            if (all(s%variables%dd_prev /= s%inputs%dd)) then
+                call Daily_Sites(s)
+            else
+                do k = 1, size(s)
+                    if (s(k)%variables%dd_prev /= s(k)%inputs%dd) then
+                        call Daily_Sites(s(k:k))
+                    end if
+                end do
+            end if
+
+            ! Run hourly calculations
+            call Hourly_Sites(s)
+
+            s%variables%dd_prev = s%inputs%dd
+        end subroutine Calculate_Rows
+
+        !
+        ! The hourly steps of the model, for each site
+        !
+        subroutine Hourly_Sites(s)
+            use Constants, only: Ts_K, izR, DO3, DH2O
+            use Options, only: ustar_calculate, ustar_input, ustar_i_input, &
+                               r_par_derive_r, r_par_derive_par, &
+                               r_par_derive_cloudfrac, rn_use_input, &
+                               rn_calculate, fo3_disabled, fo3_wheat, &
+                               fo3_potato, fxwp_disabled, fxwp_use_fswp, &
+                               fxwp_use_flwp, fxwp_use_fpaw, ra_simple, &
+                               ra_with_heat_flux, gsto_multiplicative, &
+                               gsto_photosynthetic, tleaf_estimate, &
+                               lwp_non_steady_state, lwp_steady_state
+            use Inputs, only: calc_monin_obukhov_length, Wind_From_uh_zR, &
+                              Wind_From_uh_zR_ustar, Wind_From_uh_zR_ustar_ref, &
+                              estimate_ustar_simple, Solar_Position, &
+                              net_radiation, Humidity
+            use Environmental, only: ftemp_curve, fVPD_curve, Canopy_Light, &
+                                     PAR_From_cloudfrac
+            use SoilWater, only: Penman_Monteith, Leaf_Water_Potential, &
+                                 steady_state_LWP, fSWP_exp_curve
+            use R, only: calc_ra_simple => ra_simple, ra_heat_flux, rb, &
+                         rgs_of, rext_of, rinc_of, Accumulate_VPD, Limit_Gsto, &
+                         Multiplicative_Gsto => Gsto_Multiplicative, &
+                         rsto_from_gsto, rsur_of
+            use O3, only: O3_Concentration, Stomatal_Flux, Accumulate_AFstY, &
+                          Accumulate_AOT40, fO3_wheat_curve, fO3_potato_curve
+            use Switchboard, only: next_Tleaf
+
+            type(Model_State), dimension(:), intent(inout) :: s
+
+            logical :: estimate_Tleaf
+            integer :: i, k
+
+            ! Derivation of inputs not supplied
+            s%inputs%precip_dd = s%inputs%precip_dd + (s%inputs%precip/1000)
+
+            do k = 1, size(s)
+                call Solar_Position(s(k)%parameters%lat, s(k)%parameters%lon, &
+                                    s(k)%inputs%dd, s(k)%inputs%hr, &
+                                    s(k)%inputs%h, s(k)%inputs%dec, s(k)%inputs%sinB)
+            end do
+
+            s%inputs%L = calc_monin_obukhov_length(s%inputs%Ts_C + Ts_K, s%inputs%ustar_ref, &
+                                                   s%inputs%Hd, s%inputs%P)
+            s%inputs%invL = 1/s%inputs%L
+
+            select case (s(1)%options%ustar_method)
+            case (ustar_calculate)
+                do k = 1, size(s)
+                    call Wind_From_uh_zR(s(k)%inputs%uh_zR, s(k)%parameters%h, &
+                                         s(k)%parameters%d, s(k)%parameters%zo, &
+                                         s(k)%parameters%u_d, s(k)%parameters%u_zo, &
+                                         s(k)%parameters%uzR, s(k)%inputs%ustar_ref, &
+                                         s(k)%inputs%uh_i, s(k)%inputs%ustar, s(k)%inputs%uh)
+                end do
+                s%inputs%ustar_ref_O3 = estimate_ustar_simple(s%inputs%uh_i, &
+                                                              s%parameters%O3zR - s%parameters%O3_d, &
+                                                              s%parameters%u_zo)
+            case (ustar_input)
+                do k = 1, size(s)
+                    call Wind_From_uh_zR_ustar(s(k)%inputs%uh_zR, s(k)%inputs%L, &
+                                               s(k)%inputs%invL, s(k)%parameters%h, &
+                                               s(k)%parameters%d, s(k)%parameters%zo, &
+                                               s(k)%parameters%u_d, s(k)%parameters%u_zo, &
+                                               s(k)%parameters%uzR, s(k)%inputs%ustar_ref, &
+                                               s(k)%inputs%uh_i, s(k)%inputs%uh, s(k)%inputs%ustar)
+                end do
+            case (ustar_i_input)
+                do k = 1, size(s)
+                    call Wind_From_uh_zR_ustar_ref(s(k)%inputs%uh_zR, s(k)%inputs%L, &
+                                                   s(k)%inputs%invL, s(k)%parameters%h, &
+                                                   s(k)%parameters%d, s(k)%parameters%zo, &
+                                                   s(k)%parameters%uzR, s(k)%inputs%uh_i, &
+                                                   s(k)%inputs%ustar, s(k)%inputs%uh)
+                end do
+            end select
+
+            select case (s(1)%options%r_par_method)
+            case (r_par_derive_r)
+                call ST_From_PAR_Sites(s)
+                s%inputs%R = s%inputs%PAR / 0.45
+            case (r_par_derive_par)
+                s%inputs%PAR = s%inputs%R * 0.45
+                call ST_From_PAR_Sites(s)
+            case (r_par_derive_cloudfrac)
+                do k = 1, size(s)
+                    call PAR_From_cloudfrac(s(k)%inputs%P, s(k)%inputs%sinB, &
+                                            s(k)%inputs%cloudfrac, s(k)%variables%LAI, &
+                                            s(k)%variables%pPARdir, s(k)%variables%pPARdif, &
+                                            s(k)%variables%fPARdir, s(k)%variables%fPARdif, &
+                                            s(k)%variables%PARdir, s(k)%variables%PARdif, &
+                                            s(k)%variables%ST, s(k)%inputs%PAR)
+                end do
+                s%inputs%R = s%inputs%PAR / 0.45
+            end select
+
+            select case (s(1)%options%rn_method)
+            case (rn_use_input)
+                s%inputs%Rn_W = s%inputs%Rn * 277.8
+            case (rn_calculate)
+                s%inputs%Rn = net_radiation(s%inputs%Ts_C, s%inputs%VPD, s%inputs%R, &
+                                            s%inputs%sinB, s%inputs%h, s%inputs%dec, &
+                                            s%inputs%dd, s%parameters%elev, &
+                                            s%parameters%lat, s%parameters%albedo)
+                s%inputs%Rn_W = s%inputs%Rn * 277.8
+            end select
+
+            do k = 1, size(s)
+                call Humidity(s(k)%inputs%Ts_C, s(k)%inputs%VPD, s(k)%inputs%esat, &
+                              s(k)%inputs%eact, s(k)%inputs%RH)
+            end do
+
+            do k = 1, size(s)
+                call Canopy_Light(s(k)%inputs%sinB, s(k)%inputs%PAR, s(k)%variables%LAI, &
+                                  s(k)%parameters%cosA, s(k)%parameters%f_lightfac, &
+                                  s(k)%variables%fPARdir, s(k)%variables%fPARdif, &
+                                  s(k)%variables%PARdir, s(k)%variables%PARdif, &
+                                  s(k)%variables%LAIsun, s(k)%variables%LAIshade, &
+                                  s(k)%variables%PARshade, s(k)%variables%PARsun, &
+                                  s(k)%variables%leaf_flight, s(k)%variables%Flightsun, &
+                                  s(k)%variables%Flightshade, s(k)%variables%Flight)
+            end do
+
+            s%variables%ftemp = ftemp_curve(s%inputs%Ts_C, s%inputs%PAR, s%parameters%T_min, &
+                                            s%parameters%T_opt, s%parameters%T_max, &
+                                            s%parameters%fmin)
+            s%variables%fVPD = fVPD_curve(s%inputs%VPD, s%parameters%fmin, &
+                                          s%parameters%VPD_min, s%parameters%VPD_max)
+
+            select case (s(1)%options%fo3_method)
+            case (fo3_disabled)
+                s%variables%fO3 = 1.0
+            case (fo3_wheat)
+                s%variables%fO3 = fO3_wheat_curve(s%variables%AFst0)
+            case (fo3_potato)
+                s%variables%fO3 = fO3_potato_curve(s%variables%AOT0)
+            end select
+
+            select case (s(1)%options%fxwp_method)
+            case (fxwp_disabled)
+                s%variables%fXWP = 1.0
+            case (fxwp_use_fswp)
+                s%variables%fXWP = s%variables%fSWP
+            case (fxwp_use_flwp)
+                s%variables%fXWP = s%variables%fLWP
+            case (fxwp_use_fpaw)
+                s%variables%fXWP = s%variables%fPAW
+            end select
+
+            select case (s(1)%options%ra_method)
+            case (ra_simple)
+                s%variables%Ra = calc_ra_simple(s%inputs%ustar, s%parameters%h, izR, &
+                                                s%parameters%d)
+            case (ra_with_heat_flux)
+                s%variables%Ra = ra_heat_flux(s%inputs%ustar, s%parameters%zo, &
+                                              izR - s%parameters%d, s%inputs%invL)
+            end select
+
+            s%variables%Rb = rb(s%inputs%ustar, DO3)
+            s%variables%Rb_H2O = rb(s%inputs%ustar, DH2O)
+            s%variables%Rgs = rgs_of(s%inputs%Ts_C, s%parameters%Rsoil)
+            s%variables%Rinc = rinc_of(s%parameters%Rinc_b, s%variables%SAI, &
+                                       s%parameters%h, s%inputs%ustar)
+            s%variables%Rext = rext_of(s%inputs%Ts_C, s%parameters%Rext)
+
+            ! Tleaf is not estimated before gsto (see SB_Calc_Tleaf)
+
+            s%r%Gsto_l_prev = s%variables%Gsto_l
+            s%r%Gsun_l_prev = s%variables%Gsun_l
+            s%r%Gsto_prev = s%variables%Gsto
+            s%r%Gsto_c_prev = s%variables%Gsto_c
+            s%r%Gsto_PEt_prev = s%variables%Gsto_PEt
+            do k = 1, size(s)
+                call Accumulate_VPD(s(k)%inputs%dd, s(k)%variables%dd_prev, s(k)%inputs%R, &
+                                    s(k)%inputs%VPD, s(k)%r%VPD_dd)
+            end do
+
+            ! As SB_Calc_gsto, but without repeating calculations which give
+            ! the same results
+            do k = 1, size(s)
+                call Multiplicative_Gsto(s(k)%inputs%Ts_C, s(k)%parameters%gmax, &
+                                         s(k)%parameters%gmorph, s(k)%parameters%fmin, &
+                                         s(k)%variables%fphen, s(k)%variables%leaf_fphen, &
+                                         s(k)%variables%Flight, s(k)%variables%Flightsun, &
+                                         s(k)%variables%leaf_flight, s(k)%variables%ftemp, &
+                                         s(k)%variables%fVPD, s(k)%variables%fXWP, &
+                                         s(k)%variables%fO3, s(k)%variables%LAI, &
+                                         s(k)%variables%Gsto_l, s(k)%variables%Gsun_l, &
+                                         s(k)%variables%Gsun_l_ms, s(k)%variables%Gsto, &
+                                         s(k)%variables%Gsto_c, s(k)%variables%Gsto_PEt)
+            end do
+
+            estimate_Tleaf = s(1)%options%tleaf_method == tleaf_estimate .and. &
+                             (s(1)%options%gsto_method == gsto_multiplicative .or. &
+                              s(1)%options%gsto_method == gsto_photosynthetic)
+            if (estimate_Tleaf) then
+                s%inputs%Tleaf = s%inputs%Ts_C
+                call Gsto_Pn_Sites(s)
+                do i = 1, 5
+                    s%inputs%Tleaf = next_Tleaf(s%inputs%R, s%inputs%eact, s%inputs%Ts_C, &
+                                                s%inputs%Tleaf, s%inputs%P, s%inputs%uh, &
+                                                s%pn_gsto%gsto_final, s%parameters%Lm, &
+                                                s%parameters%albedo)
+                    call Gsto_Pn_Sites(s)
+                end do
+            else
+                call Gsto_Pn_Sites(s)
+            end if
+
+            if (estimate_Tleaf .and. s(1)%options%gsto_method == gsto_photosynthetic) then
+                s%variables%Gsto_l = s%pn_gsto%pngsto_l
+                s%variables%Gsto = s%pn_gsto%pngsto
+                s%variables%Gsto_c = s%pn_gsto%pngsto_c
+                s%variables%Gsto_PEt = s%pn_gsto%pngsto_PEt
+            end if
+
+            do k = 1, size(s)
+                call Limit_Gsto(s(k)%r%VPD_dd, s(k)%parameters%VPD_crit, &
+                                s(k)%r%Gsto_l_prev, s(k)%r%Gsun_l_prev, s(k)%r%Gsto_prev, &
+                                s(k)%r%Gsto_c_prev, s(k)%r%Gsto_PEt_prev, &
+                                s(k)%variables%Gsto_l, s(k)%variables%Gsun_l, &
+                                s(k)%variables%Gsto, s(k)%variables%Gsto_c, &
+                                s(k)%variables%Gsto_PEt)
+            end do
+
+            s%variables%Rsto_l = rsto_from_gsto(s%variables%Gsto_l, s%inputs%Ts_C)
+            s%variables%Rsun_l = rsto_from_gsto(s%variables%Gsun_l, s%inputs%Ts_C)
+            s%variables%Rsto = rsto_from_gsto(s%variables%Gsto, s%inputs%Ts_C)
+            s%variables%Rsto_c = rsto_from_gsto(s%variables%Gsto_c, s%inputs%Ts_C)
+            s%variables%Rsto_PEt = rsto_from_gsto(s%variables%Gsto_PEt, s%inputs%Ts_C)
+
+            s%variables%Rsur = rsur_of(s%variables%LAI, s%variables%SAI, s%variables%Rsto_c, &
+                                       s%variables%Rext, s%variables%Rinc, &
+                                       s%parameters%Rsoil, s%variables%Rsur)
+
+            if (s(1)%options%fxwp_method == fxwp_use_fpaw) then
+                s%variables%Es_blocked = (s%variables%ASW < &
+                                          (s%soilwater%ASW_FC * (s%parameters%ASW_max / 100.0)))
+            else
+                s%variables%Es_blocked = (s%variables%SWP < s%parameters%SWP_max)
+            end if
+
+            do k = 1, size(s)
+                call Penman_Monteith(s(k)%inputs%VPD, s(k)%inputs%Ts_C, s(k)%inputs%P, &
+                                     s(k)%inputs%Rn, s(k)%inputs%esat, s(k)%inputs%eact, &
+                                     s(k)%variables%Rb_H2O, s(k)%variables%LAI, &
+                                     s(k)%variables%Rsto_c, s(k)%variables%Rsto_PEt, &
+                                     s(k)%variables%Rinc, s(k)%variables%Es_blocked, &
+                                     s(k)%parameters%Rsoil, s(k)%soilwater%Ei_hr, &
+                                     s(k)%soilwater%PEt_hr, s(k)%soilwater%Et_hr_prev, &
+                                     s(k)%soilwater%Et_hr, s(k)%soilwater%Es_hr, &
+                                     s(k)%soilwater%AEt_hr, s(k)%soilwater%PEt_3, &
+                                     s(k)%soilwater%Et_3, s(k)%soilwater%Ei_dd, &
+                                     s(k)%soilwater%PEt_dd, s(k)%soilwater%Et_dd, &
+                                     s(k)%soilwater%Es_dd, s(k)%soilwater%AEt_dd)
+            end do
+
+            ! This *must* happen after calculating SWP - SWP is calculated as
+            ! the day rolls over, and LWP should use the previous day's SWP
+            select case (s(1)%options%lwp_method)
+            case (lwp_non_steady_state)
+                do k = 1, size(s)
+                    call Leaf_Water_Potential(s(k)%variables%SWP, s(k)%inputs%hr, &
+                                              s(k)%soilwater%Et_hr_prev, s(k)%soilwater%Et_hr, &
+                                              s(k)%parameters%Ksat, s(k)%parameters%SWP_AE, &
+                                              s(k)%parameters%soil_b, s(k)%parameters%root, &
+                                              s(k)%variables%delta_LWP, s(k)%variables%LWP)
+                end do
+            case (lwp_steady_state)
+                s%variables%LWP = steady_state_LWP(s%variables%SWP, s%soilwater%Et_hr, &
+                                                   s%parameters%Ksat, s%parameters%SWP_AE, &
+                                                   s%parameters%soil_b, s%parameters%root)
+            end select
+
+            s%variables%fLWP = fSWP_exp_curve(s%variables%LWP, s%parameters%fmin)
+
+            select case (s(1)%options%ra_method)
+            case (ra_simple)
+                s%variables%Ra_ref_i = calc_ra_simple(s%inputs%ustar_ref_O3, &
+                                                      s%parameters%O3_zo + s%parameters%O3_d, &
+                                                      izR, s%parameters%O3_d)
+                s%variables%Ra_O3zR_i = calc_ra_simple(s%inputs%ustar_ref_O3, s%parameters%O3zR, &
+                                                       izR, s%parameters%O3_d)
+                s%variables%Ra_tar_i = calc_ra_simple(s%inputs%ustar, &
+                                                      s%parameters%zo + s%parameters%d, &
+                                                      izR, s%parameters%d)
+            case (ra_with_heat_flux)
+                s%variables%Ra_ref_i = ra_heat_flux(s%inputs%ustar_ref_O3, &
+                                                    s%parameters%O3_zo + s%parameters%O3_d, &
+                                                    izR, s%inputs%invL)
+                s%variables%Ra_O3zR_i = ra_heat_flux(s%inputs%ustar_ref_O3, s%parameters%O3zR, &
+                                                     izR, s%inputs%invL)
+                s%variables%Ra_tar_i = ra_heat_flux(s%inputs%ustar, &
+                                                    s%parameters%zo + s%parameters%d, &
+                                                    izR, s%inputs%invL)
+            end select
+
+            do k = 1, size(s)
+                call O3_Concentration(s(k)%inputs%O3_ppb_zR, s(k)%inputs%Ts_C, s(k)%inputs%P, &
+                                      s(k)%inputs%ustar_ref_O3, s(k)%variables%Ra, &
+                                      s(k)%variables%Rb, s(k)%variables%Rsur, &
+                                      s(k)%variables%Ra_ref_i, s(k)%variables%Ra_O3zR_i, &
+                                      s(k)%variables%Ra_tar_i, s(k)%variables%Rb_ref, &
+                                      s(k)%variables%Vd_i, s(k)%variables%O3_ppb_i, &
+                                      s(k)%variables%Vd, s(k)%variables%O3_ppb, &
+                                      s(k)%variables%O3_nmol_m3)
+            end do
+
+            s%variables%Ftot = s%variables%O3_nmol_m3 * s%variables%Vd
+
+            do k = 1, size(s)
+                call Stomatal_Flux(s(k)%variables%Gsto_l, s(k)%variables%Rsto_l, &
+                                   s(k)%variables%Rsun_l, s(k)%variables%O3_nmol_m3, &
+                                   s(k)%inputs%uh, s(k)%parameters%Lm, s(k)%parameters%Rext, &
+                                   s(k)%variables%Fst, s(k)%variables%Fst_sun)
+                call Accumulate_AFstY(s(k)%variables%Fst, s(k)%variables%Fst_sun, &
+                                      s(k)%parameters%Y, s(k)%variables%AFst0, &
+                                      s(k)%variables%AFstY, s(k)%variables%AFstY_total)
+                call Accumulate_AOT40(s(k)%inputs%R, s(k)%variables%O3_ppb, &
+                                      s(k)%variables%fphen, s(k)%variables%leaf_fphen, &
+                                      s(k)%variables%OT0, s(k)%variables%OT40, &
+                                      s(k)%variables%AOT0, s(k)%variables%AOT40)
+            end do
+        end subroutine Hourly_Sites
+
+        !
+        ! As Calc_ST_from_PAR (in Environmental), for each site
+        !
+        subroutine ST_From_PAR_Sites(s)
+            use Environmental, only: ST_From_PAR
+
+            type(Model_State), dimension(:), intent(inout) :: s
+
+            integer :: k
+
+            do k = 1, size(s)
+                call ST_From_PAR(s(k)%inputs%P, s(k)%inputs%sinB, s(k)%inputs%PAR, &
+                                 s(k)%variables%LAI, s(k)%variables%pPARdir, &
+                                 s(k)%variables%pPARdif, s(k)%variables%fPARdir, &
+                                 s(k)%variables%fPARdif, s(k)%variables%ST)
+            end do
+        end subroutine ST_From_PAR_Sites
+
+        !
+        ! As Calc_Gsto_Pn (in Pn_Gsto), for each site
+        !
+        subroutine Gsto_Pn_Sites(s)
+            use Pn_Gsto, only: Gsto_Pn
+
+            type(Model_State), dimension(:), intent(inout) :: s
+
+            integer :: k
+
+            do k = 1, size(s)
+                call Gsto_Pn(s(k)%inputs%CO2, s(k)%inputs%PAR, s(k)%inputs%uh, &
+                             s(k)%inputs%RH, s(k)%inputs%Ts_C, s(k)%inputs%Tleaf, &
+                             s(k)%parameters%fmin, s(k)%parameters%gmorph, &
+                             s(k)%parameters%Lm, s(k)%parameters%g_sto_0, &
+                             s(k)%parameters%m, s(k)%parameters%V_cmax_25, &
+                             s(k)%parameters%J_max_25, s(k)%pn_gsto%alpha, &
+                             s(k)%pn_gsto%Teta, s(k)%pn_gsto%H_a_jmax, &
+                             s(k)%pn_gsto%H_d_jmax, s(k)%pn_gsto%H_a_vcmax, &
+                             s(k)%pn_gsto%H_d_vcmax, s(k)%pn_gsto%S_V_vcmax, &
+                             s(k)%pn_gsto%S_V_jmax, s(k)%variables%LAI, &
+                             s(k)%variables%fphen, s(k)%variables%fO3, &
+                             s(k)%variables%fXWP, s(k)%variables%leaf_fphen, &
+                             s(k)%pn_gsto%gsto_final, s(k)%pn_gsto%pngsto_l, &
+                             s(k)%pn_gsto%pngsto, s(k)%pn_gsto%pngsto_c, &
+                             s(k)%pn_gsto%pngsto_PEt, s(k)%pn_gsto%pngsto_An)
+            end do
+        end subroutine Gsto_Pn_Sites
+
+        !
+        ! The daily steps of the model, for each site
+        !
+        subroutine Daily_Sites(s)
+            use Options, only: sai_equals_lai, sai_forest, sai_wheat, &
+                               leaf_fphen_equals_fphen, leaf_fphen_fixed_day, &
+                               leaf_fphen_use_input, leaf_fphen_thermal_time, &
+                               fswp_input, fswp_exponential, fswp_linear, &
+                               asw_input
+            use Phenology, only: LAI_Polygon, sai_wheat_curve, Fphen_Polygon, &
+                                 Fixed_Day_Leaf_Fphen => Leaf_Fphen_Fixed_Day, &
+                                 Thermal_Time_Leaf_Fphen => Leaf_Fphen_Thermal_Time
+            use SoilWater, only: Soil_Water, fSWP_exp_curve, fSWP_linear_curve, &
+                                 Soil_Water_Meas, fPAW_curve
+
+            type(Model_State), dimension(:), intent(inout) :: s
+
+            integer :: k
+
+            do k = 1, size(s)
+                call LAI_Polygon(s(k)%inputs%dd, s(k)%parameters%SGS, s(k)%parameters%EGS, &
+                                 s(k)%parameters%LAI_a, s(k)%parameters%LAI_b, &
+                                 s(k)%parameters%LAI_c, s(k)%parameters%LAI_d, &
+                                 s(k)%parameters%LAI_1, s(k)%parameters%LAI_2, &
+                                 s(k)%variables%LAI)
+            end do
+
+            select case (s(1)%options%sai_method)
+            case (sai_equals_lai)
+                s%variables%SAI = s%variables%LAI
+            case (sai_forest)
+                s%variables%SAI = s%variables%LAI + 1
+            case (sai_wheat)
+                s%variables%SAI = sai_wheat_curve(s%inputs%dd, s%parameters%SGS, &
+                                                  s%parameters%EGS, s%parameters%LAI_1, &
+                                                  s%variables%LAI)
+            end select
+
+            do k = 1, size(s)
+                call Fphen_Polygon(s(k)%inputs%dd, s(k)%parameters%SGS, s(k)%parameters%EGS, &
+                                   s(k)%parameters%fphen_limA, s(k)%parameters%fphen_limB, &
+                                   s(k)%parameters%fphen_1, s(k)%parameters%fphen_2, &
+                                   s(k)%parameters%fphen_3, s(k)%parameters%fphen_4, &
+                                   s(k)%parameters%fphen_a, s(k)%parameters%fphen_b, &
+                                   s(k)%parameters%fphen_c, s(k)%parameters%fphen_d, &
+                                   s(k)%parameters%fphen_e, s(k)%variables%fphen)
+            end do
+
+            select case (s(1)%options%leaf_fphen_method)
+            case (leaf_fphen_equals_fphen)
+                s%variables%leaf_fphen = s%variables%fphen
+            case (leaf_fphen_fixed_day)
+                do k = 1, size(s)
+                    call Fixed_Day_Leaf_Fphen(s(k)%inputs%dd, s(k)%parameters%leaf_fphen_a, &
+                                              s(k)%parameters%leaf_fphen_b, &
+                                              s(k)%parameters%leaf_fphen_c, &
+                                              s(k)%parameters%leaf_fphen_1, &
+                                              s(k)%parameters%leaf_fphen_2, &
+                                              s(k)%parameters%Astart, s(k)%parameters%Aend, &
+                                              s(k)%variables%leaf_fphen)
+                end do
+            case (leaf_fphen_use_input)
+                s%variables%leaf_fphen = s%inputs%leaf_fphen_input
+            case (leaf_fphen_thermal_time)
+                do k = 1, size(s)
+                    call Thermal_Time_Leaf_Fphen(s(k)%inputs%dd, s(k)%parameters%leaf_fphen_a, &
+                                                 s(k)%parameters%leaf_fphen_b, &
+                                                 s(k)%parameters%leaf_fphen_c, &
+                                                 s(k)%parameters%leaf_fphen_1, &
+                                                 s(k)%parameters%leaf_fphen_2, &
+                                                 s(k)%parameters%Astart, s(k)%parameters%Aend, &
+                                                 s(k)%variables%leaf_fphen)
+                end do
+            end select
+
+            s%inputs%precip_acc = s%inputs%precip_dd
+            s%inputs%precip_dd = 0
+
+            s%variables%Ei = s%soilwater%Ei_dd
+            s%soilwater%Ei_dd = 0
+            s%variables%PEt = s%soilwater%PEt_dd
+            s%soilwater%PEt_dd = 0
+            s%variables%Et = s%soilwater%Et_dd
+            s%soilwater%Et_dd = 0
+            s%variables%Es = s%soilwater%Es_dd
+            s%soilwater%Es_dd = 0
+            s%variables%AEt = s%soilwater%AEt_dd
+            s%soilwater%AEt_dd = 0
+
+            do k = 1, size(s)
+                call Soil_Water(s(k)%inputs%precip_acc, s(k)%variables%LAI, s(k)%variables%Ei, &
+                                s(k)%variables%AEt, s(k)%parameters%root, s(k)%parameters%Fc_m, &
+                                s(k)%soilwater%PWP_vol, s(k)%parameters%SWP_AE, &
+                                s(k)%parameters%soil_b, s(k)%variables%Sn, &
+                                s(k)%variables%P_input, s(k)%variables%Sn_diff, &
+                                s(k)%variables%per_vol, s(k)%variables%ASW, &
+                                s(k)%variables%SWP, s(k)%variables%SMD)
+            end do
+
+            select case (s(1)%options%fswp_method)
+            case (fswp_input)
+                s%variables%fSWP = s%inputs%fSWP
+            case (fswp_exponential)
+                s%variables%fSWP = fSWP_exp_curve(s%variables%SWP, s%parameters%fmin)
+            case (fswp_linear)
+                s%variables%fSWP = fSWP_linear_curve(s%variables%SWP, s%parameters%fmin, &
+                                                     s%parameters%SWP_min, s%parameters%SWP_max)
+            end select
+
+            do k = 1, size(s)
+                call Soil_Water_Meas(s(k)%variables%P_input, s(k)%variables%AEt, &
+                                     s(k)%soilwater%r_meas, s(k)%soilwater%PWP_vol, &
+                                     s(k)%parameters%D_meas, s(k)%parameters%Fc_m, &
+                                     s(k)%parameters%SWP_AE, s(k)%parameters%soil_b, &
+                                     s(k)%variables%Sn_meas, s(k)%variables%Sn_diff_meas, &
+                                     s(k)%variables%SWP_meas, s(k)%variables%SMD_meas)
+            end do
+
+            if (s(1)%options%asw_method == asw_input) then
+                s%variables%ASW = s%inputs%ASW
+                s%soilwater%ASW_FC = s%parameters%ASW_FC_override
+            end if
+
+            s%variables%fPAW = fPAW_curve(s%variables%ASW, s%soilwater%ASW_FC, &
+                                          s%parameters%fmin, s%parameters%ASW_min, &
+                                          s%parameters%ASW_max)
+        end subroutine Daily_Sites
+
+    end subroutine Run_Slots
+
+    !
+    ! Get the size in bytes of a model state blob
+    !
+    function State_Size() result(n)
+        integer :: n
+
+        integer(kind=1), dimension(1) :: mold
+
+        call Init_Snapshot()
+        n = size(transfer(sites(0), mold))
+    end function State_Size
+
+    !
+    ! Save the current model state to blob, of State_Size() bytes
+    !
+    subroutine Save_State(blob, n)
+        integer, intent(in) :: n
+        integer(kind=1), dimension(n), intent(out) :: blob
+
+        call Init_Snapshot()
+        call Store_Site(0)
+        blob = transfer(sites(0), blob)
+    end subroutine Save_State
+
+    !
+    ! Load a model state saved by Save_State into the model
+    !
+    subroutine Load_State(blob, n)
+        integer, intent(in) :: n
+        integer(kind=1), dimension(n), intent(in) :: blob
+
+        call Init_Snapshot()
+        sites(0) = transfer(blob, sites(0))
+        call Load_Site(0)
+    end subroutine Load_State
+
+    !
+    ! Make sure there is a slot for snapshots, even if no sites are stored
+    !
+    subroutine Init_Snapshot()
+        if (.not. allocated(sites)) then
+            call Init_Sites(0)
+        end if
+    end subroutine Init_Snapshot
+
+end module State
@@ -14,6 +14,7 @@ module Switchboard
     public :: SB_Calc_R_PAR
     public :: SB_Calc_SGS_EGS
     public :: SB_Calc_ustar
+    public :: next_Tleaf
 
 
 contains
@@ -109,21 +110,15 @@ contains
     subroutine SB_Calc_gsto()
         use Inputs, only: R_ => R, eact, P, Tleaf, Ts_C, uh
         use R, only: Calc_Gsto_Multiplicative
-        use Pn_Gsto, only: Calc_Gsto_Pn, leaf_temp_de_Boeck, gsto_final, pngsto_l, &
+        use Pn_Gsto, only: Calc_Gsto_Pn, gsto_final, pngsto_l, &
                 pngsto, pngsto_c, pngsto_PEt
         use Variables, only: Gsto_l, Gsto, Gsto_c, Gsto_PEt
         use Parameters, only: Lm, albedo
         use Options, only: gsto_method, tleaf_method, tleaf_use_input, tleaf_estimate, &
             gsto_photosynthetic, gsto_multiplicative
 
-        real :: Tleaf_balance_threshold, Tleaf_adjustment_factor
-        integer :: Tleaf_max_iterations
         integer :: i
 
-        Tleaf_balance_threshold = 0.0010000000474974513
-        Tleaf_adjustment_factor = 0.019999999552965164
-        Tleaf_max_iterations = 50
-
         ! Calculate both, because currently they don't overlap
         call Calc_Gsto_Multiplicative()
         call Calc_Gsto_Pn()
@@ -145,12 +140,8 @@ contains
                     call Calc_Gsto_Pn()
                     ! Copy Calc_Gsto_Pn() results to correct places
                     do i= 1, 5
-                        Tleaf = leaf_temp_de_Boeck(R_, eact*1e3, Ts_C, Tleaf, P*1e3, &
-                                 uh, gsto_final*1e-6, .true., Lm, albedo, 1.0, &
-                                 Tleaf_balance_threshold, &
-                                 Tleaf_adjustment_factor, &
-                                 Tleaf_max_iterations)
-                        Tleaf = Ts_C + 0.2 * (Tleaf - Ts_C)
+                        Tleaf = next_Tleaf(R_, eact, Ts_C, Tleaf, P, uh, gsto_final, &
+                                           Lm, albedo)
                         call Calc_Gsto_Pn()
                     end do
             end select
@@ -170,12 +161,8 @@ contains
                     call Calc_Gsto_Pn()
                     ! Copy Calc_Gsto_Pn() results to correct places
                     do i= 1, 5
-                        Tleaf = leaf_temp_de_Boeck(R_, eact*1e3, Ts_C, Tleaf, P*1e3, &
-                                 uh, gsto_final*1e-6, .true., Lm, albedo, 1.0, &
-                                 Tleaf_balance_threshold, &
-                                 Tleaf_adjustment_factor, &
-                                 Tleaf_max_iterations)
-                        Tleaf = Ts_C + 0.2 * (Tleaf - Ts_C)
+                        Tleaf = next_Tleaf(R_, eact, Ts_C, Tleaf, P, uh, gsto_final, &
+                                           Lm, albedo)
                         call Calc_Gsto_Pn()
                     end do
                     Gsto_l = pngsto_l
@@ -186,6 +173,27 @@ contains
         end select
     end subroutine SB_Calc_Gsto
 
+    ! Move the leaf temperature part of the way towards the temperature at
+    ! which the leaf's energy balance is met, given the stomatal conductance
+    ! (gsto_final) calculated with the previous leaf temperature
+    elemental function next_Tleaf(R, eact, Ts_C, Tleaf, P, uh, gsto_final, Lm, albedo) result(T)
+        use Pn_Gsto, only: leaf_temp_de_Boeck
+
+        real, intent(in) :: R, eact, Ts_C, Tleaf, P, uh, gsto_final, Lm, albedo
+        real :: T
+
+        real, parameter :: Tleaf_balance_threshold = 0.0010000000474974513
+        real, parameter :: Tleaf_adjustment_factor = 0.019999999552965164
+        integer, parameter :: Tleaf_max_iterations = 50
+
+        T = leaf_temp_de_Boeck(R, eact*1e3, Ts_C, Tleaf, P*1e3, &
+                               uh, gsto_final*1e-6, .true., Lm, albedo, 1.0, &
+                               Tleaf_balance_threshold, &
+                               Tleaf_adjustment_factor, &
+                               Tleaf_max_iterations)
+        T = Ts_C + 0.2 * (T - Ts_C)
+    end function next_Tleaf
+
     subroutine SB_Calc_fO3()
         use O3, only: Calc_fO3_Wheat, Calc_fO3_Potato
         use Variables, only: fO3
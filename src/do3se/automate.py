@@ -1,4 +1,8 @@
-from do3se.dataset import Dataset, data_from_csv
+import importlib.util
+import os
+
+from do3se.dataset import Dataset, Resultset, matrix_from_csv, matrix_from_npy
+from do3se.dataset import resolve_options, option_params
 from do3se.project import Project
 from do3se import model
 import logging
@@ -54,9 +58,38 @@ def format_option_callback(option, opt_str, value, parser, app=None):
                              f + ' (see --list-outputs)')
 
 
+#: Writers for output files which are saved whole rather than as CSV,
+#: by file extension
+columnar_writers = {
+    '.parquet': Resultset.save_parquet,
+    '.nc': Resultset.save_netcdf,
+}
+
+
+#: Optional modules needed by each of the :data:`columnar_writers`
+columnar_modules = {
+    '.parquet': ['pyarrow'],
+    '.nc': ['xarray', 'netCDF4'],
+}
+
+
 def outfile_callback(option, opt_str, value, parser):
-    """Open a different output file."""
-    parser.values.outfile = open(value, 'w')
+    """Open a different output file.
+
+    Columnar output files (see :data:`columnar_writers`) are only written once
+    the run is complete, so just their path is kept, after checking that the
+    modules needed to write them are installed.
+    """
+    extension = os.path.splitext(value)[1]
+    if extension in columnar_writers:
+        missing = [m for m in columnar_modules[extension]
+                   if importlib.util.find_spec(m) is None]
+        if missing:
+            parser.error('Writing %s files requires %s (see requirements/gridruns.txt)'
+                         % (extension, ', '.join(missing)))
+        parser.values.outfile = value
+    else:
+        parser.values.outfile = open(value, 'w')
 
 
 def run(options, projectfile, inputfile, outputfile, parser, headings):
@@ -67,15 +100,78 @@ def run(options, projectfile, inputfile, outputfile, parser, headings):
     # Extract parameters which control loading of data
     input_fields = project.data.pop('input_fields', [])
     input_trim = project.data.pop('input_trim', 0)
-    input_data = data_from_csv(open(inputfile, 'r'), input_fields, input_trim)
-    dataset = Dataset(input_data, input_fields, project.data, headings)
-    # Run
-    results = dataset.run()
-    results.save(
-        outputfile,
-        options.format,
-        options.show_headers,
-        (project.data['sgs'], project.data['egs']) if options.reduce_output else None)
+    if inputfile.endswith('.npy'):
+        # Binary input carries its own headings
+        input_data, input_fields = matrix_from_npy(inputfile)
+        input_headings = input_fields
+    else:
+        input_data, input_headings = matrix_from_csv(open(inputfile, 'r'), input_fields, input_trim)
+    dataset = Dataset(input_data, input_fields, project.data, headings or input_headings)
+    period = (project.data['sgs'], project.data['egs']) if options.reduce_output else None
+    if isinstance(outputfile, str):
+        fields = list(options.format)
+        results = dataset.run(fields=fields, period=period)
+        columnar_writers[os.path.splitext(outputfile)[1]](
+            results, outputfile, fields, options.show_headers)
+    else:
+        # Run, writing the results out as they are calculated
+        dataset.run_to_file(outputfile, options.format, options.show_headers, period)
+
+
+class ModelSession:
+    """Run the model repeatedly with the same project.
+
+    The project file *projectfile* is loaded, and the model options resolved
+    from it, only once.  Each :meth:`run` then only has to apply its own
+    parameter overrides, unless they change the model options.
+
+    *input_fields* and *headings* are passed on to :class:`Dataset`;
+    *input_fields* defaults to the project's own.
+    """
+
+    def __init__(self, projectfile, input_fields=None, headings=None):
+        project = Project(projectfile)
+        self.params = dict(project.data)
+        self.input_fields = input_fields if input_fields is not None \
+            else self.params.get('input_fields', [])
+        self.headings = headings
+        # Resolved (parameters, options) for the project without overrides
+        self._resolved = None
+
+    def resolve(self, overrides={}):
+        """Get the resolved parameters and model options for a run.
+
+        Returns a new parameter dict and the options, as :class:`Dataset`
+        would resolve them from the project parameters updated with
+        *overrides*.  They are only resolved again if *overrides* contains
+        any of :data:`do3se.dataset.option_params`.
+        """
+        if option_params.intersection(overrides):
+            params = {**self.params, **overrides}
+            return params, resolve_options(params, self.input_fields)
+
+        if self._resolved is None:
+            params = dict(self.params)
+            self._resolved = (params, resolve_options(params, self.input_fields))
+        params, options = self._resolved
+        return {**params, **overrides}, dict(options)
+
+    def run(self, input_data, overrides={}, **run_kwargs):
+        """Run the model with *input_data* and project parameter *overrides*.
+
+        Any extra keyword arguments are passed on to :meth:`Dataset.run`.
+        Returns the :class:`Resultset` and the :class:`Dataset` it came from.
+        """
+        dataset = self.dataset(input_data, overrides)
+        return dataset.run(**run_kwargs), dataset
+
+    def dataset(self, input_data, overrides={}):
+        """Get the :class:`Dataset` for *input_data* and project parameter
+        *overrides*, without running it, e.g. for
+        :func:`do3se.dataset.run_sites`.
+        """
+        params, options = self.resolve(overrides)
+        return Dataset(input_data, self.input_fields, params, self.headings, options)
 
 
 def run_from_pipe(options, projectfile, input_fields=[], output_file=None, headings=None):
@@ -83,21 +179,24 @@ def run_from_pipe(options, projectfile, input_fields=[], output_file=None, headi
 
     input_data must be iterable of dicts
 
+    Any extra keyword arguments given to the runner are passed on to
+    :meth:`Dataset.run`.  The project is only loaded once, however many times
+    the runner is called (see :class:`ModelSession`).
+
     Example
     -------
     runner = run_from_pipe(options, projectfile, output_file, parser)
     output = runner(input_data)
     """
-    def _inner(input_data, project_overrides={}):
-        project = Project(projectfile)
-        project.data = {**project.data, **project_overrides}
-        dataset = Dataset(input_data, input_fields, project.data, headings)
-        results = dataset.run()
+    session = ModelSession(projectfile, input_fields, headings)
+
+    def _inner(input_data, project_overrides={}, **run_kwargs):
+        results, dataset = session.run(input_data, project_overrides, **run_kwargs)
         if output_file:
             results.save(
                 output_file,
                 options.format,
                 options.show_headers,
-                (project.data['sgs'], project.data['egs']) if options.reduce_output else None)
+                (dataset.params['sgs'], dataset.params['egs']) if options.reduce_output else None)
         return results, dataset
     return _inner
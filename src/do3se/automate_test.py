@@ -0,0 +1,44 @@
+import copy
+import os
+
+import numpy as np
+
+from do3se import model
+from do3se.automate import ModelSession
+from do3se.dataset import Dataset, data_from_csv
+from do3se.project import Project
+
+TESTS_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'tests')
+PROJECT = os.path.join(TESTS_DIR, 'Norunda 1999 (DO3SE 3.0)', 'Norunda1999.do3se')
+INPUT = os.path.join(TESTS_DIR, 'Norunda 1999 (DO3SE 3.0)', 'Norunda1999input.csv')
+
+
+def load_input(fields, trim):
+    with open(INPUT) as infile:
+        return data_from_csv(infile, fields, trim)[:500]
+
+
+def test_model_session_matches_dataset():
+    """ModelSession gives the same results as a Dataset of the full project"""
+    params = copy.deepcopy(dict(Project(PROJECT).data))
+    fields = params.pop('input_fields')
+    data = load_input(fields, params.pop('input_trim'))
+    session = ModelSession(PROJECT)
+    for overrides in ({}, {'lat': 40.0}, {'soil_tex': 'sand_loam', 'h': 10.0}):
+        # Some model state survives between runs, so make sure both runs
+        # start from the same state
+        session.run(data, overrides, batch=True)
+        expected = Dataset(data, fields, {**copy.deepcopy(params), **overrides}).run(batch=True)
+        results, dataset = session.run(data, overrides, batch=True)
+        assert dataset.params['lat'] == overrides.get('lat', params['lat'])
+        for f in expected.columns:
+            np.testing.assert_array_equal(results.columns[f], expected.columns[f], f)
+
+
+def test_soil_overrides_not_shared():
+    """Overriding soil parameters doesn't change the soil class defaults"""
+    defaults = copy.deepcopy(model.soil_classes[model.default_soil_class]['data'])
+    session = ModelSession(PROJECT)
+    params, _ = session.resolve({'soil_b': 1.0})
+    assert params['soil_b'] == 1.0
+    assert model.soil_classes[model.default_soil_class]['data'] == defaults
@@ -2,8 +2,11 @@ import click
 import pandas as pd
 import json
 from pathlib import Path
+from typing import Tuple
 from do3se.gridrun import gridrun
 from do3se.automate import list_outputs, format_option_callback, outfile_callback
+from do3se.automate import run as run_automate
+from do3se.dataset import csv_to_npy
 from do3se.project import Project
 from do3se import model
 from do3se import application
@@ -49,7 +52,8 @@ def get_option_parser():
                       callback=outfile_callback,
                       type='string',
                       nargs=1,
-                      help='Write results to OUTFILE [default: use stdout]')
+                      help='Write results to OUTFILE, as Parquet or NetCDF if it ends '
+                           'with .parquet or .nc [default: use stdout]')
     parser.add_option('-r', '--reduce',
                       action='store_const',
                       dest='reduce_output',
@@ -83,12 +87,20 @@ def main(args):
     application.logging_setup(level=options.loglevel)
     projectfile, inputfile = args
     outputfile = options.outfile
-    run(options, projectfile, inputfile, outputfile, parser)
+    run_automate(options, projectfile, inputfile, outputfile, parser, None)
 
 
 @click.option('-x', '--save_ds', default=False, help="If true saves a xr.dataset instead of csv's ")
 @click.option('-v', '--debug', default=False, help="If true logs everything to the stdout")
-@click.option('-b', '--target-batch-size', default=None, help="The target batch size for running sets of coordinates")
+@click.option('-b', '--target-batch-size', default=None, type=int, help="The target batch size for running sets of coordinates")
+@click.option('-w', '--workers', default=None, type=int, help="Number of processes to run coordinate batches in")
+@click.option('-c', '--config', 'extra_project_files', multiple=True, type=click.Path(), help="Additional project file to run each cell for. Can be given multiple times")
+@click.option('-m', '--mask-field', default=None, help="Variable in the e_state_overrides file (or --mask-path) marking the cells to run, e.g. a land mask")
+@click.option('--mask-path', default=None, type=click.Path(), help="NetCDF file containing the mask field")
+@click.option('-n', '--cells-per-run', default=1, type=int, help="Number of cells to run together in each call to the model. All of their outputs are held in memory at once")
+@click.option('--spinup', default=0, type=int, help="Number of hours at the start of the input data to spin up the model over")
+@click.option('--spinup-cache', 'spinup_cache_dir', default=None, type=click.Path(), help="Directory to cache the model state at the end of the spin-up in")
+@click.option('--resume', is_flag=True, default=False, help="Only run the cells not completed in a previous run with the same run id")
 @click.argument(
     'coords_list',
     required=True,
@@ -135,6 +147,14 @@ def run(run_id: str,
         target_batch_size: int = None,
         save_ds: bool = False,
         debug: bool = False,
+        workers: int = None,
+        resume: bool = False,
+        extra_project_files: Tuple[Path] = (),
+        mask_field: str = None,
+        mask_path: Path = None,
+        cells_per_run: int = 1,
+        spinup: int = 0,
+        spinup_cache_dir: Path = None,
         ):
     """Run the legacy DO3SE model on gridded data.
 
@@ -162,10 +182,34 @@ def run(run_id: str,
         _description_
     debug : bool
         _description_
+    workers : int
+        Number of processes to run coordinate batches in. If None, batches run one at a time.
+    resume : bool
+        If true, reload the run manifest in output_location and only run unfinished cells.
+    extra_project_files : Tuple[Path]
+        Additional project files (e.g. for other cultivars) to run every cell for
+        using the same input data. Outputs are then keyed by config id, the
+        project file name without its extension.
+    mask_field : str
+        Variable in the e_state_overrides file, or mask_path, marking the cells to run.
+        Cells where it is zero or missing are skipped.
+    mask_path : Path
+        NetCDF file containing mask_field, if not in the e_state_overrides file.
+    cells_per_run : int
+        Number of cells to run together in each call to the model, see
+        :func:`do3se.dataset.run_sites`. The cells must have the same model
+        options. All of their outputs are held in memory at once.
+    spinup : int
+        Number of hours at the start of the input data to only spin up the
+        model over, e.g. a year before the period of interest.
+    spinup_cache_dir : Path
+        Directory to cache the state at the end of the spin-up in, to reuse it
+        in later runs with the same config and spin-up inputs.
     """
     print("Running Legacy DO3SE from CLI. Input args:")
     print("run_id", run_id)
     print("project_file", project_file)
+    print("extra_project_files", extra_project_files)
     print("input_data_dir", input_data_dir)
     print("output_location", output_location)
     print("zero_year", zero_year)
@@ -174,11 +218,18 @@ def run(run_id: str,
     print("target_batch_size", target_batch_size)
     print("save_ds", save_ds)
     print("debug", debug)
+    print("workers", workers)
+    print("resume", resume)
+    print("mask_field", mask_field)
+    print("mask_path", mask_path)
+    print("cells_per_run", cells_per_run)
+    print("spinup", spinup)
+    print("spinup_cache_dir", spinup_cache_dir)
     # TODO: Calculate batches
     coords = pd.read_csv(coords_list).values
     gridrun(
         run_id,
-        project_file,
+        [project_file, *extra_project_files] if extra_project_files else project_file,
         input_data_dir,
         output_location,
         zero_year,
@@ -187,6 +238,13 @@ def run(run_id: str,
         save_ds=save_ds,
         debug=debug,
         target_batch_size=target_batch_size,
+        workers=workers,
+        resume=resume,
+        mask_field=mask_field,
+        mask_path=mask_path,
+        cells_per_run=cells_per_run,
+        spinup=spinup,
+        spinup_cache_dir=spinup_cache_dir,
     )
 
 
@@ -213,5 +271,38 @@ def convert_ui_file_to_json(
         json.dump(dict(project.data), outfile)
 
 
+@click.argument(
+    'output_file',
+    required=True,
+    type=click.Path(),
+)
+@click.argument(
+    'input_file',
+    required=True,
+    type=click.Path(exists=True),
+)
+@click.argument(
+    'project_file',
+    required=True,
+    type=click.Path(exists=True),
+)
+@cli.command()
+def convert_input_to_npy(
+    project_file: Path,
+    input_file: Path,
+    output_file: Path,
+):
+    """Convert a CSV input file to the binary (.npy) input format.
+
+    The project file supplies the input fields and number of header rows to
+    trim.  Binary input files are memory-mapped when run, avoiding the cost
+    of parsing CSV on every run.
+    """
+    project = Project(project_file)
+    with open(input_file, 'r') as infile:
+        csv_to_npy(infile, output_file,
+                   project.data['input_fields'], project.data['input_trim'])
+
+
 if __name__ == "__main__":
     cli()
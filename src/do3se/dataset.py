@@ -1,8 +1,16 @@
 from do3se import model
 from do3se import util
 from typing import List
+from collections.abc import Mapping, Sequence
 import csv
+import hashlib
+import io
+import itertools
+import json
+import os
 import logging
+import warnings
+import numpy as np
 _log = logging.getLogger('do3se.dataset')
 # from itertools import ifilter
 
@@ -31,7 +39,9 @@ class Dataset:
 
     *parameters* is a dictionary-like object of parameter values, and will be
     modified by the constructor as "virtual" parameters are replaced with real
-    parameters and control parameters are removed.
+    parameters and control parameters are removed.  If the model *options*
+    have already been resolved from the parameters (see
+    :func:`resolve_options`), they can be supplied to skip this step.
 
 
     # Input data
@@ -40,9 +50,9 @@ class Dataset:
 
     """
 
-    def __init__(self, input_data, input_fields, params, headings: List[str]=None):
+    def __init__(self, input_data, input_fields, params, headings: List[str]=None,
+                 options=None):
         self.params = params
-        self.options = dict()
         self.headings = headings or list(input_data[0].keys())
         self.input_data_is_matrix = headings is not None and type(
             input_data) is not dict
@@ -51,141 +61,37 @@ class Dataset:
         dd_key = "dd" if not self.input_data_is_matrix else self.headings.index('dd')
         ts_c_key = "ts_c" if not self.input_data_is_matrix else self.headings.index('ts_c')
         mean_temps, td_data = calc_thermal_time(self.input, dd_key, ts_c_key)
-        self.input = [[*row, td] if self.input_data_is_matrix else {
-            **row, "td": td} for row, td in zip(self.input, td_data)]
-        headings = [*self.headings, 'td']
-
-        # Check required fields are present
-        required = [k for k, v in model.input_fields.items() if v['required']]
-        for f in required:
-            if not f in input_fields:
-                raise RequiredFieldError([f])
-
-        # Handle PAR/Global radiation input/derivation
-        if 'par' in input_fields and 'r' in input_fields:
-            self.options['r_par_method'] = model.options.r_par_use_inputs
-            _log.debug('R/PAR calculation: use inputs')
-        elif 'par' in input_fields:
-            self.options['r_par_method'] = model.options.r_par_derive_r
-            _log.debug('R/PAR calculation: derive R')
-        elif 'ppfd' in input_fields:
-            self.options['r_par_method'] = model.options.r_par_derive_r
-            _log.debug('R/PAR calculation: derive R')
-        elif 'r' in input_fields:
-            self.options['r_par_method'] = model.options.r_par_derive_par
-            _log.debug('R/PAR calculation: derive PAR')
-        elif 'cloudfrac' in input_fields:
-            self.options['r_par_method'] = model.options.r_par_derive_cloudfrac
-            _log.debug('R/PAR calculation: derive PAR from cloudfrac')
+        if isinstance(self.input, np.ndarray):
+            # Array input (which may be memory-mapped) is used as it is, with
+            # the thermal time kept alongside it
+            self.td = td_data
         else:
-            raise RequiredFieldError(['par', 'r'])
+            self.td = None
+            self.input = [[*row, td] if self.input_data_is_matrix else {
+                **row, "td": td} for row, td in zip(self.input, td_data.tolist())]
 
-        # Calculate net radiation if not supplied
-        if 'rn' in input_fields:
-            self.options['rn_method'] = model.options.rn_use_input
-            _log.debug('Rn calculation: use input')
-        else:
-            self.options['rn_method'] = model.options.rn_calculate
-            _log.debug('Rn calculation: calculate')
-
-        # Other switchable procedures
-        fO3 = model.fO3_calcs[self.params.pop('fo3', model.default_fO3_calc)]
-        _log.debug('fO3 calculation: "%(name)s" (%(id)s)' % fO3)
-        self.options['fo3_method'] = fO3['func']
-
-        ustar = model.ustar_calcs[self.params.pop(
-            'ustar_method', model.default_ustar_calc)]
-        _log.debug('ustar calculation: "%(name)s" (%(id)s)' % ustar)
-        self.options['ustar_method'] = ustar['func']
-
-        SAI = model.SAI_calcs[self.params.pop('sai', model.default_SAI_calc)]
-        _log.debug('SAI calculation: "%(name)s" (%(id)s)' % SAI)
-        self.options['sai_method'] = SAI['func']
-        leaf_fphen = model.leaf_fphen_calcs[
-            self.params.pop('leaf_fphen', model.default_leaf_fphen_calc)]
-        _log.debug('leaf_fphen calculation: "%(name)s" (%(id)s)' % leaf_fphen)
-        self.options['leaf_fphen_method'] = leaf_fphen['func']
-        ra_method = model.ra_method[self.params.pop(
-            'ra_method', model.default_ra_method)]
-        self.options['ra_method'] = ra_method['func']
-        fXWP = model.fXWP_calcs[self.params.pop(
-            'fxwp', model.default_fXWP_calc)]
-        self.options['fxwp_method'] = fXWP['func']
-        fSWP = model.fSWP_calcs[self.params.pop(
-            'fswp', model.default_fSWP_calc)]
-        self.options['fswp_method'] = fSWP['func']
-        ASW = model.ASW_calcs[self.params.pop(
-            'asw', model.default_ASW_calc)]
-        self.options['asw_method'] = ASW['func']
-        LWP = model.LWP_calcs[self.params.pop('lwp', model.default_LWP_calc)]
-        self.options['lwp_method'] = LWP['func']
-        SGS_EGS = model.SGS_EGS_calcs[self.params.pop(
-            'sgs_egs_calc', model.default_SGS_EGS_calc)]
-        self.options['sgs_egs_method'] = SGS_EGS['func']
-        gsto = model.gsto_calcs[self.params.pop(
-            'gsto', model.default_gsto_calc)]
-        self.options['gsto_method'] = gsto['func']
-        tleaf = model.tleaf_calcs[self.params.pop(
-            'tleaf', model.default_tleaf_calc)]
-        self.options['tleaf_method'] = tleaf['func']
-
-        # Soil parameters from soil type
-        soil = model.soil_classes[self.params.pop(
-            'soil_tex', model.default_soil_class)]
-        # Allowing overriding of soil parameters
-        soil['data']['soil_b'] = self.params.pop(
-            'soil_b', soil['data']['soil_b']
-        )
-        soil['data']['fc_m'] = self.params.pop(
-            'fc_m', soil['data']['fc_m']
-        )
-        soil['data']['swp_ae'] = self.params.pop(
-            'swp_ae', soil['data']['swp_ae']
-        )
-        soil['data']['ksat'] = self.params.pop(
-            'ksat', soil['data']['ksat']
-        )
-        self.params.update(soil['data'])
-
-
-        # Use/copy measurement vegetation heights
-        u_h = self.params.pop('u_h')
-        self.params['u_h'] = self.params['h'] if u_h['disabled'] else u_h['value']
-        o3_h = self.params.pop('o3_h')
-        self.params['o3_h'] = self.params['h'] if o3_h['disabled'] else o3_h['value']
-
-        if SGS_EGS['func'] == 3:
-            sgs_set = False
-            egs_set = False
-            astart_set = False
-            fphen_1_set = False
-            leaf_f_phen_1_set = False
-            leaf_f_phen_2_set = False
+        if options is None:
+            options = resolve_options(self.params, input_fields)
+        self.options = options
+
+        if self.options['sgs_egs_method'] == 3:
             mid_anthesis_acc_value = mean_temps[self.params['mid_anthesis']]
-            for i, value in enumerate(mean_temps):
-                if value > (mid_anthesis_acc_value - 1075) and not sgs_set and mid_anthesis_acc_value > 1075:
-                    self.params['sgs'] = i
-                    sgs_set = True
-                if value > (mid_anthesis_acc_value + 700) and not egs_set:
-                    self.params['egs'] = i
-                    egs_set = True
-                if value > (mid_anthesis_acc_value - 456) and not astart_set and mid_anthesis_acc_value > 456:
-                    self.params['astart'] = i
-                    astart_set = True
-                if value > (mid_anthesis_acc_value - 795) and not fphen_1_set and mid_anthesis_acc_value > 795:
-                    fphen_1_day = i
-                    fphen_1_set = True
-                if value > (mid_anthesis_acc_value + 100) and not leaf_f_phen_1_set:
-                    leaf_fphen_1_day = i
-                    leaf_f_phen_1_set = True
-                if value > (mid_anthesis_acc_value + 525) and not leaf_f_phen_2_set:
-                    leaf_fphen_2_day = i
-                    leaf_f_phen_2_set = True
-                i = i + 1
-
-            if (
-                not fphen_1_set or not egs_set or not leaf_f_phen_1_set or not leaf_f_phen_2_set or not sgs_set or not astart_set
-            ):
+            # Thresholds are found as the first day the accumulated temperature
+            # exceeds them, which is where the running maximum does
+            acc_max = np.maximum.accumulate(mean_temps)
+
+            def first_day_above(offset, enabled=True):
+                i = np.searchsorted(acc_max, mid_anthesis_acc_value + offset, side='right')
+                return int(i) if enabled and i < len(acc_max) else None
+
+            sgs = first_day_above(-1075, mid_anthesis_acc_value > 1075)
+            egs = first_day_above(700)
+            astart = first_day_above(-456, mid_anthesis_acc_value > 456)
+            fphen_1_day = first_day_above(-795, mid_anthesis_acc_value > 795)
+            leaf_fphen_1_day = first_day_above(100)
+            leaf_fphen_2_day = first_day_above(525)
+
+            if None in (sgs, egs, astart, fphen_1_day, leaf_fphen_1_day, leaf_fphen_2_day):
                 if self.params.get('allow_invalid_td', False):
                     _log.warning(
                         "Failed to calculate SGS/EGS, using input values")
@@ -204,6 +110,10 @@ class Dataset:
                         "Failed to calculate SGS/EGS, use allow_invalid_td to ignore")
 
             else:
+                self.params['sgs'] = sgs
+                self.params['egs'] = egs
+                self.params['astart'] = astart
+
                 self.params['fphen_1'] = fphen_1_day - self.params['sgs']
 
                 self.params['aend'] = self.params['egs'] + 1
@@ -219,19 +129,114 @@ class Dataset:
 
         _log.info("Loaded %d data rows" % len(self.input))
 
-    def run(self, progressbar=None, progress_interval=100):
+    def run(self, progressbar=None, progress_interval=100, batch=False,
+            fields=None, final_only=False, period=None, spinup=0,
+            spinup_cache=None):
         """Run the DO3SE model with this dataset.
 
         If a :class:`wx.Gauge` is supplied as the *progressbar* argument, it
         will have it's range set to the number of input rows, and will be
         updated every *progress_interval* rows.
 
+        If *batch* is True the input is passed to the model as whole columns
+        and the rows are iterated over inside the Fortran model (see
+        :func:`do3se.model.run_batch`) rather than one row at a time.
+
+        Only the output fields listed in *fields* (default: all of
+        :data:`do3se.model.output_fields`) are extracted from the model.  If
+        *final_only* is True they are only extracted once, after the last row,
+        and the results contain a single row with the final state.
+
+        If a pair is supplied as the *period* argument, it is treated as an
+        (inclusive) day range and results are only extracted for rows in that
+        range, although the model is still run for every row.
+
+        If *spinup* is given, the first *spinup* input rows are only used to
+        spin up the model, and no results are extracted for them (see
+        :meth:`initialise_model`).
+
         Returns a :class:`Resultset` object with the model run results.
         """
-        skippedrows = 0
+        if fields is None:
+            fields = list(model.output_fields.keys())
+
+        chunks = list(self.iter_run(progressbar=progressbar,
+                                    progress_interval=progress_interval,
+                                    batch=batch,
+                                    fields=[] if final_only else fields,
+                                    period=period, spinup=spinup,
+                                    spinup_cache=spinup_cache))
+        skippedrows = sum(c.skipped for c in chunks)
+
+        if final_only:
+            row_count = 1 if len(self.input) - spinup > skippedrows else 0
+            values = np.array([model.output_extractor(fields)()] * row_count,
+                              dtype=np.float64)
+            columns = _typed_columns(values.reshape(row_count, len(fields)), fields)
+        elif len(chunks) == 1:
+            columns = chunks[0].columns
+        else:
+            columns = _concat_columns([c.columns for c in chunks], fields)
+
+        results = Resultset(columns, skippedrows, self.params)
+        _log.info("Got %d results" % len(results.data))
+        return results
+
+    def iter_run(self, chunk_size=None, progressbar=None, progress_interval=100,
+                 batch=False, fields=None, period=None, spinup=0,
+                 spinup_cache=None):
+        """Run the DO3SE model with this dataset, yielding results as it goes.
+
+        Like :meth:`run`, but a :class:`Resultset` of at most *chunk_size*
+        rows (default: all rows) is yielded as soon as its rows have been
+        calculated, so only one chunk of results needs to be held in memory.
+        The :attr:`Resultset.skipped` of each chunk is the number of input
+        rows skipped since the previous chunk.
+
+        The model state is global, so the model must not be run again until
+        the generator is exhausted.
+        """
+        if fields is None:
+            fields = list(model.output_fields.keys())
 
+        self.initialise_model(spinup, spinup_cache)
+
+        # Initialise progress bar
+        if progressbar is not None:
+            progressbar.SetRange(len(self.input))
+            progressbar.SetValue(0)
+
+        _log.info("Running calculations ...")
+        if batch:
+            yield from self._iter_run_batch(chunk_size, progressbar,
+                                            progress_interval, fields, period,
+                                            spinup)
+        else:
+            yield from self._iter_run_rows(chunk_size, progressbar,
+                                           progress_interval, fields, period,
+                                           spinup)
+
+        if progressbar is not None:
+            progressbar.SetValue(0)
+
+    def initialise_model(self, spinup=0, spinup_cache=None):
+        """Load this dataset's options and parameters into the model and
+        initialise it, ready to run the input data.
+
+        If *spinup* is given, the model is then run over the first *spinup*
+        input rows, e.g. a year before the period of interest, to get a
+        realistic soil water state.  The accumulated fluxes and exposures are
+        reset afterwards.  If a :class:`SpinupCache` is given as
+        *spinup_cache*, the state at the end of the spin-up is taken from it
+        if it has been stored, and stored in it if not.
+
+        The model state can then be stored as one of several sites (see
+        :func:`do3se.model.store_site`).
+        """
         # These parameters need special handling
-        co2_const = self.params.pop('co2_constant')
+        if 'co2_constant' in self.params:
+            self.co2_constant = self.params.pop('co2_constant')
+        co2_const = self.co2_constant
 
         # Initialise function switchboard
         util.setattrs(model.options, self.options)
@@ -248,16 +253,67 @@ class Dataset:
                        co2_const['value'])
             util.setattrs(model.inputs, {'co2': co2_const['value']})
 
-        # Initialise progress bar
-        if progressbar is not None:
-            progressbar.SetRange(len(self.input))
-            progressbar.SetValue(0)
+        if spinup:
+            self._spin_up(spinup, spinup_cache)
+
+    def _spin_up(self, spinup, spinup_cache):
+        """Run the initialised model over the first *spinup* input rows."""
+        columns, _ = self._input_columns(0, spinup)
+        key = spinup_cache.key(self, spinup, columns) \
+            if spinup_cache is not None else None
+        state = spinup_cache.get(key) if key is not None else None
+        if state is not None:
+            _log.info("Using cached spin-up state")
+            model.load_state(state)
+            return
+
+        _log.info("Spinning up over %d rows ..." % spinup)
+        if columns:
+            model.run_batch(columns, [])
+        model.run.reset_accumulators()
+        if key is not None:
+            spinup_cache.put(key, model.save_state())
+
+    def run_to_file(self, outfile, fields, headers=False, period=None,
+                    chunk_size=1000, batch=False, spinup=0, spinup_cache=None):
+        """Run the DO3SE model with this dataset, saving results as it goes.
+
+        The results are written to *outfile* every *chunk_size* rows, in the
+        same format as :meth:`Resultset.save` (see there for *fields*,
+        *headers* and *period*), without keeping them in memory.  Results
+        outside *period* are never extracted from the model.  *spinup* and
+        *spinup_cache* are as for :meth:`run`.
+
+        Returns the number of input rows that were skipped.
+        """
+        skippedrows = 0
+        for chunk in self.iter_run(chunk_size, batch=batch, fields=fields,
+                                   period=period, spinup=spinup,
+                                   spinup_cache=spinup_cache):
+            chunk.save(outfile, fields, headers)
+            headers = False
+            skippedrows += chunk.skipped
+        return skippedrows
+
+    def _iter_run_rows(self, chunk_size, progressbar, progress_interval, fields,
+                       period, start_row=0):
+        """Run the initialised model one row at a time from *start_row*,
+        yielding chunks of results."""
         prog_counter = progress_interval
+        # Matrix rows have the thermal time appended by the constructor
+        headings = [*self.headings, 'td']
+        dd_key = headings.index('dd') if self.input_data_is_matrix else 'dd'
+        start, end = period if period is not None else (None, None)
 
-        results = []
+        extract = model.output_extractor(fields)
+        values = np.empty((chunk_size or len(self.input) - start_row, len(fields)))
+        row_count = 0
+        skippedrows = 0
+        rows = self.input[start_row:]
+        if self.td is not None:
+            rows = ([*row, td] for row, td in zip(rows, self.td[start_row:]))
         # Iterate through dataset
-        _log.info("Running calculations ...")
-        for row in self.input:
+        for row in rows:
             if progressbar is not None:
                 prog_counter -= 1
                 if prog_counter == 0:
@@ -274,32 +330,381 @@ class Dataset:
             # TODO: Handle this differently?
             try:
                 if self.input_data_is_matrix:
-                    util.setattrsb(model.inputs, row, self.headings)
+                    util.setattrsb(model.inputs, row, headings)
                 else:
                     util.setattrs(model.inputs, row)
             except TypeError:
                 raise InvalidFieldCountError()
             model.run.calculate_row()
-            results.append(model.extract_outputs())
-
+            if period is not None and not start <= row[dd_key] <= end:
+                continue
+            values[row_count] = extract()
+            row_count += 1
+
+            if row_count == len(values):
+                yield Resultset(_typed_columns(values, fields), skippedrows, self.params)
+                row_count = 0
+                skippedrows = 0
+
+        if row_count or skippedrows:
+            yield Resultset(_typed_columns(values[:row_count], fields),
+                            skippedrows, self.params)
+
+    def _iter_run_batch(self, chunk_size, progressbar, progress_interval, fields,
+                        period, start_row=0):
+        """Run the initialised model over the input data from *start_row* in
+        column batches, yielding chunks of results."""
+        input_columns, skippedrows = self._input_columns(start_row)
+        row_count = len(next(iter(input_columns.values()))) if input_columns else 0
+        batch_size = chunk_size or row_count
+        # Only return to Python between batches if there is progress to show
         if progressbar is not None:
-            progressbar.SetValue(0)
+            batch_size = min(batch_size, progress_interval)
+
+        for start in range(0, row_count, max(batch_size, 1)):
+            end = min(start + batch_size, row_count)
+            columns = self._run_batch(
+                dict((k, v[start:end]) for k, v in input_columns.items()),
+                fields, period)
+            if progressbar is not None:
+                progressbar.SetValue(start_row + end + skippedrows)
+            yield Resultset(columns, skippedrows if start == 0 else 0, self.params)
+
+        if row_count == 0 and skippedrows:
+            yield Resultset(_typed_columns(np.empty((0, len(fields))), fields),
+                            skippedrows, self.params)
+
+    @staticmethod
+    def _run_batch(columns, fields, period):
+        """Run the model over a batch of input columns, only extracting
+        results for rows within *period*."""
+        if period is None:
+            return model.run_batch(columns, fields)
+        dd = columns['dd']
+        in_period = (dd >= period[0]) & (dd <= period[1])
+        # Run each stretch of rows in or out of the period as its own batch
+        bounds = [0, *(np.flatnonzero(np.diff(in_period)) + 1), len(dd)]
+        results = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            segment = dict((k, v[start:end]) for k, v in columns.items())
+            if in_period[start]:
+                results.append(model.run_batch(segment, fields))
+            else:
+                model.run_batch(segment, [])
+        return _concat_columns(results, fields)
 
-        _log.info("Got %d results" % len(results))
-        return Resultset(results, skippedrows, self.params)
+    def _input_columns(self, start=0, stop=None):
+        """Get the input data rows from *start* to *stop* as a mapping of field
+        name to array of values.
+
+        Rows that are missing values are left out.  Returns the column mapping
+        and the number of rows that were left out.
+        """
+        input_rows = self.input[start:stop]
+        if self.input_data_is_matrix:
+            try:
+                data = np.asarray(input_rows, dtype=np.float64)
+            except (TypeError, ValueError):
+                raise InvalidFieldCountError()
+            if self.td is not None:
+                return dict(zip(self.headings, data.T), td=self.td[start:stop]), 0
+            return dict(zip([*self.headings, 'td'], data.T)), 0
+
+        rows = [row for row in input_rows if '' not in row.values()]
+        try:
+            columns = dict((k, np.array([row[k] for row in rows], dtype=np.float64))
+                                  for k in rows[0].keys()) if rows else dict()
+        except (KeyError, TypeError, ValueError):
+            raise InvalidFieldCountError()
+        return columns, len(input_rows) - len(rows)
+
+
+class SpinupCache:
+    """Model states at the end of spin-up periods, for reuse by later runs
+    (see :meth:`Dataset.initialise_model`).
+
+    States are keyed by the dataset's parameters and model options, the
+    spin-up input data and the length of the spin-up, so a state is reused
+    whatever the input data after the spin-up.  They are kept in memory and,
+    if *path* is given, saved to files in that directory, so that they can be
+    shared between processes and runs.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.states = dict()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(dataset, spinup, columns):
+        """Get the key for the state after spinning up *dataset* over the
+        first *spinup* rows, which give the input *columns*."""
+        # Thermal time is calculated over the whole input, so it depends on
+        # rows after the spin-up, but the model only passes it through
+        names = sorted(k for k in columns if k != 'td')
+        digest = hashlib.sha1()
+        # Saved states are only valid for the same build of the model
+        digest.update(json.dumps([
+            model.state.state_size(), spinup, dataset.params,
+            dataset.co2_constant, dataset.options, names,
+        ], sort_keys=True, default=repr).encode())
+        for k in names:
+            digest.update(np.ascontiguousarray(columns[k], dtype=np.float64))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Get the state stored for *key*, or None."""
+        if key not in self.states and self.path is not None:
+            try:
+                with open(self._file(key), 'rb') as f:
+                    self.states[key] = f.read()
+            except FileNotFoundError:
+                pass
+        return self.states.get(key)
+
+    def put(self, key, state):
+        """Store *state* for *key*."""
+        self.states[key] = state
+        if self.path is not None:
+            # Write to a temporary file first, so other processes never see
+            # a partial state
+            tmp_file = '%s.%d.tmp' % (self._file(key), os.getpid())
+            with open(tmp_file, 'wb') as f:
+                f.write(state)
+            os.replace(tmp_file, self._file(key))
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.state')
+
+
+def run_sites(datasets, fields=None, final_only=False, spinup=0,
+              spinup_cache=None):
+    """Run the DO3SE model for several datasets, e.g. grid cells, in a single
+    call to the Fortran model (see :func:`do3se.model.run_batch_sites`).
+
+    The datasets must all have the same input fields, number of rows and model
+    options, with no rows that are missing values.  *fields*, *final_only*, *spinup* and
+    *spinup_cache* are as for :meth:`Dataset.run`.
+
+    Returns a list of :class:`Resultset` objects, one for each dataset.
+    """
+    if fields is None:
+        fields = list(model.output_fields.keys())
+
+    model.init_sites(len(datasets))
+    site_columns = []
+    for i, ds in enumerate(datasets):
+        ds.initialise_model(spinup, spinup_cache)
+        model.store_site(i)
+        columns, skippedrows = ds._input_columns(spinup)
+        if skippedrows or (site_columns and
+                           (not _same_shape(columns, site_columns[0]) or
+                            ds.options != datasets[0].options)):
+            raise SiteMismatchError()
+        site_columns.append(columns)
+    if not site_columns:
+        return []
+
+    _log.info("Running calculations for %d sites ..." % len(datasets))
+    columns = dict((k, np.stack([c[k] for c in site_columns]))
+                   for k in site_columns[0])
+    outputs = model.run_batch_sites(columns, [] if final_only else fields)
+
+    results = []
+    for i, ds in enumerate(datasets):
+        if final_only:
+            model.load_site(i)
+            values = np.array([model.output_extractor(fields)()], dtype=np.float64)
+            site_outputs = _typed_columns(values, fields)
+        else:
+            site_outputs = dict((f, v[i]) for f, v in outputs.items())
+        results.append(Resultset(site_outputs, 0, ds.params))
+    return results
+
+
+def _same_shape(columns, other):
+    return columns.keys() == other.keys() and \
+        all(len(v) == len(other[k]) for k, v in columns.items())
+
+
+def _typed_columns(values, fields):
+    """Split a 2-D array of output values into a dict of columns, each cast to
+    its output field's type."""
+    return dict((f, values[:, i].astype(model.output_fields[f]['type']))
+                for i, f in enumerate(fields))
+
+
+def resolve_options(params, input_fields):
+    """Resolve model options from project parameters.
+
+    Chooses the model calculation methods from *params* and the available
+    *input_fields*, replacing "virtual" parameters in *params* (such as the
+    soil texture) with real model parameters.  Returns a mapping of option
+    name to value for :mod:`do3se.model.options`.
+
+    Only the parameters in :data:`option_params` affect the options, or are
+    replaced.
+    """
+    options = dict()
+
+    # Check required fields are present
+    required = [k for k, v in model.input_fields.items() if v['required']]
+    for f in required:
+        if not f in input_fields:
+            raise RequiredFieldError([f])
+
+    # Handle PAR/Global radiation input/derivation
+    if 'par' in input_fields and 'r' in input_fields:
+        options['r_par_method'] = model.options.r_par_use_inputs
+        _log.debug('R/PAR calculation: use inputs')
+    elif 'par' in input_fields:
+        options['r_par_method'] = model.options.r_par_derive_r
+        _log.debug('R/PAR calculation: derive R')
+    elif 'ppfd' in input_fields:
+        options['r_par_method'] = model.options.r_par_derive_r
+        _log.debug('R/PAR calculation: derive R')
+    elif 'r' in input_fields:
+        options['r_par_method'] = model.options.r_par_derive_par
+        _log.debug('R/PAR calculation: derive PAR')
+    elif 'cloudfrac' in input_fields:
+        options['r_par_method'] = model.options.r_par_derive_cloudfrac
+        _log.debug('R/PAR calculation: derive PAR from cloudfrac')
+    else:
+        raise RequiredFieldError(['par', 'r'])
+
+    # Calculate net radiation if not supplied
+    if 'rn' in input_fields:
+        options['rn_method'] = model.options.rn_use_input
+        _log.debug('Rn calculation: use input')
+    else:
+        options['rn_method'] = model.options.rn_calculate
+        _log.debug('Rn calculation: calculate')
+
+    # Other switchable procedures
+    fO3 = model.fO3_calcs[params.pop('fo3', model.default_fO3_calc)]
+    _log.debug('fO3 calculation: "%(name)s" (%(id)s)' % fO3)
+    options['fo3_method'] = fO3['func']
+
+    ustar = model.ustar_calcs[params.pop(
+        'ustar_method', model.default_ustar_calc)]
+    _log.debug('ustar calculation: "%(name)s" (%(id)s)' % ustar)
+    options['ustar_method'] = ustar['func']
+
+    SAI = model.SAI_calcs[params.pop('sai', model.default_SAI_calc)]
+    _log.debug('SAI calculation: "%(name)s" (%(id)s)' % SAI)
+    options['sai_method'] = SAI['func']
+    leaf_fphen = model.leaf_fphen_calcs[
+        params.pop('leaf_fphen', model.default_leaf_fphen_calc)]
+    _log.debug('leaf_fphen calculation: "%(name)s" (%(id)s)' % leaf_fphen)
+    options['leaf_fphen_method'] = leaf_fphen['func']
+    ra_method = model.ra_method[params.pop(
+        'ra_method', model.default_ra_method)]
+    options['ra_method'] = ra_method['func']
+    fXWP = model.fXWP_calcs[params.pop(
+        'fxwp', model.default_fXWP_calc)]
+    options['fxwp_method'] = fXWP['func']
+    fSWP = model.fSWP_calcs[params.pop(
+        'fswp', model.default_fSWP_calc)]
+    options['fswp_method'] = fSWP['func']
+    ASW = model.ASW_calcs[params.pop(
+        'asw', model.default_ASW_calc)]
+    options['asw_method'] = ASW['func']
+    LWP = model.LWP_calcs[params.pop('lwp', model.default_LWP_calc)]
+    options['lwp_method'] = LWP['func']
+    SGS_EGS = model.SGS_EGS_calcs[params.pop(
+        'sgs_egs_calc', model.default_SGS_EGS_calc)]
+    options['sgs_egs_method'] = SGS_EGS['func']
+    gsto = model.gsto_calcs[params.pop(
+        'gsto', model.default_gsto_calc)]
+    options['gsto_method'] = gsto['func']
+    tleaf = model.tleaf_calcs[params.pop(
+        'tleaf', model.default_tleaf_calc)]
+    options['tleaf_method'] = tleaf['func']
+
+    # Soil parameters from soil type
+    soil = model.soil_classes[params.pop(
+        'soil_tex', model.default_soil_class)]
+    # Copy, so that overrides don't leak into the shared soil class data
+    soil = {**soil, 'data': dict(soil['data'])}
+    # Allowing overriding of soil parameters
+    soil['data']['soil_b'] = params.pop(
+        'soil_b', soil['data']['soil_b']
+    )
+    soil['data']['fc_m'] = params.pop(
+        'fc_m', soil['data']['fc_m']
+    )
+    soil['data']['swp_ae'] = params.pop(
+        'swp_ae', soil['data']['swp_ae']
+    )
+    soil['data']['ksat'] = params.pop(
+        'ksat', soil['data']['ksat']
+    )
+    params.update(soil['data'])
+
+
+    # Use/copy measurement vegetation heights
+    u_h = params.pop('u_h')
+    params['u_h'] = params['h'] if u_h['disabled'] else u_h['value']
+    o3_h = params.pop('o3_h')
+    params['o3_h'] = params['h'] if o3_h['disabled'] else o3_h['value']
+
+    return options
+
+
+#: Parameters read or replaced by :func:`resolve_options`
+option_params = frozenset([
+    'fo3', 'ustar_method', 'sai', 'leaf_fphen', 'ra_method', 'fxwp', 'fswp',
+    'asw', 'lwp', 'sgs_egs_calc', 'gsto', 'tleaf', 'soil_tex', 'soil_b',
+    'fc_m', 'swp_ae', 'ksat', 'u_h', 'o3_h', 'h',
+])
+
+
+def _concat_columns(chunks, fields):
+    """Concatenate a list of mappings of output columns, keeping each output
+    field's type even if there are none."""
+    return dict((f, np.concatenate(
+        [np.empty(0, model.output_fields[f]['type'])] + [c[f] for c in chunks]))
+        for f in fields)
+
+
+def period_rows(dd, period):
+    """Get the rows of day column *dd* within an inclusive (start, end) day
+    range *period*.
+
+    If *dd* is in order, as it is within a run, the rows are found by binary
+    search and returned as a slice, so selecting them doesn't copy any data.
+    Otherwise a boolean mask is returned.
+    """
+    start, end = period
+    if len(dd) < 2 or (dd[1:] >= dd[:-1]).all():
+        return slice(np.searchsorted(dd, start, 'left'),
+                     np.searchsorted(dd, end, 'right'))
+    return (dd >= start) & (dd <= end)
 
 
 class Resultset:
     """Results data from a model run.
 
-    Contains the model run results as :attr:`data`, the number of rows skipped
-    as :attr:`skipped`, the (modified) parameters used for the model run as
+    Contains the model run results as :attr:`columns`, a mapping of output
+    field name to an array of values, the number of rows skipped as
+    :attr:`skipped`, the (modified) parameters used for the model run as
     :attr:`params`, and provides the ability to :meth:`save` the results to a
-    file.
+    file.  :attr:`data` is a sequence of dict-like row views of the same
+    results.
+
+    *data* can be given either as a mapping of output field name to column
+    values or as a list of result dicts.
     """
 
     def __init__(self, data, skipped, params):
-        self.data = data
+        if isinstance(data, Mapping):
+            self.columns = dict((k, np.asarray(v)) for k, v in data.items())
+        else:
+            fields = list(data[0].keys()) if data else []
+            self.columns = dict(
+                (f, np.array([r[f] for r in data])) for f in fields)
+        self.data = ResultRows(self.columns)
         self.skipped = skipped
         self.params = params
 
@@ -315,21 +720,144 @@ class Resultset:
         """
         _log.debug("Output data format: %s" % (",".join(fields)))
 
-        w = csv.DictWriter(outfile, fieldnames=fields, extrasaction='ignore',
-                           quoting=csv.QUOTE_NONNUMERIC)
+        w = csv.writer(outfile, quoting=csv.QUOTE_NONNUMERIC)
 
         if headers:
-            w.writerow(
-                dict((f, model.output_fields[f]['short']) for f in fields))
+            w.writerow([model.output_fields[f]['short'] for f in fields])
+
+        rows = self._period_rows(period)
+        row_count = len(self.data) if period is None else len(self.columns['dd'][rows])
+        # Unknown fields are written as empty values
+        values = [self.columns[f][rows].tolist() if f in self.columns
+                  else [''] * row_count for f in fields]
+        w.writerows(zip(*values))
+        self._log_saved(period, row_count)
+
+    def save_parquet(self, outfile, fields, headers=False, period=None,
+                     compression='zstd'):
+        """Save results to a Parquet file.
+
+        *fields*, *headers* and *period* are as for :meth:`save`; with
+        *headers* the short and long field descriptions are stored as column
+        metadata.  Unknown fields are written as NaN.  Requires :mod:`pyarrow`.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = self._field_columns(fields, period)
+        schema = pa.schema([
+            pa.field(f, pa.from_numpy_dtype(v.dtype),
+                     metadata=self._field_attrs(f) if headers else None)
+            for f, v in columns.items()])
+        table = pa.table(list(columns.values()), schema=schema)
+        pq.write_table(table, outfile, compression=compression)
+        self._log_saved(period, table.num_rows)
+
+    def save_netcdf(self, outfile, fields, headers=False, period=None,
+                    complevel=4, chunksize=8760):
+        """Save results to a NetCDF file.
+
+        *fields*, *headers* and *period* are as for :meth:`save`; see
+        :meth:`to_dataset`.  Each variable is compressed at *complevel* and
+        chunked along the time dimension in chunks of *chunksize* rows.
+        Requires :mod:`xarray` and :mod:`netCDF4`.
+        """
+        ds = self.to_dataset(fields, headers, period)
+        n = ds.sizes['time']
+        encoding = dict((f, {'zlib': complevel > 0, 'complevel': complevel})
+                        for f in ds.data_vars)
+        if n:
+            for e in encoding.values():
+                e['chunksizes'] = (min(chunksize, n),)
+        ds.to_netcdf(outfile, encoding=encoding)
+        self._log_saved(period, n)
+
+    def to_dataset(self, fields, headers=False, period=None, dim='time'):
+        """Get results as an :class:`xarray.Dataset`.
+
+        Each of *fields* becomes a variable along dimension *dim*, restricted
+        to *period* as for :meth:`save`.  If *headers* is True, the field
+        descriptions are added as ``short_name`` and ``long_name`` attributes.
+        """
+        import xarray as xr
 
+        return xr.Dataset(dict(
+            (f, (dim, v, self._field_attrs(f) if headers else None))
+            for f, v in self._field_columns(fields, period).items()))
+
+    def _period_rows(self, period):
+        """Get the row selection for an inclusive (start, end) day range."""
+        if period is None:
+            return slice(None)
+        return period_rows(self.columns['dd'], period)
+
+    def _field_columns(self, fields, period):
+        """Get the *fields* columns restricted to *period*, filling unknown
+        fields with NaN."""
+        rows = self._period_rows(period)
+        columns = dict((f, self.columns[f][rows]) for f in fields
+                       if f in self.columns)
+        row_count = len(next(iter(columns.values()))) if columns else \
+            len(self.data) if period is None else len(self.columns['dd'][rows])
+        return dict((f, columns[f] if f in columns else np.full(row_count, np.nan))
+                    for f in fields)
+
+    @staticmethod
+    def _field_attrs(field):
+        if field not in model.output_fields:
+            return {}
+        f = model.output_fields[field]
+        return {'short_name': f['short'], 'long_name': f['long']}
+
+    @staticmethod
+    def _log_saved(period, row_count):
         if period is None:
-            w.writerows(self.data)
-            _log.info('Wrote all %d rows' % (len(self.data),))
+            _log.info('Wrote all %d rows' % (row_count,))
         else:
-            start, end = period
-            w.writerows(
-                list(filter(lambda r: r['dd'] >= start and r['dd'] <= end, self.data)))
-            _log.info('Wrote rows from dd=%d to dd=%d' % (start, end))
+            _log.info('Wrote rows from dd=%d to dd=%d' % period)
+
+
+class ResultRows(Sequence):
+    """Sequence of dict-like row views over a mapping of result columns.
+
+    Indexing with a slice gives another :class:`ResultRows` over views of the
+    same columns.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ResultRows(dict((k, v[index]) for k, v in self.columns.items()))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('result row index out of range')
+        return ResultRow(self.columns, index)
+
+
+class ResultRow(Mapping):
+    """Read-only dict-like view of a single row of result columns."""
+
+    def __init__(self, columns, index):
+        self._columns = columns
+        self._index = index
+
+    def __getitem__(self, key):
+        return self._columns[key][self._index].item()
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __repr__(self):
+        return repr(dict(self))
 
 
 class NoDataError(DatasetError):
@@ -337,6 +865,12 @@ class NoDataError(DatasetError):
         DatasetError.__init__(self, 'No data in file')
 
 
+class SiteMismatchError(DatasetError):
+    def __init__(self):
+        DatasetError.__init__(self, 'Sites must have the same input fields,'
+                                    ' rows and options, with no missing values')
+
+
 class NotEnoughColumnsError(DatasetError):
     def __init__(self):
         DatasetError.__init__(self, 'Not enough columns in input')
@@ -361,6 +895,11 @@ class UnquotedStringError(DatasetError):
         DatasetError.__init__(self, 'CSV file invalid, unquoted string found')
 
 
+class InvalidInputFileError(DatasetError):
+    def __init__(self):
+        DatasetError.__init__(self, 'Not a DO3SE binary input file')
+
+
 def data_from_csv(infile, keys, trim):
     """Load data from CSV file.
 
@@ -434,40 +973,170 @@ def data_from_csv(infile, keys, trim):
     return data
 
 
-def calc_mean(temp_list):
-    temp_list_sum = sum(temp_list)
-    temp_list_len = len(temp_list)
-    mean_value = float(temp_list_sum) / float(temp_list_len)
-    if mean_value > 0:
-        return mean_value
-    return 0
+# Rows parsed by each numpy.loadtxt call while finding invalid CSV input
+_CSV_CHECK_ROWS = 10000
+
+
+def matrix_from_csv(infile, keys, trim):
+    """Load data from CSV file as a matrix.
+
+    Like :func:`data_from_csv`, but the data is parsed straight into a 2-D
+    float64 array with a column for each of *keys*, ready to be used as the
+    matrix input of :class:`Dataset` with *keys* as the headings.  Returns the
+    array and the list of headings.
+
+    The file is parsed with :func:`numpy.loadtxt`.  If that fails the rows are
+    parsed again in blocks, and blocks that :func:`numpy.loadtxt` can't parse
+    are checked with :func:`data_from_csv` instead, so the same exceptions are
+    raised for invalid input, with the row numbers of the file.
+    """
+    text = infile.read()
+    try:
+        data = _matrix_from_lines(io.StringIO(text), keys, trim)
+    except ValueError:
+        data = None
+
+    if data is None or len(data) == 0:
+        lines = io.StringIO(text).readlines()
+        data = np.concatenate([
+            _check_matrix_rows(lines, keys, trim, start)
+            for start in range(trim, max(len(lines), trim + 1), _CSV_CHECK_ROWS)])
+
+    return data, list(keys)
+
+
+def _matrix_from_lines(lines, keys, skiprows=0):
+    """Parse CSV *lines* with :func:`numpy.loadtxt` for :func:`matrix_from_csv`."""
+    with warnings.catch_warnings():
+        # Empty input is reported by data_from_csv
+        warnings.simplefilter('ignore')
+        return np.loadtxt(lines, dtype=np.float64, delimiter=',',
+                          comments=None, skiprows=skiprows,
+                          usecols=range(len(keys)), ndmin=2)
+
+
+def _check_matrix_rows(lines, keys, trim, start):
+    """Parse the block of CSV *lines* from *start* for :func:`matrix_from_csv`.
+
+    A block that :func:`numpy.loadtxt` can't parse is checked with
+    :func:`data_from_csv`, starting from the row before it (or the header rows
+    for the first block) so its rows are numbered as in the file.
+    """
+    block = lines[start:start + _CSV_CHECK_ROWS]
+    try:
+        data = _matrix_from_lines(block, keys)
+    except ValueError:
+        data = None
+    if data is not None and (len(data) > 0 or start > trim):
+        return data.reshape(-1, len(keys))
+
+    first = trim if start == trim else start - 1
+    rows = data_from_csv(itertools.chain(itertools.repeat('\n', first),
+                                         lines[first:start + len(block)]),
+                         keys, first)
+    # Rows after the first aren't checked for enough columns
+    try:
+        return np.array([[row[k] for k in keys] for row in rows[start - first:]],
+                        dtype=np.float64).reshape(-1, len(keys))
+    except KeyError:
+        raise InvalidFieldCountError()
+
+
+def save_matrix(outfile, data, headings):
+    """Save matrix input data to a binary file.
+
+    *data* is saved to *outfile* in NumPy ``.npy`` format as a structured
+    array with a float64 field named after each of *headings*, so that it can
+    be loaded again without any parsing by :func:`matrix_from_npy`.  Integer
+    input fields, e.g. ``dd``, must have whole number values.
+    """
+    data = np.ascontiguousarray(data, dtype=np.float64)
+    _check_integer_fields(data, headings)
+    dtype = np.dtype([(h, np.float64) for h in headings])
+    np.save(outfile, data.view(dtype).reshape(len(data)))
+
+
+def matrix_from_npy(infile):
+    """Load matrix input data saved by :func:`save_matrix`.
+
+    The file is memory-mapped rather than read, so no data is copied until
+    it is used, apart from the integer input fields (e.g. ``dd``), which are
+    checked for whole number values.  Returns a 2-D float64 array and the
+    list of headings, as :func:`matrix_from_csv` does.
+    """
+    try:
+        records = np.load(infile, mmap_mode='r')
+    except ValueError:
+        raise InvalidInputFileError()
+    if records.ndim != 1 or records.dtype.names is None or \
+            any(records.dtype[h] != np.float64 for h in records.dtype.names):
+        raise InvalidInputFileError()
+    headings = list(records.dtype.names)
+    data = records.view(np.float64).reshape(len(records), len(headings))
+    _check_integer_fields(data, headings)
+    return data, headings
+
+
+def _check_integer_fields(data, headings):
+    """Check the columns of *data* for integer input fields only have whole
+    number values, which would otherwise be truncated by the model outputs."""
+    for c, h in enumerate(headings, 1):
+        if h in model.input_fields and model.input_fields[h]['type'] is int:
+            values = data[:, c - 1]
+            invalid = np.flatnonzero(values != np.floor(values))
+            if len(invalid):
+                raise InvalidDataError(invalid[0] + 1, c)
+
+
+def csv_to_npy(infile, outfile, keys, trim):
+    """Convert a CSV input file to the binary format of :func:`save_matrix`.
+
+    *infile*, *keys* and *trim* are as for :func:`data_from_csv`.
+    """
+    save_matrix(outfile, *matrix_from_csv(infile, keys, trim))
 
 
 def calc_thermal_time(data, dd_key="dd", ts_c_key="ts_c"):
-    day_temps = []
-    mean_temps = [0]*367
-    set_day = None
-    for row in data:
-        dd, ts_c = row[dd_key],row[ts_c_key]
-        if set_day == None:
-            set_day = int(dd)
-            day_temps = []
-            day_temps.append(ts_c)
-            continue
-        if int(dd) != set_day:
-            mean_temps[set_day] = calc_mean(day_temps)
-            if set_day > 1:
-                mean_temps[set_day] = mean_temps[set_day] + \
-                    mean_temps[set_day - 1]
-            day_temps = []
-            set_day = int(dd)
-            day_temps.append(ts_c)
-        else:
-            day_temps.append(ts_c)
+    """Calculate accumulated thermal time.
+
+    The rows of *data* are grouped into runs of consecutive rows with the same
+    day of year (from *dd_key*).  The mean temperature (from *ts_c_key*) of
+    each run, or 0 if it is negative, is added to the accumulated temperature
+    of the previous day of year.  Rows can be dicts or sequences, or *data*
+    can be a 2-D array.
+
+    Returns an array of the accumulated temperature for each day of year (the
+    last calculated value if a day occurs more than once) and an array of the
+    accumulated temperature for each row.
+    """
+    mean_temps = np.zeros(367)
+    if isinstance(data, np.ndarray):
+        dd = data[:, dd_key].astype(np.float64)
+        ts_c = data[:, ts_c_key].astype(np.float64)
+    else:
+        dd = np.array([row[dd_key] for row in data], dtype=np.float64)
+        ts_c = np.array([row[ts_c_key] for row in data], dtype=np.float64)
+    if len(dd) == 0:
+        return mean_temps, np.zeros(0)
+
+    days = dd.astype(int)
+    run_starts = np.flatnonzero(np.diff(days)) + 1
+    run_ids = np.zeros(len(days), dtype=int)
+    run_ids[run_starts] = 1
+    run_ids = np.cumsum(run_ids)
+    run_days = days[np.concatenate([[0], run_starts])]
+
+    run_means = np.bincount(run_ids, weights=ts_c) / np.bincount(run_ids)
+    run_means = np.where(run_means > 0, run_means, 0)
+
+    if np.all(np.diff(run_days) > 0):
+        # Each day only occurs once, so only a run directly following the
+        # previous day of year continues accumulating from it
+        breaks = np.flatnonzero((np.diff(run_days) != 1) | (run_days[1:] <= 1)) + 1
+        mean_temps[run_days] = np.concatenate(
+            [np.cumsum(m) for m in np.split(run_means, breaks)])
     else:
-        mean_temps[set_day] = calc_mean(day_temps)
-        if set_day > 1:
-            mean_temps[set_day] = mean_temps[set_day] + mean_temps[set_day - 1]
-    td = [mean_temps[int(row[dd_key])] for row in data]
+        for day, mean in zip(run_days, run_means):
+            mean_temps[day] = mean + mean_temps[day - 1] if day > 1 else mean
 
-    return mean_temps, td
+    return mean_temps, mean_temps[days]
@@ -1,7 +1,16 @@
+import copy
+import importlib.util
+import os
 import unittest
 import io
+import tempfile
+
+import numpy
 
 import do3se.dataset as dataset
+from do3se.project import Project
+
+TESTS_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'tests')
 
 
 class TestCSVLoader(unittest.TestCase):
@@ -49,5 +58,420 @@ class TestCSVLoader(unittest.TestCase):
                           self.infile, ('foo', 'bar', 'baz'), 7)
 
 
+class TestMatrixLoader(TestCSVLoader):
+    def test_not_enough_trim(self):
+        self.assertRaises(dataset.NotEnoughTrimError, dataset.matrix_from_csv,
+                          self.infile, ('foo', 'bar', 'baz'), 0)
+
+    def test_not_enough_columns(self):
+        self.assertRaises(dataset.NotEnoughColumnsError, dataset.matrix_from_csv,
+                          self.infile, ('foo', 'bar', 'baz', 'boggle'), 1)
+
+    def test_unquoted_string(self):
+        self.assertRaises(dataset.UnquotedStringError, dataset.matrix_from_csv,
+                          self.infile, ('foo', 'bar', 'baz'), 1)
+
+    def test_invalid_data(self):
+        with self.assertRaises(dataset.InvalidDataError) as cm:
+            dataset.matrix_from_csv(self.infile, ('foo', 'bar', 'baz'), 3)
+        self.assertEqual((cm.exception.row, cm.exception.col), (5, 2))
+
+    def test_missing_data(self):
+        self.assertRaises(dataset.InvalidDataError, dataset.matrix_from_csv,
+                          self.infile, ('foo', 'bar', 'baz'), 5)
+
+    def test_missing_data_after_first_row(self):
+        infile = io.StringIO("1,2,3\n4,5,6\n7,,9,\n")
+        with self.assertRaises(dataset.InvalidDataError) as cm:
+            dataset.matrix_from_csv(infile, ('foo', 'bar', 'baz'), 0)
+        self.assertEqual((cm.exception.row, cm.exception.col), (3, 2))
+
+    def test_invalid_data_in_later_block(self):
+        rows = dataset._CSV_CHECK_ROWS + 10
+        infile = io.StringIO('"foo","bar"\n' + '1,2\n' * rows + '3,"x"\n')
+        with self.assertRaises(dataset.InvalidDataError) as cm:
+            dataset.matrix_from_csv(infile, ('foo', 'bar'), 1)
+        self.assertEqual((cm.exception.row, cm.exception.col), (rows + 2, 2))
+
+    def test_empty_extra_columns(self):
+        infile = io.StringIO("1,2,3,\n4,5,6,,\n")
+        data, _ = dataset.matrix_from_csv(infile, ('foo', 'bar', 'baz'), 0)
+        self.assertEqual(data.tolist(), [[1, 2, 3], [4, 5, 6]])
+
+    def test_all_correct(self):
+        data, headings = dataset.matrix_from_csv(self.infile, ('foo', 'bar'), 6)
+        self.assertEqual(headings, ['foo', 'bar'])
+        self.assertEqual(data.tolist(), [[12, 15.3]])
+
+    def test_no_data(self):
+        self.assertRaises(dataset.NoDataError, dataset.matrix_from_csv,
+                          self.infile, ('foo', 'bar', 'baz'), 7)
+
+    def test_short_row(self):
+        infile = io.StringIO("1,2,3\n4,5\n")
+        self.assertRaises(dataset.InvalidFieldCountError, dataset.matrix_from_csv,
+                          infile, ('foo', 'bar', 'baz'), 0)
+
+
+class TestBinaryInput(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.npy')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_round_trip(self):
+        data = numpy.array([[1, 2.5, 3], [4, 5, 6.25]])
+        dataset.save_matrix(self.path, data, ['foo', 'bar', 'baz'])
+        loaded, headings = dataset.matrix_from_npy(self.path)
+        self.assertEqual(headings, ['foo', 'bar', 'baz'])
+        numpy.testing.assert_array_equal(loaded, data)
+
+    def test_csv_to_npy(self):
+        dataset.csv_to_npy(io.StringIO("1,2\n3,4\n"), self.path, ('foo', 'bar'), 0)
+        loaded, headings = dataset.matrix_from_npy(self.path)
+        self.assertEqual(headings, ['foo', 'bar'])
+        self.assertEqual(loaded.tolist(), [[1, 2], [3, 4]])
+
+    def test_integer_fields(self):
+        data = numpy.array([[1, 2.5], [4.5, 5]])
+        with self.assertRaises(dataset.InvalidDataError) as cm:
+            dataset.save_matrix(self.path, data, ['dd', 'ts_c'])
+        self.assertEqual((cm.exception.row, cm.exception.col), (2, 1))
+        # Files written some other way are checked when they are loaded
+        numpy.save(self.path, data.view([('dd', float), ('ts_c', float)]).reshape(2))
+        self.assertRaises(dataset.InvalidDataError, dataset.matrix_from_npy, self.path)
+
+    def test_not_input_file(self):
+        numpy.save(self.path, numpy.arange(6).reshape(2, 3))
+        self.assertRaises(dataset.InvalidInputFileError, dataset.matrix_from_npy, self.path)
+
+
+class TestThermalTime(unittest.TestCase):
+    def test_accumulation(self):
+        data = [{'dd': d, 'ts_c': t} for d, t in
+                [(1, 2), (1, 4), (2, -6), (2, 2), (4, 10), (4, 20)]]
+        mean_temps, td = dataset.calc_thermal_time(data)
+        self.assertEqual(list(mean_temps[:5]), [0, 3, 3, 0, 15])
+        self.assertEqual(list(td), [3, 3, 3, 3, 15, 15])
+
+    def test_matrix_and_year_wrap(self):
+        data = numpy.array([[365, 5.0], [365, 7.0], [1, 7.0], [2, 1.0]])
+        mean_temps, td = dataset.calc_thermal_time(data, 0, 1)
+        self.assertEqual(list(td), [6, 6, 7, 8])
+        self.assertEqual(mean_temps[365], 6)
+
+
+class TestBatchRun(unittest.TestCase):
+    PROJECT = os.path.join(TESTS_DIR, 'Norunda 1999 (DO3SE 3.0)', 'Norunda1999.do3se')
+    INPUT = os.path.join(TESTS_DIR, 'Norunda 1999 (DO3SE 3.0)', 'Norunda1999input.csv')
+
+    def make_dataset(self, params={}):
+        params = {**copy.deepcopy(dict(Project(self.PROJECT).data)), **params}
+        fields = params.pop('input_fields')
+        trim = params.pop('input_trim')
+        with open(self.INPUT) as infile:
+            data = dataset.data_from_csv(infile, fields, trim)
+        return dataset.Dataset(data[:500], fields, params)
+
+    def run_dataset(self, method='run', params={}, **kwargs):
+        return getattr(self.make_dataset(params), method)(**kwargs)
+
+    def test_batch_matches_rows(self):
+        # Some model state survives between runs, so make sure both runs
+        # start from the same state
+        self.run_dataset()
+        rows = self.run_dataset()
+        batch = self.run_dataset(batch=True)
+        self.assertEqual(len(batch.data), len(rows.data))
+        for f in rows.data[0]:
+            numpy.testing.assert_array_equal([r[f] for r in batch.data],
+                                             [r[f] for r in rows.data], f)
+
+    def test_selected_fields(self):
+        self.run_dataset()
+        full = self.run_dataset()
+        for batch in (False, True):
+            results = self.run_dataset(batch=batch, fields=['dd', 'afsty'])
+            self.assertEqual(list(results.columns), ['dd', 'afsty'])
+            numpy.testing.assert_array_equal(results.columns['afsty'], full.columns['afsty'])
+
+    def test_final_only(self):
+        self.run_dataset()
+        full = self.run_dataset()
+        for batch in (False, True):
+            results = self.run_dataset(batch=batch, fields=['afsty', 'aot40'], final_only=True)
+            self.assertEqual(len(results.data), 1)
+            self.assertEqual(dict(results.data[-1]),
+                             {'afsty': full.data[-1]['afsty'], 'aot40': full.data[-1]['aot40']})
+
+    def test_binary_input(self):
+        params = copy.deepcopy(dict(Project(self.PROJECT).data))
+        fields = params.pop('input_fields')
+        trim = params.pop('input_trim')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'input.npy')
+            with open(self.INPUT) as infile:
+                dataset.csv_to_npy(infile, path, fields, trim)
+            data, headings = dataset.matrix_from_npy(path)
+            self.run_dataset()
+            full = self.run_dataset()
+            for batch in (False, True):
+                self.run_dataset()
+                results = dataset.Dataset(data[:500], headings, copy.deepcopy(params),
+                                          headings).run(batch=batch)
+                for f in full.columns:
+                    numpy.testing.assert_array_equal(results.columns[f], full.columns[f], f)
+            del data
+
+    def test_period(self):
+        self.run_dataset()
+        full = self.run_dataset()
+        in_period = (full.columns['dd'] >= 110) & (full.columns['dd'] <= 112)
+        for batch in (False, True):
+            results = self.run_dataset(batch=batch, fields=['dd', 'afsty'], period=(110, 112))
+            self.assertEqual(len(results.data), 72)
+            numpy.testing.assert_array_equal(results.columns['afsty'],
+                                             full.columns['afsty'][in_period])
+
+    def test_iter_run(self):
+        for batch in (False, True):
+            self.run_dataset()
+            full = self.run_dataset(batch=batch)
+            chunks = list(self.run_dataset('iter_run', batch=batch, chunk_size=128))
+            self.assertEqual([len(c.data) for c in chunks], [128, 128, 128, 116])
+            numpy.testing.assert_array_equal(
+                numpy.concatenate([c.columns['afsty'] for c in chunks]), full.columns['afsty'])
+
+    def test_run_batch_sites(self):
+        from do3se import model
+        overrides = [{}, {'gmax': 300, 'lat': 40.0}]
+        expected = []
+        model.init_sites(len(overrides))
+        columns = []
+        for i, o in enumerate(overrides):
+            # Prime the model so the site starts from the same state as the
+            # standalone run
+            self.run_dataset(params=o)
+            expected.append(self.run_dataset(params=o, batch=True))
+            ds = self.make_dataset(o)
+            ds.initialise_model()
+            model.store_site(i)
+            columns.append(ds._input_columns()[0])
+        outputs = model.run_batch_sites(
+            dict((k, numpy.stack([c[k] for c in columns])) for k in columns[0]),
+            ['dd', 'hr', 'afsty', 'es_blocked'])
+        for i, results in enumerate(expected):
+            for f in outputs:
+                numpy.testing.assert_array_equal(outputs[f][i], results.columns[f], f)
+        self.assertRaises(IndexError, model.store_site, len(overrides))
+        # The sites are run together, so they must share their options
+        model.load_site(1)
+        model.options.fo3_method = model.options.fo3_wheat
+        model.store_site(1)
+        self.assertRaises(ValueError, model.run_batch_sites,
+                          dict((k, numpy.stack([c[k] for c in columns])) for k in columns[0]),
+                          ['dd'])
+
+    def test_save_state(self):
+        from do3se import model
+        fields = ['dd', 'hr', 'afsty', 'aot40', 'sn']
+        ds = self.make_dataset()
+        ds.initialise_model()
+        columns = ds._input_columns()[0]
+        first, rest = [dict((k, v[s]) for k, v in columns.items())
+                       for s in (slice(None, 250), slice(250, None))]
+        model.run_batch(first, [])
+        blob = model.save_state()
+        expected = model.run_batch(rest, fields)
+        # Move the model on, and make sure it goes back
+        model.run_batch(first, [])
+        model.load_state(blob)
+        results = model.run_batch(rest, fields)
+        for f in fields:
+            numpy.testing.assert_array_equal(results[f], expected[f], f)
+        self.assertRaises(ValueError, model.load_state, blob[:-1])
+
+    def test_spinup(self):
+        fields = ['dd', 'hr', 'afsty', 'sn']
+        self.run_dataset()
+        full = self.run_dataset()
+        expected = self.run_dataset(fields=fields, spinup=250)
+        self.assertEqual(len(expected.data), 250)
+        numpy.testing.assert_array_equal(expected.columns['sn'], full.columns['sn'][250:])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for batch in (False, True):
+                # The second run gets the state from the file saved by the first
+                results = self.run_dataset(fields=fields, batch=batch, spinup=250,
+                                           spinup_cache=dataset.SpinupCache(tmpdir))
+                for f in fields:
+                    numpy.testing.assert_array_equal(results.columns[f], expected.columns[f], f)
+            self.assertEqual(len(os.listdir(tmpdir)), 1)
+
+    def test_spinup_cache_ignores_later_rows(self):
+        cache = dataset.SpinupCache()
+        self.run_dataset(spinup=250, spinup_cache=cache)
+        # Warmer rows after the spin-up change the thermal time of the
+        # spin-up rows on the same day, but not the spin-up state
+        params = copy.deepcopy(dict(Project(self.PROJECT).data))
+        fields = params.pop('input_fields')
+        with open(self.INPUT) as infile:
+            data = dataset.data_from_csv(infile, fields, params.pop('input_trim'))[:500]
+        for row in data[250:]:
+            row['ts_c'] += 5
+        dataset.Dataset(data, fields, params).run(spinup=250, spinup_cache=cache)
+        self.assertEqual(len(cache.states), 1)
+
+    def test_run_with_files(self):
+        from do3se import model
+        fields = ['dd', 'hr', 'afsty', 'sn']
+        ds = self.make_dataset()
+        ds.initialise_model()
+        columns = ds._input_columns()[0]
+        expected = model.run_batch(columns, fields)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            settings = os.path.join(tmpdir, 'dose.nml')
+            model.save_settings(settings)
+            model.parameters.gmax = 0
+            model.files.read_settings(settings)
+            self.assertNotEqual(model.parameters.gmax, 0)
+
+            infile = os.path.join(tmpdir, 'input.csv')
+            numpy.savetxt(infile, numpy.transpose([columns[k] for k in columns]),
+                          fmt='%.9g', delimiter=',', header=','.join(columns), comments='')
+            outfile = os.path.join(tmpdir, 'output.csv')
+            self.assertEqual(model.files.run_with_files(infile, outfile, ' '.join(fields), False), 0)
+            results = numpy.genfromtxt(outfile, delimiter=',', names=True)
+            binfile = os.path.join(tmpdir, 'output.dat')
+            self.assertEqual(model.files.run_with_files(infile, binfile, ','.join(fields), True), 0)
+            binary = numpy.fromfile(binfile, dtype=numpy.float32).reshape(-1, len(fields))
+            self.assertEqual(model.files.run_with_files(infile, outfile, 'dd,nonsense', False), 1)
+
+            # A short row is skipped, rather than read on into the next row
+            with open(infile) as f:
+                lines = f.read().splitlines()
+            lines[11] = lines[11].rsplit(',', 2)[0]
+            with open(infile, 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+            ds.initialise_model()
+            model.files.run_with_files(infile, outfile, 'dd,hr', False)
+            short = numpy.genfromtxt(outfile, delimiter=',', names=True)
+        for i, f in enumerate(fields):
+            numpy.testing.assert_array_equal(results[f].astype(numpy.float32),
+                                             expected[f].astype(numpy.float32), f)
+            numpy.testing.assert_array_equal(binary[:, i], expected[f], f)
+        for f in ('dd', 'hr'):
+            numpy.testing.assert_array_equal(short[f], numpy.delete(expected[f], 10), f)
+
+    def test_gsto_pn_missing_fxwp(self):
+        from do3se import model
+        pn = model.pn_gsto
+        species = (pn.alpha, pn.teta, pn.h_a_jmax, pn.h_d_jmax, pn.h_a_vcmax,
+                   pn.h_d_vcmax, pn.s_v_vcmax, pn.s_v_jmax)
+
+        def gsto_pn(fxwp):
+            return pn.gsto_pn(391.0, 1249.1, 3.2, 0.5, 9.0, 9.0, 0.13, 1.0, 0.05,
+                              0.0, 8.12, 180.0, 400.0, *species,
+                              6.5, 0.75, 1.0, fxwp, 1.0)
+
+        self.assertTrue(numpy.isfinite(gsto_pn(0.5)).all())
+        # A missing fXWP isn't replaced by fmin
+        gsto_final, pngsto_l, pngsto, pngsto_c, _, _ = gsto_pn(float('nan'))
+        self.assertTrue(numpy.isfinite(gsto_final))
+        self.assertTrue(numpy.isnan([pngsto_l, pngsto, pngsto_c]).all())
+
+    def test_run_sites(self):
+        overrides = [{}, {'gmax': 300, 'lat': 40.0}]
+        fields = ['dd', 'hr', 'afsty', 'aot40']
+        expected = [self.run_dataset(params=o, fields=fields) for o in overrides]
+        results = dataset.run_sites([self.make_dataset(o) for o in overrides], fields)
+        final = dataset.run_sites([self.make_dataset(o) for o in overrides], fields,
+                                  final_only=True)
+        for e, r, f in zip(expected, results, final):
+            for k in fields:
+                numpy.testing.assert_array_equal(r.columns[k], e.columns[k], k)
+            self.assertEqual(dict(f.data[0]), dict(e.data[-1]))
+
+        short = self.make_dataset()
+        short.input = short.input[:100]
+        self.assertRaises(dataset.SiteMismatchError, dataset.run_sites,
+                          [self.make_dataset(), short])
+        other = self.make_dataset()
+        other.options = dict(other.options, fo3_method=other.options['fo3_method'] % 3 + 1)
+        self.assertRaises(dataset.SiteMismatchError, dataset.run_sites,
+                          [self.make_dataset(), other])
+
+    def test_run_to_file(self):
+        fields = ['dd', 'hr', 'afsty']
+        self.run_dataset()
+        expected = io.StringIO()
+        self.run_dataset().save(expected, fields, True, (110, 112))
+        outfile = io.StringIO()
+        skipped = self.run_dataset('run_to_file', outfile=outfile, fields=fields, headers=True,
+                                   period=(110, 112), chunk_size=100)
+        self.assertEqual(skipped, 0)
+        self.assertEqual(len(outfile.getvalue().splitlines()), 1 + 3 * 24)
+        self.assertEqual(outfile.getvalue(), expected.getvalue())
+
+
+class TestResultset(unittest.TestCase):
+    def setUp(self):
+        self.results = dataset.Resultset({
+            'dd': numpy.array([1, 1, 2, 3]),
+            'hr': numpy.array([22, 23, 0, 0]),
+            'afsty': numpy.array([0.0, 0.5, 1.25, 2.0]),
+        }, 0, {})
+
+    def test_row_view(self):
+        self.assertEqual(len(self.results.data), 4)
+        self.assertEqual(self.results.data[-1]['afsty'], 2.0)
+        self.assertEqual(dict(self.results.data[1]), {'dd': 1, 'hr': 23, 'afsty': 0.5})
+        self.assertEqual([r['hr'] for r in self.results.data[1:3]], [23, 0])
+        self.assertRaises(IndexError, lambda: self.results.data[4])
+
+    def test_from_rows(self):
+        results = dataset.Resultset(list(self.results.data), 0, {})
+        numpy.testing.assert_array_equal(results.columns['afsty'], [0.0, 0.5, 1.25, 2.0])
+
+    def test_save(self):
+        outfile = io.StringIO()
+        self.results.save(outfile, ['dd', 'afsty'], headers=True, period=(2, 3))
+        self.assertEqual(outfile.getvalue().splitlines(),
+                         ['"Day","PODY (mmol/m^2 PLA)"', '2,1.25', '3,2.0'])
+
+    def test_period_rows(self):
+        self.assertEqual(dataset.period_rows(numpy.array([1, 1, 2, 3, 3]), (2, 3)), slice(2, 5))
+        numpy.testing.assert_array_equal(dataset.period_rows(numpy.array([3, 1, 2]), (2, 3)),
+                                         [True, False, True])
+
+    def test_to_dataset(self):
+        ds = self.results.to_dataset(['dd', 'afsty', 'foo'], headers=True, period=(2, 3))
+        self.assertEqual(list(ds.data_vars), ['dd', 'afsty', 'foo'])
+        numpy.testing.assert_array_equal(ds['afsty'].values, [1.25, 2.0])
+        self.assertTrue(numpy.isnan(ds['foo'].values).all())
+        self.assertEqual(ds['dd'].attrs['short_name'], 'Day')
+
+    def test_save_netcdf(self):
+        import xarray
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'results.nc')
+            self.results.save_netcdf(path, ['dd', 'afsty'], period=(2, 3))
+            with xarray.open_dataset(path) as ds:
+                numpy.testing.assert_array_equal(ds['afsty'].values, [1.25, 2.0])
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'requires pyarrow')
+    def test_save_parquet(self):
+        import pyarrow.parquet as pq
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'results.parquet')
+            self.results.save_parquet(path, ['dd', 'afsty'], headers=True, period=(2, 3))
+            table = pq.read_table(path)
+        self.assertEqual(table.column_names, ['dd', 'afsty'])
+        self.assertEqual(table.column('dd').to_pylist(), [2, 3])
+        self.assertEqual(table.column('afsty').to_pylist(), [1.25, 2.0])
+        self.assertEqual(table.schema.field('dd').metadata[b'short_name'], b'Day')
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,22 +1,32 @@
 import os
+import json
+import hashlib
 import math
+import shutil
+import tempfile
 import numpy as np
 import pandas as pd
 import xarray as xr
 from warnings import warn
-from collections import namedtuple
+from collections import namedtuple, deque
 from typing import Tuple, Callable, List, Union, Dict
 from datetime import datetime
+from multiprocessing import Pool
 from pathlib import Path
 
-from do3se.automate import run_from_pipe
+from do3se.automate import ModelSession
+from do3se.dataset import Resultset, SpinupCache, run_sites
 from do3se.logger import Logger
 from do3se.version import app_version
 
 INVALID_COORD = -9999
 
 def saturated_vapour_pressure(Ts_C: float) -> float:
-    return 0.611 * math.exp(17.27 * Ts_C / (Ts_C + 237.3))
+    """Saturated vapour pressure (kPa).
+
+    Works element-wise on arrays, including lazy xarray/dask arrays.
+    """
+    return 0.611 * np.exp(17.27 * Ts_C / (Ts_C + 237.3))
 
 
 def calculate_VPD(Ts_C, rh):
@@ -28,11 +38,8 @@ def calculate_VPD(Ts_C, rh):
 
 
 def add_vpd(x):
-    def _inner(ts_c, rh):
-        # TODO: Incorrect args passed to calculate vpd
-        return np.apply_along_axis(lambda d: calculate_VPD(*d), 0, [ts_c, rh])
-    return xr.apply_ufunc(_inner, x.ts_c, x.rh, dask="parallelized",
-                          output_dtypes=np.float64)
+    """Calculate VPD from ts_c and rh, in double precision."""
+    return calculate_VPD(x.ts_c.astype(np.float64), x.rh.astype(np.float64))
 
 def assign_x_and_y(data_processed: xr.Dataset, dims=["j", "i"], output_dims=["x", "y"]) -> xr.Dataset:
     if 'time' in data_processed.dims:
@@ -50,6 +57,12 @@ def assign_x_and_y(data_processed: xr.Dataset, dims=["j", "i"], output_dims=["x"
         .rename_dims({'_x': output_dims[0], '_y': output_dims[1]})\
         .rename({'xb': output_dims[0], 'yb': output_dims[1]})
         # .drop(dims[0]).drop(dims[1]) # Can drop the dims here if not needed
+    # Renaming doesn't index the new dimension coordinates, which selecting
+    # cells by coordinate value needs
+    data_processed_out = data_processed_out.assign_coords(**{
+        output_dims[0]: x,
+        output_dims[1]: y,
+    })
     return data_processed_out
 
 
@@ -71,7 +84,7 @@ def process_wrfchem_data(data_processed, dims=['lon', 'lat']):
     raise NotImplementedError("process_wrfchem_data not implemented")
     data_processed = data_processed.assign(hr=lambda d: d.XTIME.dt.hour)
     data_processed = data_processed.assign(
-        dd=lambda d: d.time.dt.strftime('%j').astype(int))
+        dd=lambda d: d.time.dt.dayofyear)
     data_processed = data_processed.assign(ts_c=lambda d: d.T2 - 273.15)
     data_processed = data_processed.assign(hd=lambda d: -d.HFX)
     data_processed = data_processed.assign(p=lambda d: d.PSFC / 1000)
@@ -116,7 +129,7 @@ def process_wrfchem_data(data_processed, dims=['lon', 'lat']):
 def process_emep_data(data_processed):
     data_processed = data_processed.assign(hr=lambda d: d.time.dt.hour)
     data_processed = data_processed.assign(
-        dd=lambda d: d.time.dt.strftime('%j').astype(int))
+        dd=lambda d: d.time.dt.dayofyear)
     data_processed = data_processed.assign(ts_c=lambda d: d.t2m - 273.15)
     data_processed = data_processed.assign(hd=lambda d: -d.SH_Wm2)
     data_processed = data_processed.assign(rh=lambda d: d.rh2m/100)
@@ -182,6 +195,370 @@ def load_and_process(
     assert data_processed_indexed[output_dims[1]] is not None, f"{output_dims[1]} not found in processed input data"
     return data_processed_indexed
 
+def select_cells(
+    data: xr.Dataset,
+    coords: List[Tuple[int, int]],
+    output_dims: List[str]=['x', 'y'],
+) -> xr.Dataset:
+    """Select only the cells of the data needed to run a batch of coords.
+
+    Parameters
+    ----------
+    data : xr.Dataset
+        Processed input data, indexed by output_dims (see :func:`assign_x_and_y`),
+        or cells already selected by this function
+    coords : List[Tuple[int, int]]
+        Batch of coordinates, which may be padded with INVALID_COORD
+    output_dims : List[str], optional
+        The names of the grid dimensions, by default ['x', 'y']
+
+    Returns
+    -------
+    xr.Dataset
+        The data of each of the coords along a new "cell" dimension, in the
+        order of coords, with their (x, y) labels as cell coordinates. Cells
+        are picked out with one vectorised isel, so no other cells are read,
+        and the data is not loaded if it is lazy.
+    """
+    coords = np.asarray(coords).reshape(-1, 2)
+    coords = coords[(coords != INVALID_COORD).any(axis=1)]
+    if 'cell' in data.dims:
+        cell_index = pd.MultiIndex.from_arrays([data[d].values for d in output_dims])
+        positions = {'cell': cell_index.get_indexer(pd.MultiIndex.from_arrays(coords.T))}
+    else:
+        positions = {d: data.get_index(d).get_indexer(coords[:, i])
+                     for i, d in enumerate(output_dims)}
+    missing = np.any([p < 0 for p in positions.values()], axis=0)
+    if missing.any():
+        raise KeyError(f"coords are not in the input data: {coords[missing].tolist()}")
+    return data.isel(**{d: xr.DataArray(p, dims='cell') for d, p in positions.items()})
+
+
+class CellBlock:
+    """Input data for a set of cells as one contiguous block of rows.
+
+    The data is materialised once as a float64 array of shape (cell, row,
+    field), so the input rows of a cell are a contiguous (row, field) block
+    of it, which is handed to the model as it is. The rows and fields are
+    those of ``data.isel(cell=i).to_dataframe()``.
+
+    Parameters
+    ----------
+    data : xr.Dataset
+        Processed input data for each cell, from :func:`select_cells`
+    output_dims : List[str], optional
+        The names of the grid dimensions, by default ['x', 'y']
+    """
+
+    def __init__(self, data: xr.Dataset, output_dims: List[str]=['x', 'y']):
+        row_dims = [d for d in data.dims if d != 'cell']
+        # Use the same fields, in the same order, as a single cell's dataframe
+        first_row = data.isel(cell=0, **{d: slice(0, 1) for d in row_dims})
+        self.fields = list(first_row.to_dataframe().columns)
+        self.row_index = data.get_index(row_dims[0]) if len(row_dims) == 1 \
+            else pd.MultiIndex.from_product([data.get_index(d) for d in row_dims], names=row_dims)
+        self.cells = dict((cell, i) for i, cell in enumerate(
+            zip(*(data[d].values.tolist() for d in output_dims))))
+
+        dims = ['cell', *row_dims]
+        sizes = {d: data.sizes[d] for d in dims}
+        self.values = np.empty((sizes['cell'], len(self.row_index), len(self.fields)),
+                               dtype=np.float64)
+        # Per-cell values (e.g. lat and lon) are also kept as arrays by cell
+        self.cell_values = {}
+        for j, f in enumerate(self.fields):
+            variable = data[f].variable
+            if not set(variable.dims) & set(row_dims):
+                self.cell_values[f] = variable.set_dims({'cell': sizes['cell']}).values
+            self.values[:, :, j] = variable.set_dims(sizes).transpose(*dims).values \
+                .reshape(self.values.shape[:2])
+
+    def rows(self, x, y) -> np.ndarray:
+        """Get the (row, field) input data of a cell, a view of the block."""
+        return self.values[self.cells[x, y]]
+
+    def frame(self, x, y) -> pd.DataFrame:
+        """Get a copy of the input data of a cell as a dataframe (of float64
+        values), which can be changed without changing the block."""
+        return pd.DataFrame(self.rows(x, y), index=self.row_index, columns=self.fields,
+                            copy=True)
+
+    def cell_value(self, field, x, y):
+        """Get the value of a field which is the same for every row of a cell."""
+        return self.cell_values[field][self.cells[x, y]].tolist()
+
+
+class FullOutputWriter:
+    """Write the full outputs of grid cells into one NetCDF file.
+
+    Each output field is stored as an (x, y, date) variable, chunked so that
+    each cell's values are one contiguous chunk, and written as soon as the
+    cell has been run. Values that are the same for every date of a cell
+    (e.g. lat and lon) are stored as (x, y) variables. Cells that are not
+    written are left as fill values.
+
+    The file is created when the first cell is written, as its dates (from
+    the dd and hr outputs) set the date axis. All cells must have the same
+    dates.
+
+    Parameters
+    ----------
+    path : Path
+        NetCDF file to write
+    x_values, y_values : np.ndarray
+        Coordinate values of the whole grid
+    output_fields : List[str]
+        Output fields to save
+    zero_year : int
+        Year of the first day of the simulation
+    output_dims : List[str], optional
+        The names of the grid dimensions, by default ['x', 'y']
+    append : bool, optional
+        If true and path already exists, write cells into the existing file
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        x_values: np.ndarray,
+        y_values: np.ndarray,
+        output_fields: List[str],
+        zero_year: int,
+        output_dims: List[str]=['x', 'y'],
+        append: bool = False,
+    ):
+        self.path = path
+        self.append = append
+        self.x_index = pd.Index(x_values)
+        self.y_index = pd.Index(y_values)
+        self.output_fields = list(output_fields)
+        self.zero_year = zero_year
+        self.output_dims = output_dims
+        self.dates = None
+        self.nc = None
+
+    def _create_variable(self, name, dtype, dims, **kwargs):
+        dtype = np.dtype(dtype)
+        if dtype == bool:
+            variable = self.nc.createVariable(name, 'i1', dims, **kwargs)
+            variable.setncattr('dtype', 'bool')
+        else:
+            from netCDF4 import default_fillvals
+            fill_value = np.nan if dtype.kind == 'f' else default_fillvals[dtype.str[1:]]
+            variable = self.nc.createVariable(name, dtype, dims, fill_value=fill_value, **kwargs)
+        return variable
+
+    def _create(self, dates, columns, cell_values):
+        import netCDF4
+        if self.append and os.path.exists(self.path):
+            self.nc = netCDF4.Dataset(self.path, 'a')
+            self.dates = self.nc['date'][:]
+            return
+        x_dim, y_dim = self.output_dims
+        self.nc = netCDF4.Dataset(self.path, 'w')
+        self.nc.createDimension(x_dim, len(self.x_index))
+        self.nc.createDimension(y_dim, len(self.y_index))
+        self.nc.createDimension('date', len(dates))
+        for dim, index in ((x_dim, self.x_index), (y_dim, self.y_index)):
+            self.nc.createVariable(dim, index.dtype, (dim,))[:] = index.values
+        date = self.nc.createVariable('date', 'i8', ('date',))
+        date.units = f'hours since {self.zero_year}-01-01'
+        date.calendar = 'proleptic_gregorian'
+        date[:] = dates
+        for f in self.output_fields:
+            self._create_variable(f, columns[f].dtype, (x_dim, y_dim, 'date'),
+                                  chunksizes=(1, 1, len(dates)), zlib=True)
+        for f, value in cell_values.items():
+            self._create_variable(f, np.asarray(value).dtype, (x_dim, y_dim))
+        self.dates = dates
+
+    def _write(self, x, y, dates, columns, cell_values):
+        if self.nc is None:
+            self._create(dates, columns, cell_values)
+        elif not np.array_equal(dates, self.dates):
+            raise ValueError(f"Outputs for coords {x}_{y} do not have the same dates as other cells")
+        i = self.x_index.get_loc(x)
+        j = self.y_index.get_loc(y)
+        for f in self.output_fields:
+            self.nc[f][i, j, :] = columns[f].astype(np.int8) \
+                if columns[f].dtype == bool else columns[f]
+        for f, value in cell_values.items():
+            self.nc[f][i, j] = value
+
+    def write(self, x, y, output: Resultset, cell_values: Dict[str, any] = {}):
+        """Write the outputs of a cell.
+
+        Parameters
+        ----------
+        x, y : int
+            Coordinate values of the cell
+        output : Resultset
+            Model outputs for the cell, including dd and hr
+        cell_values : Dict[str, any], optional
+            Other values for the cell
+        """
+        dates = (output.columns['dd'].astype(np.int64) - 1) * 24 + output.columns['hr']
+        self._write(x, y, dates, output.columns, cell_values)
+
+    def write_from(self, path: Path, coords: List[Tuple[int, int]]):
+        """Copy the outputs of coords from another file written by a FullOutputWriter."""
+        import netCDF4
+        with netCDF4.Dataset(path) as src:
+            src.set_auto_mask(False)
+            x_index = pd.Index(src[self.output_dims[0]][:])
+            y_index = pd.Index(src[self.output_dims[1]][:])
+            cell_fields = [f for f, v in src.variables.items() if v.dimensions == tuple(self.output_dims)]
+
+            def _read(variable, i, j):
+                value = variable[i, j]
+                return value.astype(bool) if 'dtype' in variable.ncattrs() \
+                    and variable.getncattr('dtype') == 'bool' else value
+
+            for x, y in coords:
+                if x == INVALID_COORD and y == INVALID_COORD:
+                    continue
+                i = x_index.get_loc(x)
+                j = y_index.get_loc(y)
+                self._write(
+                    x, y, src['date'][:],
+                    {f: _read(src[f], i, j) for f in self.output_fields},
+                    {f: _read(src[f], i, j) for f in cell_fields},
+                )
+
+    def sync(self):
+        """Make sure everything written so far is saved to disk."""
+        if self.nc is not None:
+            self.nc.sync()
+
+    def close(self):
+        if self.nc is not None:
+            self.nc.close()
+
+
+class RunManifest:
+    """Record of the completed batches of a grid run, used to resume it.
+
+    The manifest is saved as JSON, replacing the previous file atomically, so
+    it always records a consistent set of completed batches.
+
+    Parameters
+    ----------
+    path : Path
+        Manifest file location
+    run_hash : str, optional
+        Hash of the run's settings and cells, see :func:`get_run_hash`
+    """
+
+    def __init__(self, path: Path, run_hash: str = None):
+        self.path = path
+        self.run_hash = run_hash
+        self.batches = {}
+
+    @classmethod
+    def load(cls, path: Path, run_hash: str = None) -> 'RunManifest':
+        """Load a manifest, or start a new one if path doesn't exist.
+
+        Raises a ValueError if the manifest was saved by a run with a
+        different run_hash, as its completed cells don't belong to this run.
+        """
+        manifest = cls(path, run_hash)
+        if os.path.exists(path):
+            with open(path) as manifest_file:
+                saved = json.load(manifest_file)
+            if saved.get("run_hash") != run_hash:
+                raise ValueError(
+                    f"Cannot resume from {path}, it was saved by a run with "
+                    "different configs, coords or mask")
+            manifest.batches = {
+                int(k): [tuple(c) for c in v]
+                for k, v in saved["batches"].items()}
+        return manifest
+
+    @property
+    def completed_cells(self) -> set:
+        return set(c for cells in self.batches.values() for c in cells)
+
+    @property
+    def next_batch_id(self) -> int:
+        return max(self.batches, default=-1) + 1
+
+    def add_batch(self, batch_id: int, coords: List[Tuple[int, int]]):
+        """Record the coords completed by a batch and save the manifest."""
+        self.batches[batch_id] = [
+            (int(x), int(y)) for x, y in coords
+            if not (x == INVALID_COORD and y == INVALID_COORD)]
+        self.save()
+
+    def save(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as manifest_file:
+            json.dump({"run_hash": self.run_hash, "batches": self.batches}, manifest_file)
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def get_run_hash(
+    project_file: Union[Path, List[Path], Dict[str, Path]],
+    coords: np.ndarray,
+    mask_field: str = None,
+    mask_path: Path = None,
+    **settings,
+) -> str:
+    """Get a hash identifying a grid run, to check a resumed run matches it.
+
+    The hash covers the contents of the project files, the coords to run
+    after masking (in any order), the mask and any other *settings* that
+    change the outputs. *settings* must be JSON serialisable or have a str
+    that identifies them.
+    """
+    digest = hashlib.sha1()
+    configs = {}
+    for config_id, config_file in get_project_configs(project_file).items():
+        with open(config_file, 'rb') as f:
+            configs[str(config_id)] = hashlib.sha1(f.read()).hexdigest()
+    digest.update(json.dumps([
+        configs, mask_field, mask_path, settings,
+    ], sort_keys=True, default=str).encode())
+    coords = np.unique(np.asarray(coords).reshape(-1, 2), axis=0)
+    digest.update(str(coords.dtype).encode())
+    digest.update(np.ascontiguousarray(coords))
+    return digest.hexdigest()
+
+
+def get_project_configs(
+    project_file: Union[Path, List[Path], Dict[str, Path]],
+) -> Dict[str, Path]:
+    """Get the project files to run for each cell, keyed by config id.
+
+    Parameters
+    ----------
+    project_file : Union[Path, List[Path], Dict[str, Path]]
+        A single project file, a list of project files, which are identified
+        by their file names without extension, or a dictionary of config ids
+        to project files
+
+    Returns
+    -------
+    Dict[str, Path]
+        The project files keyed by config id. A single project file has the
+        config id None.
+    """
+    if isinstance(project_file, (str, os.PathLike)):
+        return {None: project_file}
+    if isinstance(project_file, dict):
+        return dict(project_file)
+    configs = {os.path.splitext(os.path.basename(p))[0]: p for p in project_file}
+    if len(configs) != len(project_file):
+        raise ValueError("Each project file must have a different file name")
+    return configs
+
+
+def config_file_suffix(config_id: str) -> str:
+    """Suffix added to output file names for outputs of config_id."""
+    return f'_{config_id}' if config_id is not None else ''
+
+
 def get_coord_batches(
     coords, target_batch_size=1000, logger=print,
     data_computed=None):
@@ -193,7 +570,7 @@ def get_coord_batches(
         List of tuples of (x, y) coordinates
     """
 
-    if coords == "all":
+    if isinstance(coords, str) and coords == "all":
         if data_computed is None:
             raise ValueError("data_computed must be provided if coords is 'all'")
         coords = np.array(list(zip(data_computed.x.values.flatten(),data_computed.y.values.flatten())))
@@ -207,6 +584,116 @@ def get_coord_batches(
     return coords_batches
 
 
+def get_chunk_bounds(
+    data: xr.Dataset,
+    output_dims: List[str]=['x', 'y'],
+) -> List[np.ndarray]:
+    """Get the index of the first row/column of each chunk of the grid.
+
+    Chunks are taken from the dask chunking of the data or, if it isn't
+    chunked, the internal chunking of the NetCDF files it was read from. If
+    neither is available the grid is one chunk.
+
+    Parameters
+    ----------
+    data : xr.Dataset
+        Processed input data, indexed by output_dims
+    output_dims : List[str], optional
+        The names of the grid dimensions, by default ['x', 'y']
+
+    Returns
+    -------
+    List[np.ndarray]
+        For each output dim the start of each chunk followed by the dim size
+    """
+    grid_vars = [v for v in data.data_vars.values()
+                 if output_dims[0] in v.dims and output_dims[1] in v.dims]
+    bounds = []
+    for dim in output_dims:
+        size = data.sizes[dim]
+        chunk_sizes = None
+        for v in grid_vars:
+            if v.chunks is not None:
+                chunk_sizes = v.chunks[v.dims.index(dim)]
+                break
+        else:
+            for v in grid_vars:
+                if v.encoding.get('chunksizes'):
+                    chunk = v.encoding['chunksizes'][v.dims.index(dim)]
+                    chunk_sizes = [chunk] * (size // chunk) + ([size % chunk] if size % chunk else [])
+                    break
+        bounds.append(np.cumsum([0, *(chunk_sizes or [size])]))
+    return bounds
+
+
+def get_tile_batches(
+    coords: List[Tuple[int, int]],
+    data: xr.Dataset,
+    output_dims: List[str]=['x', 'y'],
+    target_batch_size: int = 1000,
+    logger=print,
+    first_batch_id: int = 0,
+) -> List[np.ndarray]:
+    """Get batches of coordinates aligned with the chunks of the input data.
+
+    Cells are grouped into tiles, the cells in each chunk of the grid (see
+    :func:`get_chunk_bounds`). Tiles are never split between batches, and a
+    batch only contains tiles in the same row of chunks, so
+    selecting a batch's cells (see :func:`select_cells`) reads each chunk once
+    in the whole run. Tiles are added to a batch until it has at least
+    target_batch_size cells.
+
+    Parameters
+    ----------
+    coords : List[Tuple[int, int]]
+        The (x, y) coordinates to run
+    data : xr.Dataset
+        Processed input data, indexed by output_dims
+    output_dims : List[str], optional
+        The names of the grid dimensions, by default ['x', 'y']
+    target_batch_size : int, optional
+        Minimum number of cells in a batch of more than one tile, by default 1000
+    logger : optional
+        by default print
+    first_batch_id : int, optional
+        Id of the first batch, used when logging the chunks of each batch
+
+    Returns
+    -------
+    List[np.ndarray]
+        List of batches of (x, y) coordinates
+    """
+    coords = np.asarray(coords).reshape(-1, 2)
+    bounds = get_chunk_bounds(data, output_dims)
+    positions = [data.indexes[dim].get_indexer(coords[:, i]) for i, dim in enumerate(output_dims)]
+    if any((p < 0).any() for p in positions):
+        raise ValueError("coords are not all in the input data")
+    tiles = np.stack([np.searchsorted(b, p, side='right') - 1 for b, p in zip(bounds, positions)], axis=1)
+
+    order = np.lexsort((tiles[:, 1], tiles[:, 0]))
+    tile_ids, tile_starts = np.unique(tiles[order], axis=0, return_index=True)
+    tile_coords = np.split(coords[order], tile_starts[1:])
+    logger(f"===total cells: {len(coords)} in {len(tile_ids)} tiles, grid chunks {output_dims[0]}: {len(bounds[0]) - 1} x {output_dims[1]}: {len(bounds[1]) - 1}")
+
+    batches = []
+    batch_tiles = []
+    for tile_id, tile in zip(tile_ids, tile_coords):
+        if batch_tiles and (
+                tile_id[0] != batch_tiles[-1][0][0]
+                or sum(len(t) for _, t in batch_tiles) >= target_batch_size):
+            batches.append(batch_tiles)
+            batch_tiles = []
+        batch_tiles.append((tile_id, tile))
+    if batch_tiles:
+        batches.append(batch_tiles)
+
+    for batch_id, batch_tiles in enumerate(batches, start=first_batch_id):
+        y_chunks = [int(tile_id[1]) for tile_id, _ in batch_tiles]
+        logger(f"===batch {batch_id}: {sum(len(t) for _, t in batch_tiles)} cells from "
+               f"{output_dims[0]} chunk {batch_tiles[0][0][0]}, {output_dims[1]} chunks {y_chunks}")
+    return [np.concatenate([t for _, t in batch_tiles]) for batch_tiles in batches]
+
+
 out_fields = [
     'dd', 'hr',
     'ts_c', 'p', 'o3_ppb_zr', 'precip', 'hd', 'uh_zr', 'vpd', 'cloudfrac',
@@ -217,6 +704,37 @@ out_fields = [
 ]
 
 
+def mask_coords(
+    coords: List[Tuple[int, int]],
+    mask: xr.DataArray,
+    output_dims: List[str]=['x', 'y'],
+) -> np.ndarray:
+    """Remove coords that are not valid cells in mask.
+
+    Parameters
+    ----------
+    coords : List[Tuple[int, int]]
+        The (x, y) coordinates to run
+    mask : xr.DataArray
+        Grid of cells to run, indexed by output_dims. Cells that are zero,
+        false or missing (NaN) in mask, or outside of it, are not run
+    output_dims : List[str], optional
+        The names of the grid dimensions, by default ['x', 'y']
+
+    Returns
+    -------
+    np.ndarray
+        The coords of valid cells
+    """
+    coords = np.asarray(coords).reshape(-1, 2)
+    positions = [mask.indexes[dim].get_indexer(coords[:, i]) for i, dim in enumerate(output_dims)]
+    inside = (positions[0] >= 0) & (positions[1] >= 0)
+    values = mask.transpose(*output_dims).values[positions[0][inside], positions[1][inside]]
+    valid = np.zeros(len(coords), dtype=bool)
+    valid[inside] = pd.notnull(values) & (values != 0)
+    return coords[valid]
+
+
 def get_config_overrides_from_estate(
     location_data: xr.Dataset,
     e_state_overrides_fields: Dict[str, str],
@@ -226,7 +744,8 @@ def get_config_overrides_from_estate(
     Parameters
     ----------
     location_data : xr.Dataset
-        Dataset containing estate overrides
+        Dataset containing estate overrides for a cell, or a mapping of field
+        to value (see :func:`e_state_lookup`)
     e_state_overrides_fields : Dict[str, str]
         Mapping of estate overrides fields to config overrides
 
@@ -239,12 +758,76 @@ def get_config_overrides_from_estate(
     for estate_field, config_field in e_state_overrides_fields.items():
         if estate_field in location_data:
             # TODO: handle sometimes location data has time dimension
-            config_overrides[config_field] = float(location_data[estate_field].values)
+            config_overrides[config_field] = float(np.asarray(location_data[estate_field]))
         else:
             warn(f"Warning: {estate_field} not found in estate overrides file")
     return config_overrides
 
-def process_output_for_pod(results):
+def e_state_lookup(
+    e_state_overrides: xr.Dataset,
+    fields: List[str],
+    output_dims: List[str]=['x', 'y'],
+) -> Callable[[int, int], Dict[str, any]]:
+    """Create a lookup of e_state_overrides values by cell.
+
+    The values of each of the fields are loaded once into a dense
+    (x, y) array, so looking up a cell is a direct index rather than a
+    search of the whole grid.
+
+    Parameters
+    ----------
+    e_state_overrides : xr.Dataset
+        estate overrides data with output_dims coordinates
+    fields : List[str]
+        Fields (variables or coordinates) to look up. Fields not in
+        e_state_overrides are left out of the lookup results.
+    output_dims : List[str], optional
+        The names of the grid dimensions, by default ['x', 'y']
+
+    Returns
+    -------
+    Callable[[int, int], Dict[str, any]]
+        Function taking the (x, y) coordinate values of a cell and returning
+        a dict of field to value for that cell
+    """
+    x_index = pd.Index(e_state_overrides[output_dims[0]].values)
+    y_index = pd.Index(e_state_overrides[output_dims[1]].values)
+    tables = {
+        f: e_state_overrides[f].transpose(*output_dims, ...).values
+        for f in dict.fromkeys(fields) if f in e_state_overrides
+    }
+
+    def _lookup(x, y):
+        i = x_index.get_loc(x)
+        j = y_index.get_loc(y)
+        return {f: table[i, j] for f, table in tables.items()}
+    return _lookup
+
+
+def uses_outputs(fields: List[str], final_only: bool = False):
+    """Declare which model outputs a process_output function reads.
+
+    When the full outputs are not being saved the runner only extracts
+    *fields* from the model, and only the end-of-run values if *final_only*
+    is True.  process_output functions without this declaration are given all
+    of the outputs for every hour.
+
+    Parameters
+    ----------
+    fields : List[str]
+        Output fields read by the decorated function
+    final_only : bool, optional
+        If true the decorated function only reads the last row of the results
+    """
+    def _decorator(func):
+        func.output_fields = list(fields)
+        func.final_only = final_only
+        return func
+    return _decorator
+
+
+@uses_outputs(['afsty', 'aot40'], final_only=True)
+def process_output_for_pod(results, **kwargs):
     """Add variables to outputs."""
     return {
         "pody": results.data[-1]['afsty'],
@@ -360,7 +943,7 @@ def process_and_run(
     return _data_prep
 
 def runner(
-    project_file_path: Path,
+    project_file_path: Union[Path, List[Path], Dict[str, Path]],
     coords: List[Tuple[int, int]],
     data_computed: xr.Dataset,
     output_fields: List[str],
@@ -375,17 +958,25 @@ def runner(
     batch_id: int = 0,
     save_ds: bool = False,
     logger=Logger(0),
+    full_output_writers: Dict[str, FullOutputWriter] = None,
+    cells_per_run: int = 1,
+    spinup: int = 0,
+    spinup_cache_dir: Path = None,
+    completed_coords: List[Tuple[int, int]] = None,
 ):
     """Run the do3se model for the given project file.
 
     Parameters
     ----------
-    project_file_path : Path
-        path to project file
+    project_file_path : Union[Path, List[Path], Dict[str, Path]]
+        path to project file, or project files to run each cell for
+        (see :func:`get_project_configs`). The input data for each cell is
+        only prepared once for all of the project files.
     coords: List[Tuple[int, int]]
         List of coordinates to run the model for
     data_computed : xr.Dataset
-        met data to run the model for
+        met data to run the model for, containing at least the coords.
+        Cells are found by their coordinate values (see :func:`select_cells`)
     e_state_overrides : xr.Dataset
         estate overrides data
     zero_year : int
@@ -402,7 +993,8 @@ def runner(
             Note sometimes the the output may need to be ['y', 'x']
             where lat=y and lon=x instead
     process_output : Callable[[], any], optional
-        Function to process outputs from the DO3SE model, by default None
+        Function to process outputs from the DO3SE model, by default None.
+        Use :func:`uses_outputs` to limit the outputs extracted for it.
     throw_exceptions: bool = False,
         If true will throw exceptions if the model fails to run
         If false failing coords will be skipped
@@ -411,9 +1003,34 @@ def runner(
     batch_id : int, optional
         batch id for currently running batch, by default 0
     save_ds : bool, optional
-        If true will combine all outputs to a netcdf file
+        If true will save all outputs to a netcdf file per config, written by
+        full_output_writers or else to
+        out_full_run_{run_id}[_{config_id}]_batch_{batch_id}.nc in output_file_path
     batch_i : int, optional
         batch index, by default 0
+    full_output_writers : Dict[str, FullOutputWriter], optional
+        Writers to save the full outputs of each config with if save_ds is true
+    cells_per_run : int, optional
+        Number of cells to run together in each call to the Fortran model, by
+        default 1 (see :func:`do3se.dataset.run_sites`). The cells must have
+        the same model options. The outputs of all of these cells are held in
+        memory at once. If a call fails and throw_exceptions is false all of
+        its cells are skipped
+    spinup : int, optional
+        Number of hours at the start of the input data to only spin up the
+        model over, e.g. for the soil water, by default 0. There are no
+        outputs for these hours
+    spinup_cache_dir : Path, optional
+        Directory to cache the model state at the end of the spin-up in, so
+        it is reused by later runs with the same config and spin-up inputs,
+        see :class:`do3se.dataset.SpinupCache`
+    completed_coords : List[Tuple[int, int]], optional
+        If given, the coords of each cell are appended to it once all of the
+        cell's outputs have been saved and processed, so failed cells aren't
+        included
+
+    When there is more than one project file each processed output includes
+    its config_id.
 
     Returns
     -------
@@ -421,139 +1038,296 @@ def runner(
         _description_
     """
     outputs = []
-    outputs_full = []
     start_time = datetime.now()
-    logger(f"Running model for {len(coords)} coords")
-    logger(f"Output dims {output_dims}")
-    for x, y in coords:
-        # NOTE: X and Y may be swapped if output_dims is ['y', 'x']
-        if x == INVALID_COORD and y == INVALID_COORD:
-            # our coords batches have to be padded to the same size
-            # so we skip the invalid coords
-            continue
-        logger(f'Running coords: {output_dims[0]}:{x} {output_dims[1]}:{y}')
+
+    # Only extract the model outputs that will be used
+    process_output_fields = getattr(process_output, 'output_fields', None) \
+        if process_output else []
+    if output_file_path is not None or process_output_fields is None:
+        run_fields = None if process_output_fields is None \
+            else list(dict.fromkeys([*output_fields, 'dd', 'hr', *process_output_fields]))
+        final_only = False
+    else:
+        run_fields = process_output_fields
+        final_only = getattr(process_output, 'final_only', False) if process_output else True
+
+    configs = get_project_configs(project_file_path)
+
+    close_writers = False
+    if save_ds and full_output_writers is None:
+        full_output_writers = {
+            config_id: FullOutputWriter(
+                f'{output_file_path}/out_full_run_{run_id}{config_file_suffix(config_id)}_batch_{batch_id}.nc',
+                np.unique(data_computed[output_dims[0]].values),
+                np.unique(data_computed[output_dims[1]].values),
+                output_fields,
+                zero_year,
+                output_dims,
+            ) for config_id in configs}
+        close_writers = True
+
+    sessions = dict()
+    spinup_cache = SpinupCache(spinup_cache_dir) if spinup else None
+    # Materialise the input data of the cells once, rather than a dataframe
+    # per cell
+    cells = CellBlock(select_cells(data_computed, coords, output_dims), output_dims)
+    get_location_data = e_state_lookup(
+        e_state_overrides,
+        ['terrain', 'lat', 'lon', *(e_state_overrides_field_map or {})],
+        output_dims,
+    )
+    options_raw = {
+        "format": output_fields,
+        "show_headers": True,
+        "reduce_output": False,
+    }
+    Options = namedtuple('Options', options_raw.keys())
+    options = Options(**options_raw)
+
+    def prepare_cell(x, y):
+        rows = cells.rows(int(x), int(y))
+        location_data = get_location_data(x, y)
+
+        elevation = location_data['terrain'].tolist()
+        lat = location_data['lat'].tolist()
+        lon = location_data['lon'].tolist()
+        input_data_lat = cells.cell_value('lat', int(x), int(y))
+        input_data_lon = cells.cell_value('lon', int(x), int(y))
+        grid_i = -1
+        grid_j = -1
         try:
-            rows_df = data_computed.isel(**{
-                output_dims[0]: int(x),
-                output_dims[1]: int(y),
-            }).to_dataframe()
-            # rows_df = data_computed.isel(x=int(x), y=int(y)).to_dataframe()
-            rows = rows_df.values
-            location_data = e_state_overrides.where(
-                lambda d: (d[output_dims[0]] == x) & (d[output_dims[1]] == y), drop=True).squeeze()
-
-            elevation = location_data.terrain.values.tolist()
-            lat = location_data.lat.values.tolist()
-            lon = location_data.lon.values.tolist()
-            input_data_lat = rows_df.lat.iloc[0]
-            input_data_lon = rows_df.lon.iloc[0]
-            grid_i = -1
-            grid_j = -1
-            try:
-                # This will only work if i and j are in the outputs of process_inputs
-                grid_i = rows_df.reset_index().i.values[0].tolist()
-                grid_j = rows_df.reset_index().j.values[0].tolist()
-            except Exception:
-                pass
-
-            logger(f"Running coords: {output_dims[0]}:{x} {output_dims[1]}:{y} with elevation: {elevation}, lat: {lat}, lon: {lon}, grid_i: {grid_i}, grid_j: {grid_j}")
-            assert lat == input_data_lat, f"input_data and e_state_overrides lat do not match, {lat} != {input_data_lat}"
-            assert lon == input_data_lon, f"input_data and e_state_overrides lon do not match, {lon} != {input_data_lon}"
-
-            additional_e_state_overrides = get_config_overrides_from_estate(
-                location_data,
-                e_state_overrides_field_map,
-            ) if e_state_overrides_field_map is not None else {}
-            logger("using the following additional config overrides from e_state_overrides.nc", additional_e_state_overrides)
-
-            input_fields = list(rows_df.columns)
-            config_overrides = {
-                "input_fields": input_fields,
+            # This will only work if i and j are in the outputs of process_inputs
+            grid_i = cells.cell_value('i', int(x), int(y))
+            grid_j = cells.cell_value('j', int(x), int(y))
+        except Exception:
+            pass
+
+        logger(f"Running coords: {output_dims[0]}:{x} {output_dims[1]}:{y} with elevation: {elevation}, lat: {lat}, lon: {lon}, grid_i: {grid_i}, grid_j: {grid_j}")
+        assert lat == input_data_lat, f"input_data and e_state_overrides lat do not match, {lat} != {input_data_lat}"
+        assert lon == input_data_lon, f"input_data and e_state_overrides lon do not match, {lon} != {input_data_lon}"
+
+        additional_e_state_overrides = get_config_overrides_from_estate(
+            location_data,
+            e_state_overrides_field_map,
+        ) if e_state_overrides_field_map is not None else {}
+        logger("using the following additional config overrides from e_state_overrides.nc", additional_e_state_overrides)
+
+        return dict(
+            x=x, y=y, rows=rows, elevation=elevation, lat=lat, lon=lon,
+            grid_i=grid_i, grid_j=grid_j,
+            config_overrides={
+                "input_fields": cells.fields,
                 "elev": elevation,
                 "lat": float(lat),
                 "lon": float(lon),
                 **additional_e_state_overrides,
-            }
-
-            options_raw = {
-                "format": output_fields,
-                "show_headers": True,
-                "reduce_output": False,
-            }
-            Options = namedtuple('Options', options_raw.keys())
-            options = Options(**options_raw)
+            },
+        )
 
+    def run_cells(group):
+        """Run the model for a group of prepared cells, for each config."""
+        input_fields = cells.fields
+        results = dict()
+        for config_id, config_file in configs.items():
+            for cell in group:
+                logger("Running do3se on coords: ", cell['x'], cell['y'], *([config_id] if config_id is not None else []))
+
+            # The project is only loaded once for all cells with the same inputs
+            session = sessions.get((config_id, tuple(input_fields)))
+            if session is None:
+                session = ModelSession(config_file, input_fields, input_fields)
+                sessions[(config_id, tuple(input_fields))] = session
+
+            datasets = [session.dataset(cell['rows'], cell['config_overrides'])
+                        for cell in group]
+            results[config_id] = list(zip(
+                run_sites(datasets, fields=run_fields, final_only=final_only,
+                          spinup=spinup, spinup_cache=spinup_cache),
+                datasets))
+        return results
+
+    def save_cell(cell, results, i):
+        """Save and process the outputs of the *i*th cell of a group."""
+        x, y = cell['x'], cell['y']
+        for config_id in configs:
+            output, dataset_processed = results[config_id][i]
             # If save_ds is false then we save each run to a separate csv file
-            output_file = open(
-                f'{output_file_path}/{run_id}_{x}_{y}.csv', 'w') \
-                if output_file_path is not None and not save_ds else None
-            logger("Running do3se on coords: ", x, y)
-
-            runner_int = run_from_pipe(
-                options,
-                project_file_path,
-                input_fields,
-                output_file=output_file,
-                headings=input_fields,
-            )
-
-            output, dataset_processed = runner_int(rows, config_overrides)
-            if output_file:
+            if output_file_path is not None and not save_ds:
+                with open(f'{output_file_path}/{run_id}{config_file_suffix(config_id)}_{x}_{y}.csv', 'w') as output_file:
+                    output.save(output_file, options.format, options.show_headers)
                 logger("Runner output saved to", output_file_path, "for coords", x, y)
 
             if save_ds:
                 logger("Saving ds output for coords", x, y)
-                # TODO: Can we skip dataframe here?
-                df = pd.DataFrame(output.data)
-                df = df[output_fields] # filter to output fields
-                df[output_dims[0]] = x
-                df[output_dims[1]] = y
-                df['i_old'] = x + 1 # retained for backwards compatibility
-                df['j_old'] = y + 1 # retained for backwards compatibility
-                df['grid_i'] = grid_i
-                df['grid_j'] = grid_j
-                df['lat'] = float(lat)
-                df['lon'] = float(lon)
-                zero_date = pd.to_datetime(f'{zero_year}-01-01')
-                df['date'] = zero_date + \
-                    pd.to_timedelta(df.dd-1, unit='D') + \
-                    pd.to_timedelta(df.hr, unit='h')
-                df = df.set_index([output_dims[0], output_dims[1], 'date'])
-                ds = df.to_xarray()
-                outputs_full.append(ds)
+                full_output_writers[config_id].write(x, y, output, {
+                    'i_old': x + 1, # retained for backwards compatibility
+                    'j_old': y + 1, # retained for backwards compatibility
+                    'grid_i': cell['grid_i'],
+                    'grid_j': cell['grid_j'],
+                    'lat': float(cell['lat']),
+                    'lon': float(cell['lon']),
+                })
 
             if process_output:
                 logger("Processing output for coords", x, y)
-                output_processed = process_output(output, input_data_df=rows_df, options=options, x=x, y=y, config_processed=dataset_processed.params)
+                output_processed = process_output(output, input_data_df=cells.frame(int(x), int(y)).iloc[spinup:], options=options, x=x, y=y, config_processed=dataset_processed.params)
                 outputs.append({
                     **output_processed,
-                    "lat": lat,
-                    "lon": lon,
-                    "elev": elevation,
+                    **({"config_id": config_id} if config_id is not None else {}),
+                    "lat": cell['lat'],
+                    "lon": cell['lon'],
+                    "elev": cell['elevation'],
                     output_dims[0]: x,
                     output_dims[1]: y,
-                    "grid_i": grid_i,
-                    "grid_j": grid_j,
+                    "grid_i": cell['grid_i'],
+                    "grid_j": cell['grid_j'],
                 })
+
+    def failed(e, group):
+        if throw_exceptions:
+            raise e
+        logger(e)
+        for cell in group:
+            logger(f'Failed to run coords: {cell["x"]}_{cell["y"]}')
+
+    logger(f"Running model for {len(coords)} coords")
+    logger(f"Output dims {output_dims}")
+    # NOTE: X and Y may be swapped if output_dims is ['y', 'x']
+    # our coords batches have to be padded to the same size
+    # so we skip the invalid coords
+    valid_coords = [(x, y) for x, y in coords
+                    if not (x == INVALID_COORD and y == INVALID_COORD)]
+    cells_per_run = max(int(cells_per_run), 1)
+    for start in range(0, len(valid_coords), cells_per_run):
+        group = []
+        for x, y in valid_coords[start:start + cells_per_run]:
+            logger(f'Running coords: {output_dims[0]}:{x} {output_dims[1]}:{y}')
+            try:
+                group.append(prepare_cell(x, y))
+            except Exception as e:
+                failed(e, [dict(x=x, y=y)])
+        if not group:
+            continue
+
+        try:
+            results = run_cells(group)
         except Exception as e:
-            if throw_exceptions:
-                raise e
-            else:
-                logger(e)
-                logger(f'Failed to run coords: {x}_{y}')
-        output_file and output_file.close()
+            failed(e, group)
+            continue
+
+        for i, cell in enumerate(group):
+            try:
+                save_cell(cell, results, i)
+            except Exception as e:
+                failed(e, [cell])
+                continue
+            if completed_coords is not None:
+                completed_coords.append((cell['x'], cell['y']))
     end_time = datetime.now()
     logger(f"Completed running batch. Model time: {end_time - start_time}")
-    if save_ds:
-        logger("Saving full ds output")
-        ds_full = xr.merge(outputs_full)
-        ds_full.to_netcdf(f'{output_file_path}/out_full_run_{run_id}_batch_{batch_id}.nc')
+    if close_writers:
+        for full_output_writer in full_output_writers.values():
+            full_output_writer.close()
 
     return outputs
 
+def save_dataset_arrays(ds: xr.Dataset, path: Path) -> dict:
+    """Save each variable of a dataset to its own .npy file.
+
+    This lets other processes memory-map the data with
+    :func:`load_dataset_arrays` instead of it being pickled to them.
+
+    Parameters
+    ----------
+    ds : xr.Dataset
+        The (loaded) dataset to save
+    path : Path
+        Directory to save the arrays to
+
+    Returns
+    -------
+    dict
+        Description of the saved dataset to pass to load_dataset_arrays
+    """
+    os.makedirs(path, exist_ok=True)
+    variables = {}
+    for i, (name, variable) in enumerate(ds.variables.items()):
+        file_path = os.path.join(path, f'{i}.npy')
+        np.save(file_path, variable.values)
+        variables[name] = (variable.dims, file_path, variable.attrs)
+    return {
+        "variables": variables,
+        "coords": [c for c in ds.coords if c not in ds.dims],
+        "attrs": ds.attrs,
+    }
+
+
+def load_dataset_arrays(spec: dict) -> xr.Dataset:
+    """Load a dataset saved by :func:`save_dataset_arrays`.
+
+    Numeric arrays are memory-mapped rather than read.
+    """
+    def _load(file_path):
+        try:
+            return np.load(file_path, mmap_mode='r')
+        except ValueError:
+            # Object arrays can't be memory-mapped
+            return np.load(file_path, allow_pickle=True)
+
+    return xr.Dataset({
+        name: (dims, _load(file_path), attrs)
+        for name, (dims, file_path, attrs) in spec["variables"].items()
+    }, attrs=spec["attrs"]).set_coords(spec["coords"])
+
+
+_worker_logger = None
+
+
+def worker_log_file(log_file: Path, pid: int) -> str:
+    """Get the log file of the worker process with the given pid.
+
+    e.g. log_run.txt -> log_run_worker_1234.txt
+    """
+    root, ext = os.path.splitext(log_file)
+    return f'{root}_worker_{pid}{ext}'
+
+
+def _init_worker(log_options):
+    """Set up the logger of a worker process.
+
+    Each worker logs to its own file (see :func:`worker_log_file`) rather
+    than appending to the parent's log file.
+    """
+    global _worker_logger
+    log_to_file = log_options['log_to_file']
+    _worker_logger = Logger(**dict(
+        log_options,
+        log_to_file=log_to_file and worker_log_file(log_to_file, os.getpid()),
+    ))
+
+
+def _run_batch_in_worker(data_spec, e_state_spec, runner_kwargs):
+    """Run :func:`runner` on a batch of memory-mapped data in a worker process.
+
+    Returns the runner's outputs and the coords it completed.
+    """
+    completed_coords = []
+    try:
+        outputs = runner(
+            data_computed=load_dataset_arrays(data_spec),
+            e_state_overrides=load_dataset_arrays(e_state_spec),
+            logger=_worker_logger,
+            completed_coords=completed_coords,
+            **runner_kwargs,
+        )
+        return outputs, completed_coords
+    finally:
+        _worker_logger.flush()
+
+
 def gridrun(
     run_id: str,
-    project_file: Path,
+    project_file: Union[Path, List[Path], Dict[str, Path]],
     input_data_dir: Path,
     output_location: Path,
     zero_year: int,
@@ -571,6 +1345,14 @@ def gridrun(
     target_batch_size: int = None,
     loadData_kwargs: dict = {},
     debug: bool = False,
+    workers: int = None,
+    resume: bool = False,
+    chunk_aligned_batches: bool = True,
+    mask_field: str = None,
+    mask_path: Path = None,
+    cells_per_run: int = 1,
+    spinup: int = 0,
+    spinup_cache_dir: Path = None,
 ):
     """Internal do3se run function
 
@@ -578,8 +1360,12 @@ def gridrun(
     ----------
     run_id : str
         A user assigned run id which can be used to identify each run.
-    project_file : Path
-        the path to the do3se project file(Config file)
+    project_file : Union[Path, List[Path], Dict[str, Path]]
+        the path to the do3se project file(Config file). If given several
+        project files (e.g. for multiple cultivars) each is run for every cell
+        using the same loaded input data, see :func:`get_project_configs`.
+        The outputs of each config then include its config_id, and full
+        outputs are saved to files suffixed with the config_id.
     input_data_dir : Path
         Path to input data directory. This should contain the wrfchem output files.
     output_location : Path
@@ -610,7 +1396,8 @@ def gridrun(
     output_fields: List[str]
         The fields to output from the model. Run list_outputs to see options
     save_ds : bool
-        If true, save the full output dataset to a netcdf file.
+        If true, save the full output dataset to one netcdf file,
+        out_full_run_{run_id}.nc, written as each cell finishes.
     save_full_outputs : bool
         If true, save the full output from each run to csv files
     target_batch_size : int
@@ -619,6 +1406,42 @@ def gridrun(
         kwargs to pass to the loadData function
     debug : bool
         Run in debug mode
+    workers : int
+        Number of processes to run coordinate batches in, by default the
+        batches are run one after another in this process. Each batch's input
+        data is passed to its worker through memory-mapped files, and at most
+        two batches per worker are loaded ahead of the results. Each worker
+        logs to its own file next to the run's log. If target_batch_size is
+        None the coords are split into a batch per worker.
+    resume : bool
+        Resume a run that was stopped. The cells completed by each batch are
+        recorded in manifest_{run_id}.json in output_location, and when
+        resuming only cells not recorded there are run. The manifest also
+        records a hash of the project files, coords, mask and other settings
+        of the run (see :func:`get_run_hash`), and a run with a different
+        hash can't be resumed from it.
+    chunk_aligned_batches : bool
+        If true, batches are made of whole chunks of the input data so that
+        each chunk is only read once, see :func:`get_tile_batches`.
+        target_batch_size is then the minimum size of a batch of several
+        chunks. If false, coords are split into equal batches in order.
+    mask_field : str
+        Variable of the e_state_overrides file, or of mask_path if given,
+        marking the cells to run (e.g. a land mask). Coords where it is zero,
+        false or missing are skipped before batching, see :func:`mask_coords`.
+    mask_path : Path
+        NetCDF file containing mask_field, with the same grid as the
+        e_state_overrides file.
+    cells_per_run : int
+        Number of cells of a batch to run in each call to the Fortran model,
+        see :func:`runner`.
+    spinup : int
+        Number of hours at the start of the input data to spin up the model
+        over before the outputs start, see :func:`runner`.
+    spinup_cache_dir : Path
+        Directory to cache end of spin-up model states in. The spin-up is not
+        run again for cells with the same config and spin-up inputs, e.g. when
+        only the ozone after the spin-up or the outputs change.
 
     Returns
     -------
@@ -651,44 +1474,172 @@ def gridrun(
     if full_output_dir:
         os.makedirs(full_output_dir, exist_ok=True)
 
-    coordinate_batches = get_coord_batches(
-        coords, target_batch_size=target_batch_size, logger=logger)
-
-
-    for batch_i, coord_batch in enumerate(coordinate_batches):
-        logger(f"===batch_i: {batch_i}")
-
-        data_computed, e_state_overrides = setup(
-            coords=coord_batch,
-            dims=dims,
-            output_dims=output_dims,
-            preprocess_data_func=preprocess_data_func,
-            precompute=loadData_kwargs.pop('precompute', False),
-            loadData_kwargs=loadData_kwargs,
-            logger=logger,
-        )
+    # The input files are opened and preprocessed once, lazily, and only the
+    # cells needed for each batch are loaded
+    loadData_kwargs = dict(loadData_kwargs)
+    precompute = loadData_kwargs.pop('precompute', False)
+    data, e_state_overrides = setup(
+        coords=coords,
+        dims=dims,
+        output_dims=output_dims,
+        preprocess_data_func=preprocess_data_func,
+        precompute=False,
+        loadData_kwargs=loadData_kwargs,
+        logger=logger,
+    )
+    if isinstance(coords, str) and coords == "all":
+        coords = np.array([
+            (x, y) for x in data[output_dims[0]].values for y in data[output_dims[1]].values])
+    coords = np.asarray(coords)
+
+    if mask_field is not None:
+        mask_data = load_estate_overrides(mask_path, output_dims=output_dims) \
+            if mask_path is not None else e_state_overrides
+        cell_count = len(coords)
+        coords = mask_coords(coords, mask_data[mask_field], output_dims)
+        logger(f"Mask {mask_field}: skipping {cell_count - len(coords)} of {cell_count} cells, running {len(coords)}")
+
+    run_hash = get_run_hash(
+        project_file, coords, mask_field, mask_path,
+        input_data_dir=input_data_dir,
+        e_state_overrides_path=e_state_overrides_path,
+        e_state_overrides_field_map=e_state_overrides_field_map,
+        zero_year=zero_year,
+        output_fields=output_fields,
+        spinup=spinup,
+    )
+    manifest_path = f'{output_location}/manifest_{run_id}.json'
+    manifest = RunManifest.load(manifest_path, run_hash) if resume \
+        else RunManifest(manifest_path, run_hash)
+    batch_offset = manifest.next_batch_id
+    if manifest.batches:
+        completed_cells = manifest.completed_cells
+        coords = np.array([c for c in coords if (int(c[0]), int(c[1])) not in completed_cells]).reshape(-1, 2)
+        logger(f"Resuming run from batch {batch_offset}, {len(completed_cells)} cells already completed")
+    if len(coords) == 0:
+        logger("All cells have already been run")
+        return outputs
+
+    if target_batch_size is None:
+        target_batch_size = math.ceil(len(coords) / (workers or 1))
+    if chunk_aligned_batches:
+        coordinate_batches = get_tile_batches(
+            coords, data, output_dims, target_batch_size=target_batch_size,
+            logger=logger, first_batch_id=batch_offset)
+    else:
+        coordinate_batches = get_coord_batches(
+            coords, target_batch_size=target_batch_size, logger=logger)
+
+    runner_kwargs = dict(
+        project_file_path=project_file,
+        output_fields=output_fields,
+        zero_year=zero_year,
+        output_file_path=full_output_dir,
+        e_state_overrides_field_map=e_state_overrides_field_map,
+        process_output=process_output,
+        run_id=run_id,
+        output_dims=output_dims,
+        save_ds=save_ds,
+        cells_per_run=cells_per_run,
+        spinup=spinup,
+        spinup_cache_dir=spinup_cache_dir,
+    )
 
-        out_i = runner(
-            project_file,
-            coord_batch,
-            data_computed,
-            output_fields,
-            e_state_overrides,
-            zero_year,
-            output_file_path=full_output_dir,
-            e_state_overrides_field_map=e_state_overrides_field_map,
-            process_output=process_output,
-            run_id=run_id,
-            batch_id=batch_i,
-            output_dims=output_dims,
-            save_ds=save_ds,
-            logger=logger,
-        )
+    def _collect_outputs(batch_i, out_i, completed_coords):
         df = pd.DataFrame(out_i)
         if return_outputs:
             outputs.append(out_i)
         else:
             file_save_path = f'{output_location}/results_{batch_i}.csv'
             df.to_csv(file_save_path, index=False)
+        for full_output_writer in full_output_writers.values():
+            full_output_writer.sync()
+        manifest.add_batch(batch_i, completed_coords)
+
+    full_output_writers = {}
+    if save_ds:
+        # All batches are saved to one file per config. Workers save their
+        # batches to their own files, which are copied into it.
+        full_output_writers = {
+            config_id: FullOutputWriter(
+                f'{full_output_dir}/out_full_run_{run_id}{config_file_suffix(config_id)}.nc',
+                data[output_dims[0]].values,
+                data[output_dims[1]].values,
+                output_fields,
+                zero_year,
+                output_dims,
+                append=bool(manifest.batches),
+            ) for config_id in get_project_configs(project_file)}
+
+    def _gather_batch(batch_i, result):
+        out_i, completed_coords = result.get()
+        shutil.rmtree(f'{arrays_dir}/batch_{batch_i}')
+        for config_id, full_output_writer in full_output_writers.items():
+            batch_file = f'{full_output_dir}/out_full_run_{run_id}{config_file_suffix(config_id)}_batch_{batch_i}.nc'
+            if os.path.exists(batch_file):
+                full_output_writer.write_from(batch_file, completed_coords)
+                os.remove(batch_file)
+        _collect_outputs(batch_i, out_i, completed_coords)
+
+    pool = None
+    if workers and workers > 1:
+        logger(f"Running batches with {workers} workers")
+        if logger.log_to_file:
+            logger(f"Worker logs: {worker_log_file(logger.log_to_file, '<pid>')}")
+        logger.flush()
+        arrays_dir = tempfile.mkdtemp(prefix='.do3se_inputs_', dir=output_location)
+        log_options = dict(
+            log_level=logger.log_level,
+            log_to_file=logger.log_to_file,
+            use_timestamp=logger.use_timestamp,
+            flush_per_log=logger.flush_per_log,
+        )
+        pool = Pool(workers, initializer=_init_worker, initargs=(log_options,))
+        e_state_spec = save_dataset_arrays(
+            e_state_overrides.load(), f'{arrays_dir}/e_state_overrides')
+        # Only a couple of batches per worker are loaded and waiting at once,
+        # so the inputs written for the workers don't grow with the run.
+        max_pending = 2 * workers
+    pending = deque()
+    try:
+        for batch_i, coord_batch in enumerate(coordinate_batches, start=batch_offset):
+            logger(f"===batch_i: {batch_i}")
+
+            data_batch = select_cells(data, coord_batch, output_dims)
+            if precompute or pool:
+                start_time = datetime.now()
+                data_batch = data_batch.compute()
+                logger(f"Batch load time: {datetime.now() - start_time}")
+
+            batch_kwargs = dict(runner_kwargs, coords=coord_batch, batch_id=batch_i)
+            if pool:
+                data_spec = save_dataset_arrays(data_batch, f'{arrays_dir}/batch_{batch_i}')
+                pending.append((batch_i, pool.apply_async(
+                    _run_batch_in_worker,
+                    (data_spec, e_state_spec, batch_kwargs))))
+                if len(pending) >= max_pending:
+                    _gather_batch(*pending.popleft())
+            else:
+                completed_coords = []
+                out_i = runner(
+                    data_computed=data_batch,
+                    e_state_overrides=e_state_overrides,
+                    logger=logger,
+                    full_output_writers=full_output_writers,
+                    completed_coords=completed_coords,
+                    **batch_kwargs,
+                )
+                _collect_outputs(batch_i, out_i, completed_coords)
+
+        # Gather the remaining worker results in batch order
+        while pending:
+            _gather_batch(*pending.popleft())
+    finally:
+        for full_output_writer in full_output_writers.values():
+            full_output_writer.close()
+        if pool:
+            pool.terminate()
+            pool.join()
+            shutil.rmtree(arrays_dir, ignore_errors=True)
 
     return outputs
\ No newline at end of file
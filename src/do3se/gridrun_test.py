@@ -19,4 +19,205 @@ def test_get_coord_batches():
     coord_i_count = len(coords.flatten())
     np.testing.assert_array_equal(out.flatten()[0:coord_i_count], coords.flatten()[0:coord_i_count])
     assert out[2][1][0] == INVALID_COORD
-    assert out[2][1][1] == INVALID_COORD
\ No newline at end of file
+    assert out[2][1][1] == INVALID_COORD
+
+def test_select_cells():
+    """Test select_cells only keeps the cells used by a batch"""
+    import xarray as xr
+    from do3se.gridrun import select_cells
+    data = xr.Dataset(
+        {'ts_c': (('x', 'y'), np.arange(12).reshape(3, 4))},
+        coords={'x': np.arange(3), 'y': np.arange(4)},
+    ).chunk({'x': 1})
+    batch = np.array([[2, 1], [0, 3], [INVALID_COORD, INVALID_COORD]])
+    out = select_cells(data, batch)
+    assert out.ts_c.chunks is not None
+    assert out.ts_c.dims == ('cell',)
+    assert out.x.values.tolist() == [2, 0]
+    assert out.y.values.tolist() == [1, 3]
+    assert out.ts_c.values.tolist() == [9, 3]
+    # Cells can be selected again from the selected cells
+    assert select_cells(out, [[0, 3]]).ts_c.values.tolist() == [3]
+
+
+def test_e_state_lookup():
+    """Test e_state_lookup finds a cell's values and config overrides"""
+    import xarray as xr
+    from do3se.gridrun import e_state_lookup, get_config_overrides_from_estate
+    e_state = xr.Dataset(
+        {'terrain': (('y', 'x'), np.arange(12.).reshape(4, 3))},
+        coords={'x': np.arange(3), 'y': np.arange(4), 'lat': (('x', 'y'), np.ones((3, 4)))},
+    )
+    lookup = e_state_lookup(e_state, ['terrain', 'lat', 'missing'])
+    cell = lookup(2, 1)
+    assert cell == {'terrain': 5., 'lat': 1.}
+    assert get_config_overrides_from_estate(cell, {'terrain': 'elev'}) == {'elev': 5.}
+
+
+def test_dataset_arrays_round_trip(tmp_path):
+    """Test datasets passed to workers through .npy files are unchanged"""
+    import xarray as xr
+    from do3se.gridrun import save_dataset_arrays, load_dataset_arrays
+    data = xr.Dataset(
+        {'ts_c': (('time', 'x'), np.arange(6.).reshape(3, 2), {'units': 'C'})},
+        coords={
+            'time': np.array(['2012-01-01T00', '2012-01-01T01', '2012-01-01T02'], dtype='datetime64[ns]'),
+            'x': np.arange(2),
+            'lat': ('x', [50.5, 51.]),
+        },
+    )
+    out = load_dataset_arrays(save_dataset_arrays(data, tmp_path))
+    xr.testing.assert_identical(out, data)
+    assert list(out.to_dataframe().columns) == list(data.to_dataframe().columns)
+
+
+def test_worker_log_file():
+    """Test each worker process gets its own log file"""
+    from do3se.gridrun import worker_log_file
+    assert worker_log_file('out/log_run.txt', 1234) == 'out/log_run_worker_1234.txt'
+
+
+def test_cell_block():
+    """Test CellBlock rows match the cell's dataframe"""
+    import xarray as xr
+    from do3se.gridrun import CellBlock, select_cells
+    data = xr.Dataset(
+        {
+            'ts_c': (('time', 'x', 'y'), np.arange(24, dtype=np.float32).reshape(4, 2, 3)),
+            'dd': ('time', np.array([1, 1, 2, 2], dtype=np.int16)),
+        },
+        coords={
+            'time': np.arange(4), 'x': np.arange(2), 'y': np.arange(3),
+            'lat': (('y', 'x'), np.arange(6., dtype=np.float32).reshape(3, 2)),
+        },
+    )
+    cells = CellBlock(select_cells(data, [[1, 2], [0, 1]]))
+    expected = data.sel(x=1, y=2).to_dataframe()
+    assert cells.fields == list(expected.columns)
+    assert cells.values.shape == (2, 4, len(cells.fields))
+    rows = cells.rows(1, 2)
+    assert rows.dtype == np.float64
+    assert np.shares_memory(rows, cells.values)
+    np.testing.assert_array_equal(rows, expected.values)
+    assert cells.cell_value('lat', 1, 2) == 5.
+
+
+def test_add_vpd_lazy():
+    """Test add_vpd works element-wise and stays lazy on dask arrays"""
+    import math
+    import xarray as xr
+    from do3se.gridrun import add_vpd
+    data = xr.Dataset({
+        'ts_c': ('time', np.array([-5., 10., 25.], dtype=np.float32)),
+        'rh': ('time', np.array([0.9, 0.5, 0.2], dtype=np.float32)),
+    }).chunk({'time': 1})
+    vpd = add_vpd(data)
+    assert vpd.chunks is not None
+    esat = 0.611 * math.exp(17.27 * 25. / (25. + 237.3))
+    np.testing.assert_allclose(vpd.values[2], esat - esat * np.float32(0.2))
+
+
+def test_full_output_writer(tmp_path):
+    """Test FullOutputWriter saves cells into their slots, directly and from other files"""
+    import xarray as xr
+    from do3se.dataset import Resultset
+    from do3se.gridrun import FullOutputWriter
+    output = Resultset({
+        'dd': np.array([1, 1, 2]),
+        'hr': np.array([22, 23, 0]),
+        'afsty': np.array([0.5, 1.0, 1.5]),
+    }, 0, {})
+    batch = FullOutputWriter(tmp_path / 'batch.nc', [1, 2], [0], ['afsty'], 2012)
+    batch.write(2, 0, output, {'lat': 50.})
+    batch.close()
+    writer = FullOutputWriter(tmp_path / 'full.nc', np.arange(3), np.arange(2), ['afsty'], 2012)
+    writer.write(0, 1, output, {'lat': 40.})
+    writer.write_from(tmp_path / 'batch.nc', [(2, 0), (INVALID_COORD, INVALID_COORD)])
+    writer.close()
+
+    with xr.open_dataset(tmp_path / 'full.nc') as ds:
+        assert ds.afsty.dims == ('x', 'y', 'date')
+        assert str(ds.date.values[0]) == '2012-01-01T22:00:00.000000000'
+        np.testing.assert_array_equal(ds.afsty.sel(x=2, y=0), [0.5, 1.0, 1.5])
+        np.testing.assert_array_equal(ds.afsty.sel(x=0, y=1), [0.5, 1.0, 1.5])
+        assert np.isnan(ds.afsty.sel(x=1, y=1)).all()
+        assert ds.lat.sel(x=2, y=0) == 50.
+
+
+def test_run_manifest(tmp_path):
+    """Test completed batches are reloaded from the run manifest"""
+    from do3se.gridrun import RunManifest
+    import pytest
+    path = tmp_path / 'manifest_1.json'
+    manifest = RunManifest.load(path, 'abc')
+    assert manifest.next_batch_id == 0
+    manifest.add_batch(0, np.array([[0, 1], [2, 3], [INVALID_COORD, INVALID_COORD]]))
+    manifest.add_batch(1, [(4, 5)])
+    reloaded = RunManifest.load(path, 'abc')
+    assert reloaded.completed_cells == {(0, 1), (2, 3), (4, 5)}
+    assert reloaded.next_batch_id == 2
+    assert not (tmp_path / 'manifest_1.json.tmp').exists()
+    # A different run can't resume from it
+    with pytest.raises(ValueError):
+        RunManifest.load(path, 'def')
+
+
+def test_get_run_hash(tmp_path):
+    """Test the run hash changes with the configs, coords and mask"""
+    from do3se.gridrun import get_run_hash
+    config = tmp_path / 'oak.json'
+    config.write_text('{"a": 1}')
+    coords = np.array([[0, 1], [2, 3]])
+    run_hash = get_run_hash(str(config), coords, zero_year=2012)
+    assert get_run_hash(str(config), coords[::-1], zero_year=2012) == run_hash
+    assert get_run_hash(str(config), coords[:1], zero_year=2012) != run_hash
+    assert get_run_hash(str(config), coords, 'land', zero_year=2012) != run_hash
+    assert get_run_hash(str(config), coords, zero_year=2013) != run_hash
+    config.write_text('{"a": 2}')
+    assert get_run_hash(str(config), coords, zero_year=2012) != run_hash
+
+
+def test_get_project_configs():
+    """Test project files are keyed by config id"""
+    from do3se.gridrun import get_project_configs
+    import pytest
+    assert get_project_configs('configs/oak.json') == {None: 'configs/oak.json'}
+    assert get_project_configs(['configs/oak.json', 'wheat.json']) == {
+        'oak': 'configs/oak.json', 'wheat': 'wheat.json'}
+    assert get_project_configs({'a': 'oak.json'}) == {'a': 'oak.json'}
+    with pytest.raises(ValueError):
+        get_project_configs(['a/oak.json', 'b/oak.json'])
+
+
+def test_get_tile_batches():
+    """Test batches are made of whole chunks in the same row of chunks"""
+    import xarray as xr
+    from do3se.gridrun import get_tile_batches, get_chunk_bounds
+    data = xr.Dataset(
+        {'ts_c': (('time', 'x', 'y'), np.zeros((2, 4, 6)))},
+        coords={'x': np.arange(4), 'y': np.arange(6)},
+    )
+    assert [b.tolist() for b in get_chunk_bounds(data)] == [[0, 4], [0, 6]]
+    data['ts_c'].encoding['chunksizes'] = (2, 4, 4)
+    assert [b.tolist() for b in get_chunk_bounds(data)] == [[0, 4], [0, 4, 6]]
+    data = data.chunk({'x': 2, 'y': 3})
+    assert [b.tolist() for b in get_chunk_bounds(data)] == [[0, 2, 4], [0, 3, 6]]
+
+    all_coords = np.array([(x, y) for x in range(4) for y in range(6)])
+    batches = get_tile_batches(all_coords, data, target_batch_size=1, logger=lambda *a: None)
+    assert len(batches) == 4
+    assert all(len(b) == 6 for b in batches)
+    assert sorted(map(tuple, np.concatenate(batches))) == sorted(map(tuple, all_coords))
+    batches = get_tile_batches(all_coords, data, target_batch_size=12, logger=lambda *a: None)
+    assert [b[:, 0].max() for b in batches] == [1, 3]
+
+
+def test_mask_coords():
+    """Test masked, missing and out of grid cells are removed"""
+    import xarray as xr
+    from do3se.gridrun import mask_coords
+    mask = xr.DataArray(
+        [[1, 0, 1], [np.nan, 1, 1]], dims=('y', 'x'),
+        coords={'y': [0, 1], 'x': [10, 11, 12]})
+    out = mask_coords([[10, 0], [11, 0], [10, 1], [12, 1], [13, 0]], mask)
+    assert out.tolist() == [[10, 0], [12, 1]]
@@ -1,4 +1,8 @@
 # coding: utf-8
+from functools import partial
+
+import numpy as np
+
 from do3se._model import *
 from do3se.util import to_dicts, dicts_to_map, OrderedDict
 from do3se.fields import SpinField, FloatSpinField, ChoiceField, disableable
@@ -611,3 +615,156 @@ def extract_outputs():
     output_fields.
     """
     return dict((x['variable'], x['type'](getattr(x['module'], x['variable']))) for x in output_fields.values())
+
+
+def output_extractor(fields=None):
+    """Create a function which extracts the current values of *fields*.
+
+    The returned function takes no arguments and returns a list of the raw
+    values of *fields* (default: all of :data:`output_fields`), in the same
+    order.  Only the Fortran variables for the requested fields are read.
+    """
+    if fields is None:
+        fields = list(output_fields.keys())
+    getters = [partial(getattr, output_fields[f]['module'], output_fields[f]['variable'])
+               for f in fields]
+    return lambda: [g() for g in getters]
+
+
+def run_batch(columns, fields=None):
+    """Run the model over a block of input rows in a single Fortran call.
+
+    *columns* is a mapping of input variable name to a 1-D array of values,
+    all of the same length.  Names without a matching variable in the
+    :mod:`batch` module are ignored.  The model must already have been
+    initialised.
+
+    Returns a dict mapping each of *fields* (default: all of
+    :data:`output_fields`) to an array of that output's value after each row,
+    cast to the output field's type.
+    """
+    if fields is None:
+        fields = list(output_fields.keys())
+    names, input_ids, output_ids = _batch_ids(columns, fields)
+    input_data = np.empty((len(names), len(columns[names[0]]) if names else 0),
+                          dtype=np.float32, order='F')
+    for i, k in enumerate(names):
+        input_data[i] = columns[k]
+
+    output_data = state.run_batch(input_ids, input_data, output_ids)
+    return _batch_outputs(output_data, fields)
+
+
+def init_sites(n):
+    """Make space to store the model state of *n* sites (see :func:`store_site`).
+
+    Any previously stored site states are discarded.
+    """
+    state.init_sites(n)
+
+
+def store_site(i):
+    """Store the current model state as the state of site *i* (from 0)."""
+    _check_site(i)
+    state.store_site(i + 1)
+
+
+def load_site(i):
+    """Load the stored state of site *i* (from 0) back into the model."""
+    _check_site(i)
+    state.load_site(i + 1)
+
+
+def save_state():
+    """Get a snapshot of the whole model state as a compact binary blob.
+
+    The blob can be loaded back into the model with :func:`load_state`, e.g.
+    to continue a run from the end of a spin-up period more than once.  It is
+    only valid for the same build of the model.
+    """
+    return state.save_state(state.state_size()).tobytes()
+
+
+def load_state(blob):
+    """Load a model state snapshot taken by :func:`save_state`."""
+    data = np.frombuffer(blob, dtype=np.int8)
+    if len(data) != state.state_size():
+        raise ValueError('Model state must be %d bytes, not %d'
+                         % (state.state_size(), len(data)))
+    state.load_state(data)
+
+
+def save_settings(path):
+    """Save the model options and parameters, e.g. as loaded by
+    :meth:`do3se.dataset.Dataset.initialise_model`, to a namelist file.
+
+    The file can be read by the standalone ``dose`` program (see
+    ``src/F/dose.f90``) to run the model without Python.
+    """
+    files.write_settings(path)
+
+
+def run_batch_sites(columns, fields=None):
+    """Run the model for several sites at once in a single Fortran call.
+
+    Like :func:`run_batch`, but each value of *columns* is a 2-D array with a
+    row of input values for each site, and the state of each site must
+    already have been stored with :func:`store_site` after initialising the
+    model for it.  The sites must all have the same options.  Each row of
+    input is run for every site before moving on to the next, working on the
+    stored states directly, so they are left ready to run on with further
+    rows.  The model's own state is not used or changed.
+
+    This saves a Python call per site, but the model is not vectorised over
+    the sites, so it takes about as long as running each site with
+    :func:`run_batch` (within 10% for 1 to 200 sites).
+
+    Returns a dict mapping each of *fields* to a 2-D array of outputs, with a
+    row for each site.
+    """
+    return _run_sites(state.run_batch_sites, columns, fields)
+
+
+def _run_sites(kernel, columns, fields):
+    if fields is None:
+        fields = list(output_fields.keys())
+    names, input_ids, output_ids = _batch_ids(columns, fields)
+    site_count, row_count = np.shape(columns[names[0]]) if names else (state.site_count(), 0)
+    if site_count > state.site_count():
+        raise IndexError('Only %d site states are stored' % state.site_count())
+    if not state.site_options_match(site_count):
+        raise ValueError('Sites must all have the same options')
+    input_data = np.empty((len(names), row_count, site_count),
+                          dtype=np.float32, order='F')
+    for i, k in enumerate(names):
+        input_data[i] = np.transpose(columns[k])
+
+    output_data = kernel(input_ids, input_data, output_ids)
+    return _batch_outputs(output_data.transpose(2, 0, 1), fields)
+
+
+def _check_site(i):
+    if not 0 <= i < state.site_count():
+        raise IndexError('No site %d, only %d site states are stored' % (i, state.site_count()))
+
+
+def _batch_ids(columns, fields):
+    """Get the input names used from *columns* and the batch module ids of
+    those inputs and of *fields*."""
+    names = [k for k in columns if hasattr(batch, 'in_' + k)]
+    input_ids = np.array([getattr(batch, 'in_' + k) for k in names], dtype=np.int32)
+    output_ids = np.array([getattr(batch, 'out_' + f) for f in fields], dtype=np.int32)
+    return names, input_ids, output_ids
+
+
+def _batch_outputs(output_data, fields):
+    """Split batch output data, with fields on its last axis, into arrays of
+    each output field's type."""
+    outputs = {}
+    for i, f in enumerate(fields):
+        t = output_fields[f]['type']
+        if t is bool:
+            outputs[f] = output_data[..., i] != 0
+        else:
+            outputs[f] = output_data[..., i].astype(t)
+    return outputs
@@ -2,6 +2,6 @@
 import xarray as xr
 
 # %%
-outputs = xr.open_dataset("tests/gridrun/outputs/full_outputs/out_full_run_1_batch_0.nc")
+outputs = xr.open_dataset("tests/gridrun/outputs/full_outputs/out_full_run_1.nc")
 outputs
 # %%